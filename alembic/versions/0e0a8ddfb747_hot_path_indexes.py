@@ -0,0 +1,40 @@
+"""Hot path indexes
+
+Revision ID: 0e0a8ddfb747
+Revises: f49034d9119b
+Create Date: 2026-10-17 19:00:47.655292
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0e0a8ddfb747'
+down_revision: Union[str, Sequence[str], None] = 'f49034d9119b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Условия частичных индексов — выражениями, чтобы каждый диалект отрисовал
+# булевы литералы по-своему (0/1 в SQLite, false/true в Postgres)
+_UNSENT_REMINDER = sa.and_(sa.column('is_sent') == sa.false(), sa.column('is_cancelled') == sa.false())
+_REGISTERED_USER = sa.column('is_registered').is_(sa.true())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_notification_logs_record_type_sent', 'notification_logs', ['record_id', 'message_type', sa.literal_column('sent_at DESC')], unique=False)
+    op.create_index('ix_reminders_unsent_appointment', 'reminders', ['appointment_datetime'], unique=False, postgresql_where=_UNSENT_REMINDER, sqlite_where=_UNSENT_REMINDER)
+    op.create_index('ix_reschedule_requests_record_created', 'reschedule_requests', ['record_id', sa.literal_column('created_at DESC')], unique=False)
+    op.create_index('ix_users_registered_id', 'users', ['id'], unique=False, postgresql_where=_REGISTERED_USER, sqlite_where=_REGISTERED_USER)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_registered_id', table_name='users')
+    op.drop_index('ix_reschedule_requests_record_created', table_name='reschedule_requests')
+    op.drop_index('ix_reminders_unsent_appointment', table_name='reminders')
+    op.drop_index('ix_notification_logs_record_type_sent', table_name='notification_logs')
@@ -0,0 +1,91 @@
+"""
+Бенчмарк переиспользования соединений при постраничной выгрузке /visits.
+
+Поднимает локальный HTTP-сервер, отдающий N страниц визитов с искусственной
+задержкой, и выгружает их клиентом Dentist plus дважды: с пулом keep-alive
+(как в боте) и с закрытием соединения после каждого запроса. Сервер считает,
+сколько TCP-соединений к нему открыли.
+
+    python bench_connection_reuse.py [--pages 40] [--latency-ms 20] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+from aiohttp import web
+
+from src.services.yclients import YClientsClient
+from src.utils.host_health import HostSelector
+from src.utils.rate_limiter import TokenBucketRateLimiter
+
+
+def _make_app(pages: int, latency: float, peers: set) -> web.Application:
+    async def visits(request: web.Request) -> web.Response:
+        peers.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(latency)
+        page = int(request.query.get("page", 1))
+        data = [
+            {
+                "id": page * 1000 + i,
+                "start": f"2026-04-12 {9 + i % 9:02d}:00:00",
+                "patient": {"id": i, "fname": "Пациент"},
+                "doctor": {"id": 1, "fname": "Доктор"},
+            }
+            for i in range(50)
+        ]
+        return web.json_response({"data": data, "meta": {"last_page": pages}})
+
+    app = web.Application()
+    app.router.add_get("/partner/visits", visits)
+    return app
+
+
+async def _run(base_url: str, *, pooled: bool, concurrency: int) -> tuple[int, float]:
+    client = YClientsClient()
+    client._hosts = HostSelector([base_url])
+    client._token = "bench"
+    client._token_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    client._token_loaded = True
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=100_000, burst=1000)
+    if not pooled:
+        client._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(force_close=True),
+            timeout=client.timeout,
+        )
+    try:
+        started = time.perf_counter()
+        items = await client._collect_paginated("/visits", {"date_from": "2026-04-12"}, concurrency=concurrency)
+        return len(items), time.perf_counter() - started
+    finally:
+        await client.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    peers: set = set()
+    runner = web.AppRunner(_make_app(args.pages, args.latency_ms / 1000, peers))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/partner"
+
+    print(f"{'mode':<12} {'visits':>7} {'connections':>12} {'seconds':>8}")
+    try:
+        for name, pooled in (("keep-alive", True), ("no reuse", False)):
+            peers.clear()
+            count, elapsed = await _run(base_url, pooled=pooled, concurrency=args.concurrency)
+            print(f"{name:<12} {count:>7} {len(peers):>12} {elapsed:>8.3f}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
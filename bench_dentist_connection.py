@@ -0,0 +1,66 @@
+"""
+Бенчмарк подключения к Dentist plus (то же, что /dpdiag bench) против локального
+фейкового API: два «хоста» с разной задержкой, пагинированный /visits.
+
+    python bench_dentist_connection.py [--iterations 5] [--visits 450] [--slow-ms 120] [--fail-rate 0.2]
+
+Удобно проверять, как таблица p50/p95 реагирует на медленный или сбоящий хост,
+не трогая настоящий API.
+"""
+import argparse
+import asyncio
+
+from fake_dentist_api import start_fake_api
+from src.services.yclients import YClientsClient
+from src.utils.rate_limiter import TokenBucketRateLimiter
+
+
+def format_table(result: dict) -> str:
+    header = (
+        f"{'host':<34} {'auth p50/p95':>13} {'1st page':>13} {'window':>13} "
+        f"{'pages':>5} {'items/s':>8} {'errors':>6}"
+    )
+    lines = [header]
+
+    def pair(p50, p95) -> str:
+        return "—" if p50 is None else f"{p50}/{p95}"
+
+    for host in result["hosts"]:
+        lines.append(
+            f"{host['url']:<34} {pair(host['auth_p50_ms'], host['auth_p95_ms']):>13} "
+            f"{pair(host['first_page_p50_ms'], host['first_page_p95_ms']):>13} "
+            f"{pair(host['window_p50_ms'], host['window_p95_ms']):>13} "
+            f"{host['pages']:>5} {host['items_per_second']:>8} {host['error_rate']:>6.0%}"
+        )
+    return "\n".join(lines)
+
+
+async def run(args: argparse.Namespace) -> None:
+    fast, fast_url = await start_fake_api(visits=args.visits, latency=0.005)
+    slow, slow_url = await start_fake_api(visits=args.visits, latency=args.slow_ms / 1000, fail_rate=args.fail_rate)
+    client = YClientsClient()
+    client.login, client.password = "bench", "bench"
+    client._base_urls = [fast_url, slow_url]
+    # У локального API нет квоты — лимитер не должен искажать замер
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=60_000, burst=100)
+    try:
+        result = await client.benchmark_connection(iterations=args.iterations)
+        print(f"iterations: {result['iterations']}, window: {result['window_days']} days, times in ms")
+        print(format_table(result))
+    finally:
+        await client.close()
+        await fast.cleanup()
+        await slow.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--visits", type=int, default=450)
+    parser.add_argument("--slow-ms", type=float, default=120)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Микро-бенчмарк разбора страницы /visits Dentist plus (200 визитов).
+
+Сравнивает прежний путь (stdlib json + перебор форматов конверта и meta)
+с быстрым (JSON-декодер из настроек + запомненная форма страницы) и
+показывает, сколько весит страница без сжатия и в gzip.
+
+    python bench_page_decoding.py [--items 200] [--repeat 200]
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from src.services.yclients import _page_items, _page_last
+from src.utils.json_codec import get_json_loads
+
+
+def _page(count: int) -> list:
+    rnd = random.Random(42)
+    base = datetime(2026, 4, 12, 9, 0)
+    return [
+        {
+            "id": 100000 + i,
+            "start": (base + timedelta(minutes=30 * rnd.randrange(0, 20))).strftime("%Y-%m-%d %H:%M:%S"),
+            "end": (base + timedelta(minutes=30 * rnd.randrange(1, 21))).strftime("%Y-%m-%d %H:%M:%S"),
+            "branch_id": 2,
+            "is_cancelled": False,
+            "description": "Плановый осмотр, профессиональная гигиена",
+            "patient": {"id": rnd.randrange(1, 5000), "fname": "Анна", "lname": "Петрова", "phone": "+79991234567"},
+            "doctor": {"id": rnd.randrange(1, 20), "fname": "Иван", "lname": "Сидоров"},
+            "chair": {"id": rnd.randrange(1, 5), "title": "Кресло"},
+        }
+        for i in range(count)
+    ]
+
+
+def _envelopes(items: list) -> dict[str, dict]:
+    meta = {"pagination": {"total_pages": 7, "current_page": 1}}
+    return {
+        "data": {"data": items, "meta": meta},
+        "data.visits": {"data": {"visits": items}, "meta": meta},
+        "result": {"result": items, "meta": meta},
+    }
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    decoder, fast_loads = get_json_loads("auto")
+    _, stdlib_loads = get_json_loads("json")
+    print(f"decoder: {decoder}")
+    print(f"{'envelope':<12} {'old, ms':>8} {'new, ms':>8} {'speedup':>8} {'raw, KB':>8} {'gzip, KB':>9}")
+    for name, payload in _envelopes(_page(args.items)).items():
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        items_hint = _page_items(payload)[1]
+        last_hint = _page_last(payload, 1)[1]
+
+        def old() -> None:
+            decoded = stdlib_loads(body)
+            _page_items(decoded)
+            _page_last(decoded, 1)
+
+        def new() -> None:
+            decoded = fast_loads(body)
+            _page_items(decoded, items_hint)
+            _page_last(decoded, 1, last_hint)
+
+        assert _page_items(fast_loads(body), items_hint) == _page_items(stdlib_loads(body))
+        before = _best_of(args.repeat, old)
+        after = _best_of(args.repeat, new)
+        print(
+            f"{name:<12} {before * 1000:>8.3f} {after * 1000:>8.3f} {before / after:>7.1f}x "
+            f"{len(body) / 1024:>8.1f} {len(gzip.compress(body)) / 1024:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
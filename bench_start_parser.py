@@ -0,0 +1,105 @@
+"""
+Микро-бенчмарк разбора start визитов Dentist plus.
+
+Сравнивает на всех форматах, которые встречались в API:
+- прежний путь: start -> ISO-строка UTC (_visit_start_to_iso_utc) -> повторный
+  разбор строки в record_appointment_datetime;
+- поштучный общий разбор сразу в datetime (_parse_visit_start);
+- постраничный (_parse_visit_starts) с определением формата по первому значению:
+  для локального времени клиники смещение от UTC считается раз в час, а не на визит.
+
+Время начала почти всё уникальное, чтобы замер показывал быстрый разбор формата,
+а не попадания в словарь повторов; разбор идёт страницами по --per-page, как в API.
+
+    python bench_start_parser.py [--visits 5000] [--repeat 5] [--tz Europe/Moscow]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from src.config import settings
+from src.services.yclients import _parse_visit_start, _parse_visit_starts
+
+
+def _legacy_start_to_iso_utc(raw: Any) -> Optional[str]:
+    # Тело прежнего _visit_start_to_iso_utc совпадает с _parse_visit_start,
+    # только результат сериализовался в строку
+    dt = _parse_visit_start(raw)
+    return dt.isoformat() if dt is not None else None
+
+
+def _legacy_appointment_datetime(dt_str: Optional[str]) -> Optional[datetime]:
+    # Прежний record_appointment_datetime: строка из маппинга разбиралась ещё раз
+    if not dt_str or not isinstance(dt_str, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            return dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc)
+    except (ValueError, TypeError):
+        return None
+
+
+def _legacy_parse(values: list) -> list[Optional[datetime]]:
+    return [_legacy_appointment_datetime(_legacy_start_to_iso_utc(v)) for v in values]
+
+
+def _starts(count: int) -> dict[str, list]:
+    rnd = random.Random(42)
+    base = datetime(2026, 4, 12, 9, 0, tzinfo=timezone.utc)
+    # Полгода с точностью до секунды: повторы времени почти не встречаются.
+    # Как в API, визиты идут по времени
+    moments = sorted(base + timedelta(seconds=rnd.randrange(0, 180 * 24 * 60 * 60)) for _ in range(count))
+    return {
+        "space": [m.strftime("%Y-%m-%d %H:%M:%S") for m in moments],
+        "iso": [m.strftime("%Y-%m-%dT%H:%M:%S") for m in moments],
+        "offset": [m.astimezone(timezone(timedelta(hours=3))).isoformat() for m in moments],
+        "zulu": [m.strftime("%Y-%m-%dT%H:%M:%SZ") for m in moments],
+        "unix": [int(m.timestamp()) for m in moments],
+    }
+
+
+def _pages(values: list, per_page: int) -> list[list]:
+    return [values[i : i + per_page] for i in range(0, len(values), per_page)]
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--per-page", type=int, default=200)
+    parser.add_argument("--tz", default="Europe/Moscow", help="таймзона клиники (REMINDER_TIMEZONE)")
+    args = parser.parse_args()
+    settings.REMINDER_TIMEZONE = args.tz
+
+    print(f"{'format':<8} {'unique':>6} {'old path, ms':>13} {'per-visit, ms':>14} {'batch, ms':>10} {'vs old':>7}")
+    for name, values in _starts(args.visits).items():
+        expected = _legacy_parse(values)
+        pages = _pages(values, args.per_page)
+        assert [dt for page in pages for dt in _parse_visit_starts(page)] == expected
+        assert expected == [_parse_visit_start(v) for v in values]
+        legacy = _best_of(args.repeat, lambda: _legacy_parse(values))
+        single = _best_of(args.repeat, lambda: [_parse_visit_start(v) for v in values])
+        # Постраничный разбор — как в клиенте: форма и смещения запоминаются на страницу
+        batch = _best_of(args.repeat, lambda: [_parse_visit_starts(page) for page in pages])
+        unique = len(set(values)) / len(values)
+        print(
+            f"{name:<8} {unique:>6.0%} {legacy * 1000:>13.2f} {single * 1000:>14.2f} "
+            f"{batch * 1000:>10.2f} {legacy / batch:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
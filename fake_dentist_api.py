@@ -0,0 +1,63 @@
+"""
+Фейковый Dentist plus для тестов и бенчмарков: локальный aiohttp-сервер с
+POST /partner/auth и пагинированным GET /partner/visits.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+
+def _visit(i: int) -> dict:
+    start = datetime(2026, 4, 13, 9, 0) + timedelta(minutes=30 * (i % 20), days=i // 20)
+    return {
+        "id": 200000 + i,
+        "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+        "branch_id": 2,
+        "patient": {"id": 1000 + i, "fname": "Анна", "lname": "Петрова", "phone": "+79991234567"},
+        "doctor": {"id": 7, "fname": "Иван", "lname": "Сидоров"},
+    }
+
+
+async def start_fake_api(
+    *,
+    visits: int = 450,
+    latency: float = 0.0,
+    fail_rate: float = 0.0,
+    seed: int = 1,
+) -> tuple[web.AppRunner, str]:
+    """
+    Фейковый Dentist plus на 127.0.0.1 со случайным портом: POST /partner/auth и
+    GET /partner/visits с page/per_page. fail_rate — доля ответов 503.
+    Возвращает (runner, base_url); остановка — await runner.cleanup().
+    """
+    rnd = random.Random(seed)
+    data = [_visit(i) for i in range(visits)]
+
+    async def maybe_fail() -> None:
+        await asyncio.sleep(latency)
+        if fail_rate and rnd.random() < fail_rate:
+            raise web.HTTPServiceUnavailable(text='{"error": "busy"}', content_type="application/json")
+
+    async def auth(request: web.Request) -> web.Response:
+        await maybe_fail()
+        return web.json_response({"token": "bench", "expires_at": "2099-01-01T00:00:00Z"})
+
+    async def visits_page(request: web.Request) -> web.Response:
+        await maybe_fail()
+        page = int(request.query.get("page", 1))
+        per_page = int(request.query.get("per_page", 200))
+        last_page = max(1, -(-len(data) // per_page))
+        chunk = data[(page - 1) * per_page : page * per_page]
+        return web.json_response({"data": chunk, "meta": {"last_page": last_page, "current_page": page}})
+
+    app = web.Application()
+    app.router.add_post("/partner/auth", auth)
+    app.router.add_get("/partner/visits", visits_page)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}/partner"
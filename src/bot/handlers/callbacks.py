@@ -8,13 +8,14 @@ from aiogram.types import CallbackQuery
 from src.bot.keyboards.inline import create_cancel_reason_keyboard
 from src.config import settings
 from src.database.crud import (
-    NotificationLogCRUD,
     ReminderCRUD,
     RescheduleRequestCRUD,
     UserCRUD,
 )
 from src.database.database import db_manager
+from src.services.notification_log import notification_log
 from src.services.yclients import yclients_client
+from src.utils.rate_limiter import interactive_priority
 
 logger = logging.getLogger(__name__)
 
@@ -72,12 +73,13 @@ async def handle_confirm_appointment(callback: CallbackQuery) -> None:
         await callback.answer("Некорректные данные", show_alert=True)
         return
 
-    # Обновляем статус в Dentist plus
-    success = await yclients_client.update_record_status(
-        record_id=record_id,
-        status="confirmed",
-        comment="Подтверждено пациентом через Telegram бота",
-    )
+    # Обновляем статус в Dentist plus (пациент ждёт ответа — вне очереди batch-запросов)
+    with interactive_priority():
+        success = await yclients_client.update_record_status(
+            record_id=record_id,
+            status="confirmed",
+            comment="Подтверждено пациентом через Telegram бота",
+        )
 
     if success:
         # Обновляем статус в БД
@@ -85,8 +87,7 @@ async def handle_confirm_appointment(callback: CallbackQuery) -> None:
             await ReminderCRUD.mark_as_confirmed(session, record_id)
 
             # Логируем уведомление
-            await NotificationLogCRUD.log_notification(
-                session=session,
+            await notification_log.log(
                 chat_id=callback.from_user.id,
                 message_type="confirmation",
                 record_id=record_id,
@@ -156,11 +157,12 @@ async def handle_cancel_reason(callback: CallbackQuery) -> None:
     reason_text = reasons.get(reason, "Не указана")
 
     # Отменяем запись в Dentist plus
-    success = await yclients_client.update_record_status(
-        record_id=record_id,
-        status="deleted",
-        comment=f"Отменено пациентом: {reason_text}",
-    )
+    with interactive_priority():
+        success = await yclients_client.update_record_status(
+            record_id=record_id,
+            status="deleted",
+            comment=f"Отменено пациентом: {reason_text}",
+        )
 
     if success:
         # Обновляем статус в БД
@@ -168,8 +170,7 @@ async def handle_cancel_reason(callback: CallbackQuery) -> None:
             await ReminderCRUD.mark_as_cancelled(session, record_id)
 
             # Логируем уведомление
-            await NotificationLogCRUD.log_notification(
-                session=session,
+            await notification_log.log(
                 chat_id=callback.from_user.id,
                 message_type="cancellation",
                 record_id=record_id,
@@ -256,8 +257,7 @@ async def handle_reschedule_appointment(callback: CallbackQuery) -> None:
                 logger.error(f"Failed to send admin notification: {str(e)}")
 
             # Логируем уведомление
-            await NotificationLogCRUD.log_notification(
-                session=session,
+            await notification_log.log(
                 chat_id=callback.from_user.id,
                 message_type="reschedule_request",
                 record_id=record_id,
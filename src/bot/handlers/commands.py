@@ -21,8 +21,11 @@ from src.config import settings
 from src.database.crud import UserCRUD
 from src.database.database import db_manager
 from src.services.admin_report import send_admin_report_for_date
+from src.services.patient_directory import patient_directory
 from src.services.scheduler import ReminderScheduler
+from src.services.visit_mirror import visit_mirror
 from src.services.yclients import yclients_client
+from src.utils.rate_limiter import interactive_priority
 from src.utils.validators import validate_phone
 
 logger = logging.getLogger(__name__)
@@ -215,7 +218,8 @@ async def _bind_user_by_phone(chat_id: int, raw_phone: str, fallback_name: str |
     if not normalized:
         return False
 
-    client = await yclients_client.find_client(phone=normalized)
+    with interactive_priority():
+        client = await patient_directory.find_by_phone(normalized)
     if not client or not client.get("id"):
         return False
 
@@ -437,24 +441,22 @@ async def my_records(message: Message) -> None:
     except Exception:
         tz = ZoneInfo("UTC")
     now = datetime.now(tz)
-    records = await yclients_client.get_records(
-        start_date=now,
-        end_date=now + timedelta(days=180),
-        client_id=user.yclients_client_id,
-    )
+    horizon = now + timedelta(days=180)
+    if visit_mirror.can_serve(now, horizon):
+        records = await visit_mirror.get_records(now, horizon, client_id=user.yclients_client_id)
+    else:
+        with interactive_priority():
+            records = await yclients_client.get_records(
+                start_date=now,
+                end_date=horizon,
+                client_id=user.yclients_client_id,
+            )
     upcoming: list[str] = []
-    for record in records:
-        dt_raw = record.get("datetime")
-        if not isinstance(dt_raw, str):
-            continue
-        try:
-            dt = datetime.fromisoformat(dt_raw.replace("Z", "+00:00")).astimezone(tz)
-        except ValueError:
-            continue
+    for visit in records:
+        dt = visit.start.astimezone(tz)
         if dt < now:
             continue
-        doctor = (record.get("staff") or {}).get("name", "Доктор")
-        upcoming.append(f"• {dt.strftime('%d.%m.%Y %H:%M')} — {doctor}")
+        upcoming.append(f"• {dt.strftime('%d.%m.%Y %H:%M')} — {visit.doctor_name}")
     if not upcoming:
         await message.answer("Ближайших записей не найдено.")
         return
@@ -748,12 +750,76 @@ async def report_command(message: Message) -> None:
     await send_admin_report_for_date(message.bot, target)
 
 
+async def _dentist_plus_bench(message: Message, args: list[str]) -> None:
+    try:
+        iterations = min(20, max(1, int(args[0]))) if args else 5
+    except ValueError:
+        await message.answer("Формат: /dpdiag bench [число прогонов 1–20]")
+        return
+
+    await message.answer(f"Замеряю все адреса Dentist Plus, прогонов: {iterations}…")
+    result = await yclients_client.benchmark_connection(iterations=iterations)
+
+    def pair(p50, p95) -> str:
+        return "—" if p50 is None else f"{p50}/{p95}"
+
+    lines = [f"⏱ Бенчмарк Dentist Plus (окно {result['window_days']} дн., p50/p95 в мс)"]
+    for host in result["hosts"]:
+        lines.append(
+            f"• {host['url']}\n"
+            f"  auth {pair(host['auth_p50_ms'], host['auth_p95_ms'])}, "
+            f"1-я страница {pair(host['first_page_p50_ms'], host['first_page_p95_ms'])}, "
+            f"окно {pair(host['window_p50_ms'], host['window_p95_ms'])}\n"
+            f"  страниц {host['pages']}, визитов {host['items']}, {host['items_per_second']}/с, "
+            f"ошибок {host['error_rate']:.0%}"
+        )
+        if host["last_error"]:
+            lines.append(f"  ошибка: {host['last_error'][:200]}")
+    await message.answer("\n".join(lines))
+
+
+def _format_client_metrics(snapshot: dict) -> list[str]:
+    """Сводка метрик клиента Dentist plus для /dpdiag: эндпоинты и счётчики с запуска."""
+    counters = snapshot.get("counters") or {}
+    latencies = (snapshot.get("histograms") or {}).get("dentist_plus_request_seconds") or {}
+
+    def total(name: str) -> float:
+        return sum((counters.get(name) or {}).values())
+
+    lines = []
+    for series, summary in sorted(latencies.items(), key=lambda item: -item[1]["count"])[:8]:
+        endpoint = series.removeprefix("endpoint=")
+        p50 = "—" if summary["p50"] is None else f"≤{summary['p50'] * 1000:g}мс"
+        p95 = "—" if summary["p95"] is None else f"≤{summary['p95'] * 1000:g}мс"
+        lines.append(f"  – {endpoint}: {summary['count']} запр., p50 {p50}, p95 {p95}")
+    if not lines:
+        return []
+
+    auth_errors = (counters.get("dentist_plus_auth_total") or {}).get("result=error", 0)
+    lines.insert(0, "• метрики с запуска:")
+    lines.append(
+        f"  повторы {total('dentist_plus_retries_total'):g}, "
+        f"ожидания лимита {total('dentist_plus_rate_limit_waits_total'):g} "
+        f"({total('dentist_plus_rate_limit_wait_seconds_total'):.1f}с), "
+        f"входы {total('dentist_plus_auth_total'):g} (ошибок {auth_errors:g}, по 401 "
+        f"{total('dentist_plus_auth_refreshes_total'):g}), "
+        f"смены хоста {total('dentist_plus_host_switches_total'):g}, "
+        f"получено {total('dentist_plus_response_bytes_total') / 1024:.0f} КБ"
+    )
+    return lines
+
+
 @commands_router.message(F.text.startswith("/dpdiag"))
 async def dentist_plus_diag_command(message: Message) -> None:
-    """Админ-команда диагностики Dentist plus: /dpdiag"""
+    """Админ-команда диагностики Dentist plus: /dpdiag, /dpdiag bench [прогонов]"""
     if message.from_user.id != settings.ADMIN_CHAT_ID:
         return
 
+    args = (message.text or "").split()[1:]
+    if args and args[0] == "bench":
+        await _dentist_plus_bench(message, args[1:])
+        return
+
     await message.answer("Проверяю подключение к Dentist Plus…")
     diag = await yclients_client.diagnose_connection()
 
@@ -763,10 +829,26 @@ async def dentist_plus_diag_command(message: Message) -> None:
         f"• кандидаты URL: {', '.join(diag.get('base_urls', []))}",
         f"• login: {'ok' if diag.get('login_configured') else 'missing'}",
         f"• password: {'ok' if diag.get('password_configured') else 'missing'}",
-        f"• branch_id: {diag.get('branch_id')}",
+        f"• branch_ids: {', '.join(map(str, diag.get('branch_ids') or [])) or '— (без фильтра)'}",
         f"• auth: {'ok' if diag.get('auth_ok') else 'fail'}",
     ]
 
+    for host in diag.get("hosts", []):
+        latency = f"p50={host['p50_ms']}мс p95={host['p95_ms']}мс" if host["p50_ms"] is not None else "нет замеров"
+        lines.append(
+            f"  – {host['url']}: {host['state']}, {latency}, "
+            f"ошибки {host['errors']}/{host['requests']}"
+        )
+    hedging = diag.get("hedging") or {}
+    if hedging.get("enabled"):
+        lines.append(f"• хеджирование: отправлено {hedging['sent']}, выиграло {hedging['won']}")
+    compression = diag.get("compression") or {}
+    lines.append(
+        f"• ответы: json={diag.get('json_decoder')}, "
+        f"сжатых {compression.get('compressed', 0)}/{compression.get('responses', 0)}"
+    )
+    lines.extend(_format_client_metrics(diag.get("metrics") or {}))
+
     auth_error = diag.get("auth_error")
     if auth_error:
         lines.append(f"• auth_error: {auth_error}")
@@ -778,6 +860,25 @@ async def dentist_plus_diag_command(message: Message) -> None:
     if visits_error:
         lines.append(f"• visits_error: {visits_error}")
 
+    mirror = visit_mirror.status()
+    if mirror["enabled"]:
+        lines.append(
+            f"• зеркало визитов: {'свежее' if mirror['fresh'] else 'устарело'}, "
+            f"last_sync={mirror['last_success_at'] or '—'}, visits={mirror.get('fetched', 0)}"
+        )
+        if mirror["last_error"]:
+            lines.append(f"• mirror_error: {mirror['last_error']}")
+
+    patients = patient_directory.status()
+    if patients["enabled"]:
+        lines.append(
+            f"• справочник пациентов: last_sync={patients['last_success_at'] or '—'}, "
+            f"patients={patients.get('fetched', 0)}, поиски локально/API/отказ="
+            f"{patients['lookups_local']}/{patients['lookups_api']}/{patients['lookups_negative']}"
+        )
+        if patients["last_error"]:
+            lines.append(f"• patients_error: {patients['last_error']}")
+
     if diag.get("auth_ok") and diag.get("visits_ok"):
         lines.append("✅ Подключение к API работает")
     else:
@@ -851,6 +952,7 @@ async def admin_run_reminder_check(message: Message, scheduler: ReminderSchedule
     lines = [
         "🧾 Результат remindcheck",
         f"• records_count: {stats.get('records_count', 0)}",
+        f"• source: {stats.get('source', 'api')}",
         f"• sent_count: {stats.get('sent_count', 0)}",
         f"• skipped_count: {stats.get('skipped_count', 0)}",
         f"• skip_no_user: {stats.get('skip_no_user', 0)}",
@@ -860,6 +962,13 @@ async def admin_run_reminder_check(message: Message, scheduler: ReminderSchedule
         f"• send_failed: {stats.get('send_failed', 0)}",
         f"• process_errors: {stats.get('process_errors', 0)}",
     ]
+    branches = stats.get("branches") or {}
+    if len(branches) > 1:
+        for branch_id, counts in branches.items():
+            lines.append(
+                f"• филиал {branch_id}: records={counts['records']}, "
+                f"sent={counts['sent']}, skipped={counts['skipped']}"
+            )
     if stats.get("error"):
         lines.append(f"• error: {stats['error']}")
     await message.answer("\n".join(lines))
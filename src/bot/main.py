@@ -13,9 +13,12 @@ from src.config import settings
 from src.database.database import db_manager
 from src.bot.handlers.callbacks import callback_router
 
+from src.services.metrics_server import start_metrics_server
+from src.services.notification_log import notification_log
 from src.services.scheduler import ReminderScheduler
 
 from src.services.yclients import yclients_client
+from src.utils.metrics import metrics
 
 _log_level = getattr(logging, settings.LOG_LEVEL, logging.INFO)
 logging.basicConfig(
@@ -32,10 +35,12 @@ scheduler = ReminderScheduler(bot)
 
 async def main() -> None:
     """Главная функция запуска бота"""
+    metrics_runner = None
     try:
         # 1. Инициализация БД
         await db_manager.init_db()
         logger.info("Database initialized")
+        logger.info("Dentist plus JSON decoder: %s", yclients_client.json_decoder)
 
         # Делаем scheduler доступным в хендлерах через DI.
         dp["scheduler"] = scheduler
@@ -54,12 +59,20 @@ async def main() -> None:
         scheduler.start()
         logger.info("Scheduler started")
 
+        # 6. Метрики для сбора снаружи (по умолчанию выключено)
+        if settings.METRICS_PORT:
+            metrics_runner = await start_metrics_server(metrics, settings.METRICS_HOST, settings.METRICS_PORT)
+
         logger.info("Bot started")
         await dp.start_polling(bot)
 
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         scheduler.shutdown()
         await bot.session.close()
+        # Дописать журнал уведомлений, пока соединение с БД ещё открыто
+        await notification_log.close()
         await db_manager.close()
         await yclients_client.close()
 
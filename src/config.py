@@ -33,6 +33,45 @@ class Settings(BaseSettings):
     DENTIST_PLUS_LOGIN: str = ""
     DENTIST_PLUS_PASSWORD: str = ""
     DENTIST_PLUS_BRANCH_ID: int = 0  # 0 => не фильтровать по филиалу
+    DENTIST_PLUS_BRANCH_IDS: str = ""  # несколько филиалов через запятую ("2,5"), перекрывает DENTIST_PLUS_BRANCH_ID
+    DENTIST_PLUS_PAGE_CONCURRENCY: int = 4  # сколько страниц /visits качать параллельно (1 = последовательно)
+    DENTIST_PLUS_JSON_DECODER: str = "auto"  # auto (orjson, при его отсутствии json) | orjson | json
+    DENTIST_PLUS_RANGE_CHUNK_DAYS: int = 7  # многостраничные окна /visits длиннее N дней качаются кусками параллельно, 0 => одним диапазоном
+    DENTIST_PLUS_RATE_LIMIT_PER_MINUTE: int = 60  # не больше N запросов в любом окне 60 секунд
+    DENTIST_PLUS_RATE_LIMIT_BURST: int = 5  # сколько запросов можно отправить подряд без ожидания
+    DENTIST_PLUS_TOKEN_CACHE_PATH: str = ""  # файл для токена между перезапусками, "" => не сохранять
+    DENTIST_PLUS_REFERENCE_TTL_SECONDS: int = 3600  # сколько справочники (статусы, доктора, услуги) считаются свежими
+    DENTIST_PLUS_REFERENCE_CACHE_PATH: str = ""  # снапшот справочников для тёплого старта, "" => не сохранять
+    DENTIST_PLUS_VISITS_CACHE_TTL_SECONDS: int = 120  # окно /visits переиспользуется между напоминаниями, отчётом и хендлерами
+    DENTIST_PLUS_VISITS_CACHE_STALE_SECONDS: int = 300  # ещё столько отдаём старое окно, обновляя его в фоне
+    DENTIST_PLUS_SEMANTICS_PATH: str = ""  # файл с выученным поведением API (date_to, филиал), "" => не сохранять
+    DENTIST_PLUS_SEMANTICS_RECHECK_HOURS: int = 24  # как часто перепроверять выученное поведение API
+    DENTIST_PLUS_RETRY_ATTEMPTS: int = 3  # попыток на запрос (1 = без повторов)
+    DENTIST_PLUS_RETRY_BASE_DELAY: float = 0.5  # базовая пауза backoff, удваивается с каждой попыткой (с jitter)
+    DENTIST_PLUS_RETRY_MAX_DELAY: float = 10.0  # потолок паузы между попытками
+    DENTIST_PLUS_RETRY_BUDGET_RATIO: float = 0.2  # доля повторов от числа запросов на каждый вид запроса
+    DENTIST_PLUS_BREAKER_FAILURES: int = 3  # ошибок подряд, после которых хост API временно исключается
+    DENTIST_PLUS_BREAKER_OPEN_SECONDS: int = 30  # на сколько исключается хост до пробного запроса
+    DENTIST_PLUS_HEDGING_ENABLED: bool = True  # дублировать медленные GET пациента на второй хост
+    DENTIST_PLUS_HEDGE_DELAY_MS: int = 1500  # через сколько дублировать, пока нет замеров p95 хоста
+    DENTIST_PLUS_POOL_LIMIT: int = 20  # всего открытых соединений к API
+    DENTIST_PLUS_POOL_LIMIT_PER_HOST: int = 10  # соединений на один хост API
+    DENTIST_PLUS_KEEPALIVE_SECONDS: float = 30  # сколько держать простаивающее соединение открытым
+    DENTIST_PLUS_DNS_CACHE_SECONDS: int = 300  # кэш DNS хостов API, 0 => без кэша
+    DENTIST_PLUS_CONNECT_TIMEOUT_SECONDS: float = 5  # установка соединения (TCP + TLS)
+    DENTIST_PLUS_INTERACTIVE_TIMEOUT_SECONDS: float = 8  # весь запрос, когда пациент ждёт ответа в чате
+    DENTIST_PLUS_BATCH_TIMEOUT_SECONDS: float = 60  # весь запрос в фоновых задачах (напоминания, синхронизация)
+    VISITS_MIRROR_ENABLED: bool = False  # держать локальную копию визитов и читать из неё
+    VISITS_SYNC_INTERVAL_MINUTES: int = 15  # как часто подтягивать изменения из Dentist plus
+    VISITS_SYNC_DAYS_AHEAD: int = 180  # окно зеркала: сегодня .. +N дней
+    PATIENTS_DIRECTORY_ENABLED: bool = False  # искать пациента по телефону в локальном справочнике
+    PATIENTS_SYNC_INTERVAL_MINUTES: int = 360  # как часто выгружать базу пациентов целиком
+    PATIENTS_NEGATIVE_CACHE_SECONDS: int = 300  # столько не ищем в API номер, которого там не нашли, 0 => всегда ищем
+    NOTIFICATION_LOG_BATCH_SIZE: int = 50  # журнал уведомлений пишется пачками по N записей
+    NOTIFICATION_LOG_FLUSH_SECONDS: float = 2  # ... или раз в N секунд; 0 => писать сразу, без буфера
+    NOTIFICATION_LOG_MAX_BUFFER: int = 1000  # больше N записей в очереди — отправитель ждёт записи в БД
+    METRICS_PORT: int = 0  # порт HTTP /metrics для Prometheus, 0 => не поднимать
+    METRICS_HOST: str = "127.0.0.1"  # адрес /metrics; 0.0.0.0 — если собирают из другого контейнера
     REMINDER_CHECK_TIME: str  # "HH:MM", например "10:00" — во сколько отправлять напоминания
     REMINDER_TIMEZONE: str = "UTC"  # таймзона для "завтра" и времени запуска (например Europe/Moscow)
     REMINDER_SIGNATURE: str = "команда доктора Шевцовой🦷"
@@ -1,16 +1,37 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Iterable, Optional
 
-from sqlalchemy import select, update
+from sqlalchemy import Row, and_, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import desc
-from src.database.models import User, Reminder, RescheduleRequest, NotificationLog
+from src.database.models import User, Reminder, RescheduleRequest, NotificationLog, PatientDirectory, VisitMirror
+
+
+def _dialect_insert(session: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для текущей БД (Postgres или SQLite)."""
+    dialect = session.bind.dialect.name if session.bind is not None else ""
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise RuntimeError(
+        f"Upsert (INSERT ... ON CONFLICT) needs PostgreSQL or SQLite, got dialect {dialect!r}"
+    )
+
+
+def _chunked(rows: list[Any], size: int) -> Iterable[list[Any]]:
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
 
 
 # Класс UserCRUD
 
 class UserCRUD:
+    # SQLite ограничивает число параметров в запросе — ищем пачками
+    _BATCH_SIZE = 500
+
     @staticmethod
     async def get_by_chat_id(session: AsyncSession, chat_id: int) -> Optional[User]:
         result = await session.execute(
@@ -110,6 +131,21 @@ class UserCRUD:
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_many_by_yclients_client_ids(
+        session: AsyncSession,
+        yclients_client_ids: Iterable[int],
+    ) -> dict[int, User]:
+        """Пользователи по Dentist plus client ID одним IN-запросом на пачку: {client_id: User}."""
+        users: dict[int, User] = {}
+        for batch in _chunked(sorted(set(yclients_client_ids)), UserCRUD._BATCH_SIZE):
+            result = await session.execute(
+                select(User).where(User.yclients_client_id.in_(batch)).order_by(User.id)
+            )
+            for user in result.scalars():
+                users.setdefault(user.yclients_client_id, user)
+        return users
+
     @staticmethod
     async def list_registered(session: AsyncSession) -> list[User]:
         """Все пользователи с флагом is_registered (для админ-отчёта)."""
@@ -122,6 +158,9 @@ class UserCRUD:
 # Класс ReminderCRUD
 
 class ReminderCRUD:
+    # SQLite ограничивает число параметров в запросе — пишем пачками
+    _BATCH_SIZE = 500
+
     @staticmethod
     async def get_by_record_id(session: AsyncSession, record_id: int) -> Optional[Reminder]:
         result = await session.execute(
@@ -153,6 +192,89 @@ class ReminderCRUD:
         await session.refresh(reminder)
         return reminder
     
+    @staticmethod
+    async def upsert_many(session: AsyncSession, rows: list[dict[str, Any]]) -> list[Reminder]:
+        """
+        Напоминания на визиты одним INSERT ... ON CONFLICT (record_id) на пачку.
+
+        Ещё не отправленные получают из визита свежие время, доктора и услугу,
+        отправленные не трогаются. Возвращает неотправленные — их и нужно слать.
+        """
+        pending: list[Reminder] = []
+        for batch in _chunked(rows, ReminderCRUD._BATCH_SIZE):
+            stmt = _dialect_insert(session, Reminder).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Reminder.record_id],
+                set_={
+                    **{column: stmt.excluded[column] for column in batch[0] if column != "record_id"},
+                    "updated_at": func.now(),
+                },
+                where=Reminder.is_sent.is_(False),
+            ).returning(Reminder)
+            result = await session.scalars(stmt, execution_options={"populate_existing": True})
+            pending.extend(result.all())
+        await session.commit()
+        return pending
+
+    @staticmethod
+    async def get_report_state(session: AsyncSession, record_ids: Iterable[int]) -> dict[int, Row]:
+        """
+        Состояние напоминаний для админ-отчёта одним запросом на пачку: {record_id: строка}.
+
+        В строке — флаги напоминания (is_sent, is_confirmed, is_cancelled), статус
+        последнего запроса на перенос (reschedule_status) и исход последней записи
+        журнала о напоминании (log_is_successful, log_error_message); None — такой нет.
+        Записи без напоминания в результат не попадают.
+        """
+        state: dict[int, Row] = {}
+        for batch in _chunked(sorted(set(record_ids)), ReminderCRUD._BATCH_SIZE):
+            reschedule = (
+                select(
+                    RescheduleRequest.record_id,
+                    RescheduleRequest.status,
+                    func.row_number()
+                    .over(
+                        partition_by=RescheduleRequest.record_id,
+                        order_by=(desc(RescheduleRequest.created_at), desc(RescheduleRequest.id)),
+                    )
+                    .label("rn"),
+                )
+                .where(RescheduleRequest.record_id.in_(batch))
+                .subquery()
+            )
+            last_log = (
+                select(
+                    NotificationLog.record_id,
+                    NotificationLog.is_successful,
+                    NotificationLog.error_message,
+                    func.row_number()
+                    .over(
+                        partition_by=NotificationLog.record_id,
+                        order_by=(desc(NotificationLog.sent_at), desc(NotificationLog.id)),
+                    )
+                    .label("rn"),
+                )
+                .where(NotificationLog.record_id.in_(batch), NotificationLog.message_type == "reminder")
+                .subquery()
+            )
+            result = await session.execute(
+                select(
+                    Reminder.record_id,
+                    Reminder.is_sent,
+                    Reminder.is_confirmed,
+                    Reminder.is_cancelled,
+                    reschedule.c.status.label("reschedule_status"),
+                    last_log.c.is_successful.label("log_is_successful"),
+                    last_log.c.error_message.label("log_error_message"),
+                )
+                .select_from(Reminder)
+                .outerjoin(reschedule, and_(reschedule.c.record_id == Reminder.record_id, reschedule.c.rn == 1))
+                .outerjoin(last_log, and_(last_log.c.record_id == Reminder.record_id, last_log.c.rn == 1))
+                .where(Reminder.record_id.in_(batch))
+            )
+            state.update({row.record_id: row for row in result})
+        return state
+
     @staticmethod
     async def mark_as_sent(session: AsyncSession, record_id: int) -> None:
         await session.execute(
@@ -287,6 +409,15 @@ class NotificationLogCRUD:
         await session.refresh(log_entry)
         return log_entry
 
+    @staticmethod
+    async def insert_many(session: AsyncSession, rows: list[dict[str, Any]]) -> None:
+        """Пачка записей журнала одним executemany, без чтения вставленных строк обратно."""
+        if not rows:
+            return
+        # render_nulls: иначе записи с error_message=None и без него уходят разными INSERT
+        await session.execute(insert(NotificationLog), rows, execution_options={"render_nulls": True})
+        await session.commit()
+
     @staticmethod
     async def get_latest_by_record_and_type(
         session: AsyncSession,
@@ -302,4 +433,168 @@ class NotificationLogCRUD:
             .order_by(desc(NotificationLog.sent_at))
             .limit(1)
         )
-        return result.scalar_one_or_none()
\ No newline at end of file
+        return result.scalar_one_or_none()
+
+
+# Класс VisitMirrorCRUD
+
+class VisitMirrorCRUD:
+    # SQLite ограничивает число параметров в запросе — пишем пачками
+    _BATCH_SIZE = 500
+
+    @staticmethod
+    async def get_hashes(session: AsyncSession, visit_ids: list[int]) -> dict[int, str]:
+        """payload_hash уже сохранённых визитов — чтобы писать только изменившиеся."""
+        hashes: dict[int, str] = {}
+        for batch in _chunked(visit_ids, VisitMirrorCRUD._BATCH_SIZE):
+            result = await session.execute(
+                select(VisitMirror.id, VisitMirror.payload_hash).where(VisitMirror.id.in_(batch))
+            )
+            hashes.update({row.id: row.payload_hash for row in result})
+        return hashes
+
+    @staticmethod
+    async def upsert_many(session: AsyncSession, rows: list[dict[str, Any]]) -> int:
+        """INSERT ... ON CONFLICT (id) DO UPDATE для переданных визитов."""
+        if not rows:
+            return 0
+        for batch in _chunked(rows, VisitMirrorCRUD._BATCH_SIZE):
+            stmt = _dialect_insert(session, VisitMirror).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[VisitMirror.id],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in batch[0]
+                    if column != "id"
+                },
+            )
+            await session.execute(stmt)
+        await session.commit()
+        return len(rows)
+
+    @staticmethod
+    async def touch(session: AsyncSession, visit_ids: list[int], synced_at: datetime) -> None:
+        for batch in _chunked(visit_ids, VisitMirrorCRUD._BATCH_SIZE):
+            await session.execute(
+                update(VisitMirror).where(VisitMirror.id.in_(batch)).values(synced_at=synced_at)
+            )
+        await session.commit()
+
+    @staticmethod
+    async def delete_missing(
+        session: AsyncSession,
+        start: datetime,
+        end: datetime,
+        keep_ids: set[int],
+    ) -> int:
+        """Удаляет визиты окна [start, end), которых больше нет в API."""
+        result = await session.execute(
+            select(VisitMirror.id).where(
+                VisitMirror.appointment_datetime >= start,
+                VisitMirror.appointment_datetime < end,
+            )
+        )
+        stale = [visit_id for visit_id in result.scalars() if visit_id not in keep_ids]
+        for batch in _chunked(stale, VisitMirrorCRUD._BATCH_SIZE):
+            await session.execute(delete(VisitMirror).where(VisitMirror.id.in_(batch)))
+        await session.commit()
+        return len(stale)
+
+    @staticmethod
+    async def delete_before(session: AsyncSession, before: datetime) -> int:
+        result = await session.execute(
+            delete(VisitMirror).where(VisitMirror.appointment_datetime < before)
+        )
+        await session.commit()
+        return result.rowcount or 0
+
+    @staticmethod
+    async def get_window(
+        session: AsyncSession,
+        start: datetime,
+        end: datetime,
+        client_id: Optional[int] = None,
+    ) -> list[VisitMirror]:
+        """Визиты с appointment_datetime в [start, end), по возрастанию времени."""
+        query = select(VisitMirror).where(
+            VisitMirror.appointment_datetime >= start,
+            VisitMirror.appointment_datetime < end,
+        )
+        if client_id is not None:
+            query = query.where(VisitMirror.client_id == client_id)
+        result = await session.execute(query.order_by(VisitMirror.appointment_datetime, VisitMirror.id))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def count(session: AsyncSession) -> int:
+        result = await session.execute(select(func.count()).select_from(VisitMirror))
+        return int(result.scalar_one())
+
+
+# Класс PatientDirectoryCRUD
+
+class PatientDirectoryCRUD:
+    _BATCH_SIZE = 500
+
+    @staticmethod
+    async def get_hashes(session: AsyncSession) -> dict[int, str]:
+        """payload_hash всех пациентов справочника (синхронизация всегда полная)."""
+        result = await session.execute(select(PatientDirectory.id, PatientDirectory.payload_hash))
+        return {row.id: row.payload_hash for row in result}
+
+    @staticmethod
+    async def upsert_many(session: AsyncSession, rows: list[dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        for batch in _chunked(rows, PatientDirectoryCRUD._BATCH_SIZE):
+            stmt = _dialect_insert(session, PatientDirectory).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[PatientDirectory.id],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in batch[0]
+                    if column != "id"
+                },
+            )
+            await session.execute(stmt)
+        await session.commit()
+        return len(rows)
+
+    @staticmethod
+    async def delete_ids(session: AsyncSession, patient_ids: list[int]) -> int:
+        for batch in _chunked(patient_ids, PatientDirectoryCRUD._BATCH_SIZE):
+            await session.execute(delete(PatientDirectory).where(PatientDirectory.id.in_(batch)))
+        await session.commit()
+        return len(patient_ids)
+
+    @staticmethod
+    async def find_by_phone(
+        session: AsyncSession,
+        phone_e164: Optional[str],
+        phone_suffix: Optional[str],
+    ) -> Optional[PatientDirectory]:
+        """Точное совпадение по E.164, иначе — по последним 10 цифрам (номера без кода страны)."""
+        if phone_e164:
+            result = await session.execute(
+                select(PatientDirectory)
+                .where(PatientDirectory.phone_e164 == phone_e164)
+                .order_by(PatientDirectory.id)
+                .limit(1)
+            )
+            patient = result.scalar_one_or_none()
+            if patient:
+                return patient
+        if phone_suffix:
+            result = await session.execute(
+                select(PatientDirectory)
+                .where(PatientDirectory.phone_suffix == phone_suffix)
+                .order_by(PatientDirectory.id)
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+        return None
+
+    @staticmethod
+    async def count(session: AsyncSession) -> int:
+        result = await session.execute(select(func.count()).select_from(PatientDirectory))
+        return int(result.scalar_one())
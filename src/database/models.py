@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import BigInteger, Boolean, DateTime, Integer, String, Text, func
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, Integer, String, Text, and_, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -18,7 +18,7 @@ class User(Base):
     phone: Mapped[str] = mapped_column(String(20), unique=True, index=True)
     full_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     email: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    yclients_client_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    yclients_client_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
     is_registered: Mapped[bool] = mapped_column(Boolean, default=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -74,4 +74,73 @@ class NotificationLog(Base):
     record_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     is_successful: Mapped[bool] = mapped_column(Boolean, default=True)
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+# Модель VisitMirror — локальная копия визитов Dentist plus (синхронизируется в фоне)
+
+class VisitMirror(Base):
+    __tablename__ = "visits"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # id визита в Dentist plus
+    client_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+    client_name: Mapped[str] = mapped_column(String(255), default="")
+    client_phone: Mapped[str] = mapped_column(String(32), default="")
+    staff_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    staff_name: Mapped[str] = mapped_column(String(255), default="")
+    branch_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    appointment_datetime: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    is_cancelled: Mapped[bool] = mapped_column(Boolean, default=False)
+    payload_hash: Mapped[str] = mapped_column(String(40))
+    synced_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+# Модель PatientDirectory — локальный справочник пациентов Dentist plus для регистрации по телефону
+
+class PatientDirectory(Base):
+    __tablename__ = "patients"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # id пациента в Dentist plus
+    name: Mapped[str] = mapped_column(String(255), default="")
+    email: Mapped[str] = mapped_column(String(255), default="")
+    phone: Mapped[str] = mapped_column(String(32), default="")  # как в Dentist plus
+    phone_e164: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
+    phone_suffix: Mapped[Optional[str]] = mapped_column(String(10), nullable=True, index=True)  # последние 10 цифр
+    payload_hash: Mapped[str] = mapped_column(String(40))
+    synced_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+# Индексы под горячие запросы crud.py (составные и частичные — для Postgres и SQLite)
+
+# Последнее уведомление по записи и типу: NotificationLogCRUD.get_latest_by_record_and_type, отчёт
+Index(
+    "ix_notification_logs_record_type_sent",
+    NotificationLog.record_id,
+    NotificationLog.message_type,
+    NotificationLog.sent_at.desc(),
+)
+
+# Последний запрос на перенос по записи: RescheduleRequestCRUD.get_latest_by_record_id, отчёт
+Index(
+    "ix_reschedule_requests_record_created",
+    RescheduleRequest.record_id,
+    RescheduleRequest.created_at.desc(),
+)
+
+# Только ожидающие отправки напоминания — их мало, а таблица растёт каждый день:
+# ReminderCRUD.get_unsent_reminders
+_unsent_reminder = and_(Reminder.is_sent == False, Reminder.is_cancelled == False)
+Index(
+    "ix_reminders_unsent_appointment",
+    Reminder.appointment_datetime,
+    postgresql_where=_unsent_reminder,
+    sqlite_where=_unsent_reminder,
+)
+
+# Зарегистрированные пользователи по порядку id: UserCRUD.list_registered
+Index(
+    "ix_users_registered_id",
+    User.id,
+    postgresql_where=User.is_registered.is_(True),
+    sqlite_where=User.is_registered.is_(True),
+)
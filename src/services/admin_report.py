@@ -1,21 +1,19 @@
+import asyncio
 import logging
 from datetime import date, datetime, timedelta
-from typing import Any
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import Row
 
 from src.config import settings
-from src.database.crud import NotificationLogCRUD, ReminderCRUD, RescheduleRequestCRUD, UserCRUD
+from src.database.crud import ReminderCRUD, UserCRUD
 from src.database.database import db_manager
+from src.services.notification_log import notification_log
+from src.services.visit_mirror import visit_mirror
 from src.services.yclients import yclients_client
-from src.utils.record_helpers import (
-    record_appointment_datetime,
-    record_client_id,
-    record_id as record_id_safe,
-    record_staff_name,
-)
+from src.utils.visit import Visit
 
 logger = logging.getLogger(__name__)
 
@@ -56,42 +54,12 @@ async def send_admin_report_for_date(bot: Bot, target: date) -> None:
         tz = ZoneInfo("UTC")
 
     start = datetime(target.year, target.month, target.day, 0, 0, 0, tzinfo=tz)
-    end = start  # API принимает только даты
+    # Ошибки отправки из буфера журнала должны попасть в отчёт
+    await notification_log.flush()
 
-    records: list[dict[str, Any]] = []
-    try:
-        records = await yclients_client.get_records(start_date=start, end_date=end)
-        if not records:
-            # fallback: inclusive/exclusive end_date
-            records = await yclients_client.get_records(
-                start_date=start,
-                end_date=start + timedelta(days=1),
-            )
-            # оставляем только target
-            filtered = []
-            for r in records:
-                appt = record_appointment_datetime(r) if isinstance(r, dict) else None
-                if appt and appt.astimezone(tz).date() == target:
-                    filtered.append(r)
-            records = filtered
-    except Exception as e:
-        logger.error("Failed to build admin report (Dentist plus): %s", e, exc_info=True)
-
-    # Подтягиваем пользователей по yclients_client_id (чтобы знать, кто зарегистрирован в боте)
-    client_ids: set[int] = set()
-    for r in records:
-        if not isinstance(r, dict):
-            continue
-        cid = record_client_id(r)
-        if cid is not None:
-            client_ids.add(cid)
-
-    users_by_client_id: dict[int, int] = {}  # yclients_client_id -> user_chat_id
-    async for session in db_manager.get_session():
-        for cid in client_ids:
-            user = await UserCRUD.get_by_yclients_client_id(session=session, yclients_client_id=cid)
-            if user:
-                users_by_client_id[cid] = user.chat_id
+    records: list[Visit] = []
+    users_by_client_id: dict[int, int | None] = {}  # yclients_client_id -> user_chat_id
+    reminder_state: dict[int, Row] = {}  # record_id -> состояние напоминания (ReminderCRUD.get_report_state)
 
     sent = 0
     not_sent = 0
@@ -101,110 +69,139 @@ async def send_admin_report_for_date(bot: Bot, target: date) -> None:
     reschedule = 0
 
     lines: list[str] = []
-    async for session in db_manager.get_session():
-        for r in records:
-            if not isinstance(r, dict):
-                continue
-
-            rid = record_id_safe(r)
-            cid = record_client_id(r)
-            appt = record_appointment_datetime(r)
-            if rid is None or cid is None or appt is None:
-                continue
-
-            appt_local = appt.astimezone(tz)
-            if appt_local.date() != target:
-                continue
-
-            doctor = record_staff_name(r)
-            patient_name = ""
-            client = r.get("client") if isinstance(r.get("client"), dict) else {}
-            if isinstance(client, dict):
-                patient_name = str(client.get("name") or "").strip()
-            if not patient_name:
-                patient_name = f"#{cid}"
-
-            user_chat_id = users_by_client_id.get(cid)
-            if not user_chat_id:
-                no_bot += 1
-                lines.append(
-                    _format_record_line(
-                        appt=appt_local,
-                        patient=patient_name,
-                        doctor=doctor,
-                        status="не зарегистрирован в боте",
-                    )
-                )
-                continue
-
-            reminder = await ReminderCRUD.get_by_record_id(session=session, record_id=rid)
-            if not reminder:
-                not_sent += 1
-                lines.append(
-                    _format_record_line(
-                        appt=appt_local,
-                        patient=patient_name,
-                        doctor=doctor,
-                        status="нет записи reminder в БД (не отправлено)",
-                    )
+
+    def render(visit: Visit) -> None:
+        nonlocal sent, not_sent, no_bot, confirmed, cancelled, reschedule
+
+        rid = visit.id
+        cid = visit.client_id
+        if cid is None:
+            return
+
+        appt_local = visit.start.astimezone(tz)
+        if appt_local.date() != target:
+            return
+
+        doctor = visit.doctor_name
+        patient_name = visit.client_name.strip() or f"#{cid}"
+
+        # Пользователь бота по yclients_client_id (чтобы знать, кто зарегистрирован в боте)
+        user_chat_id = users_by_client_id.get(cid)
+        if not user_chat_id:
+            no_bot += 1
+            lines.append(
+                _format_record_line(
+                    appt=appt_local,
+                    patient=patient_name,
+                    doctor=doctor,
+                    status="не зарегистрирован в боте",
                 )
-                continue
-
-            # Ответ пациента
-            answer = "⌛ ответа нет"
-            if reminder.is_confirmed:
-                answer = "✅ подтверждено"
-                confirmed += 1
-            elif reminder.is_cancelled:
-                answer = "❌ отменено"
-                cancelled += 1
-            else:
-                req = await RescheduleRequestCRUD.get_latest_by_record_id(
-                    session=session,
-                    record_id=rid,
+            )
+            return
+
+        reminder = reminder_state.get(rid)
+        if reminder is None:
+            not_sent += 1
+            lines.append(
+                _format_record_line(
+                    appt=appt_local,
+                    patient=patient_name,
+                    doctor=doctor,
+                    status="нет записи reminder в БД (не отправлено)",
                 )
-                if req and req.status == "pending":
-                    answer = "🔄 запрос на перенос"
-                    reschedule += 1
-
-            # Отправка
-            if reminder.is_sent:
-                sent += 1
-                lines.append(
-                    _format_record_line(
-                        appt=appt_local,
-                        patient=patient_name,
-                        doctor=doctor,
-                        status=f"отправлено · {answer}",
-                    )
+            )
+            return
+
+        # Ответ пациента
+        answer = "⌛ ответа нет"
+        if reminder.is_confirmed:
+            answer = "✅ подтверждено"
+            confirmed += 1
+        elif reminder.is_cancelled:
+            answer = "❌ отменено"
+            cancelled += 1
+        elif reminder.reschedule_status == "pending":
+            answer = "🔄 запрос на перенос"
+            reschedule += 1
+
+        # Отправка
+        if reminder.is_sent:
+            sent += 1
+            lines.append(
+                _format_record_line(
+                    appt=appt_local,
+                    patient=patient_name,
+                    doctor=doctor,
+                    status=f"отправлено · {answer}",
                 )
-                continue
+            )
+            return
 
-            not_sent += 1
-            last_log = await NotificationLogCRUD.get_latest_by_record_and_type(
-                session=session,
-                record_id=rid,
-                message_type="reminder",
+        not_sent += 1
+        # Последняя попытка отправки упала — показываем ошибку
+        if reminder.log_is_successful is not None and not reminder.log_is_successful:
+            err = (reminder.log_error_message or "ошибка").strip()
+            lines.append(
+                _format_record_line(
+                    appt=appt_local,
+                    patient=patient_name,
+                    doctor=doctor,
+                    status=f"НЕ отправлено · ошибка: {err} · {answer}",
+                )
             )
-            if last_log and not last_log.is_successful:
-                err = (last_log.error_message or "ошибка").strip()
-                lines.append(
-                    _format_record_line(
-                        appt=appt_local,
-                        patient=patient_name,
-                        doctor=doctor,
-                        status=f"НЕ отправлено · ошибка: {err} · {answer}",
-                    )
+        else:
+            lines.append(
+                _format_record_line(
+                    appt=appt_local,
+                    patient=patient_name,
+                    doctor=doctor,
+                    status=f"НЕ отправлено · {answer}",
                 )
+            )
+
+    async def fetch_branch(branch_id: int | None) -> list[Visit]:
+        # Трактовку date_to клиент выучил сам, в список попадает только target
+        return [visit async for visit in yclients_client.iter_records_for_day(target, branch_id=branch_id)]
+
+    async for session in db_manager.get_session():
+        try:
+            day_after = start + timedelta(days=1)
+            if visit_mirror.can_serve(start, day_after):
+                # Зеркало свежее и покрывает день — точный диапазон из БД
+                visits = await visit_mirror.get_records(start, day_after)
             else:
-                lines.append(
-                    _format_record_line(
-                        appt=appt_local,
-                        patient=patient_name,
-                        doctor=doctor,
-                        status=f"НЕ отправлено · {answer}",
+                # Филиалы качаются из Dentist plus параллельно
+                branches = yclients_client.branch_ids or [None]
+                per_branch = await asyncio.gather(*(fetch_branch(branch_id) for branch_id in branches))
+                visits = list({visit.id: visit for chunk in per_branch for visit in chunk}.values())
+
+            # Все пользователи бота за день — одним запросом по индексу, а не по запросу на визит
+            users = await UserCRUD.get_many_by_yclients_client_ids(
+                session, (visit.client_id for visit in visits if visit.client_id is not None)
+            )
+            users_by_client_id.update({cid: user.chat_id for cid, user in users.items()})
+            # Напоминания, последние запросы на перенос и ошибки отправки — тоже одним запросом;
+            # дальше отчёт собирается в памяти
+            reminder_state.update(await ReminderCRUD.get_report_state(session, (visit.id for visit in visits)))
+
+            by_branch: dict[int | None, list[Visit]] = {}
+            for visit in visits:
+                by_branch.setdefault(visit.branch_id, []).append(visit)
+            for branch_id, branch_visits in by_branch.items():
+                summary_at = len(lines)
+                before = (sent, not_sent, no_bot)
+                for visit in branch_visits:
+                    records.append(visit)
+                    render(visit)
+                if len(by_branch) > 1:
+                    lines.insert(
+                        summary_at,
+                        f"\n🏥 Филиал {branch_id if branch_id is not None else '—'}: "
+                        f"записей {len(branch_visits)}, отправлено {sent - before[0]}, "
+                        f"не отправлено {not_sent - before[1]}, не в боте {no_bot - before[2]}",
                     )
-                )
+        except Exception as e:
+            logger.error("Failed to build admin report: %s", e, exc_info=True)
 
     header = (
         f"📋 Отчёт по напоминаниям на {target.strftime('%d.%m.%Y')}\n"
@@ -0,0 +1,26 @@
+"""Локальный HTTP-эндпоинт /metrics для сбора метрик (Prometheus и совместимые)."""
+import logging
+
+from aiohttp import web
+
+from src.utils.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> web.AppRunner:
+    """Поднимает GET /metrics на host:port; остановка — await runner.cleanup()."""
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics endpoint listening on http://%s:%s/metrics", host, port)
+    return runner
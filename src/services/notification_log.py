@@ -0,0 +1,116 @@
+"""Буферизованная запись журнала уведомлений (notification_logs) пачками."""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from src.config import settings
+from src.database.crud import NotificationLogCRUD
+from src.database.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationLogWriter:
+    """
+    Журнал уведомлений без коммита на каждую отправку.
+
+    log() кладёт запись в очередь в памяти; очередь пишется в БД одним INSERT,
+    когда набралось batch_size записей или прошло flush_interval секунд.
+    Время записи (sent_at) фиксируется в момент log(), а не в момент вставки.
+    Очередь ограничена max_buffer: если БД не успевает, log() ждёт записи,
+    а не копит память. close() дописывает остаток — его зовёт main() при остановке.
+
+    sync=True (или NOTIFICATION_LOG_FLUSH_SECONDS=0) — каждая запись пишется сразу,
+    удобно в тестах.
+    """
+
+    def __init__(self):
+        self.batch_size = max(1, settings.NOTIFICATION_LOG_BATCH_SIZE)
+        self.flush_interval = max(0.0, settings.NOTIFICATION_LOG_FLUSH_SECONDS)
+        self.max_buffer = max(self.batch_size, settings.NOTIFICATION_LOG_MAX_BUFFER)
+        self.sync = self.flush_interval == 0
+        self.stats = {"logged": 0, "written": 0, "flushes": 0, "dropped": 0}
+        self._buffer: list[dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        # Таймер только ждёт flush_interval; сама запись идёт в фоновых задачах _flushes
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def log(
+        self,
+        chat_id: int,
+        message_type: str,
+        record_id: Optional[int] = None,
+        is_successful: bool = True,
+        error_message: Optional[str] = None,
+    ) -> None:
+        """Аргументы — как у NotificationLogCRUD.log_notification, только без сессии."""
+        self._buffer.append(
+            {
+                "chat_id": chat_id,
+                "message_type": message_type,
+                "record_id": record_id,
+                "is_successful": is_successful,
+                "error_message": error_message,
+                "sent_at": datetime.now(timezone.utc),
+            }
+        )
+        self.stats["logged"] += 1
+        if self.sync or len(self._buffer) >= self.max_buffer:
+            await self.flush()
+        elif len(self._buffer) >= self.batch_size:
+            if not self._flushes:
+                self._start_flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def _start_flush(self) -> None:
+        task = asyncio.create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._start_flush()
+
+    async def flush(self) -> int:
+        """Пишет накопленное в БД; возвращает число записанных строк."""
+        async with self._lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                async for session in db_manager.get_session():
+                    await NotificationLogCRUD.insert_many(session, rows)
+            except asyncio.CancelledError:
+                # Запись прервали — строки не должны пропасть вместе с задачей
+                self._buffer = rows + self._buffer
+                raise
+            except Exception as e:
+                # Вернуть в очередь и попробовать со следующей пачкой; старейшие
+                # записи теряются, только если очередь переполнена
+                self._buffer = rows + self._buffer
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.stats["dropped"] += overflow
+                logger.error("Failed to write %s notification log entries: %s", len(rows), e)
+                return 0
+            self.stats["written"] += len(rows)
+            self.stats["flushes"] += 1
+            return len(rows)
+
+    async def close(self) -> None:
+        """Остановить таймер, дождаться начатых записей и дописать остаток очереди."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+        self._timer = None
+        # Начатую запись не отменяем: её строки уже вынуты из очереди
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+
+
+notification_log = NotificationLogWriter()
@@ -6,9 +6,10 @@ from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 
 from src.config import settings
-from src.database.crud import NotificationLogCRUD, ReminderCRUD
+from src.database.crud import ReminderCRUD
 from src.database.database import db_manager
 from src.database.models import Reminder
+from src.services.notification_log import notification_log
 
 logger = logging.getLogger(__name__)
 
@@ -70,13 +71,12 @@ async def send_reminder_notification(bot: Bot, reminder: Reminder) -> bool:
 
         async for session in db_manager.get_session():
             await ReminderCRUD.mark_as_sent(session=session, record_id=reminder.record_id)
-            await NotificationLogCRUD.log_notification(
-                session=session,
-                chat_id=reminder.user_chat_id,
-                message_type="reminder",
-                record_id=reminder.record_id,
-                is_successful=True,
-            )
+        await notification_log.log(
+            chat_id=reminder.user_chat_id,
+            message_type="reminder",
+            record_id=reminder.record_id,
+            is_successful=True,
+        )
 
         logger.info(f"Reminder {reminder.id} sent to {reminder.user_chat_id}")
         return True
@@ -96,15 +96,13 @@ async def send_reminder_notification(bot: Bot, reminder: Reminder) -> bool:
         )
 
         try:
-            async for session in db_manager.get_session():
-                await NotificationLogCRUD.log_notification(
-                    session=session,
-                    chat_id=reminder.user_chat_id,
-                    message_type="reminder",
-                    record_id=reminder.record_id,
-                    is_successful=False,
-                    error_message=str(e),
-                )
+            await notification_log.log(
+                chat_id=reminder.user_chat_id,
+                message_type="reminder",
+                record_id=reminder.record_id,
+                is_successful=False,
+                error_message=str(e),
+            )
         except Exception as log_error:
             logger.error(f"Failed to log notification error: {str(log_error)}")
 
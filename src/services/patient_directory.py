@@ -0,0 +1,166 @@
+"""Локальный справочник пациентов Dentist plus: регистрация по телефону без поиска в API."""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from src.config import settings
+from src.database.crud import PatientDirectoryCRUD
+from src.database.database import db_manager
+from src.database.models import PatientDirectory
+from src.services.yclients import YClientsAPIError, yclients_client
+from src.utils.validators import validate_phone
+
+logger = logging.getLogger(__name__)
+
+# Российские номера пишут и с +7, и с 8, и без кода страны — последние 10 цифр совпадают
+_SUFFIX_DIGITS = 10
+
+
+def phone_keys(raw: str) -> tuple[Optional[str], Optional[str]]:
+    """(E.164, последние 10 цифр) для поиска; None — если ключ не построить."""
+    digits = "".join(filter(str.isdigit, raw or ""))
+    suffix = digits[-_SUFFIX_DIGITS:] if len(digits) >= _SUFFIX_DIGITS else None
+    return validate_phone(raw) if digits else None, suffix
+
+
+def _row_from_patient(patient: dict[str, Any], synced_at: datetime) -> dict[str, Any]:
+    phone = str(patient.get("phone") or "")
+    phone_e164, phone_suffix = phone_keys(phone)
+    row: dict[str, Any] = {
+        "id": int(patient["id"]),
+        "name": str(patient.get("name") or ""),
+        "email": str(patient.get("email") or ""),
+        "phone": phone,
+        "phone_e164": phone_e164,
+        "phone_suffix": phone_suffix,
+    }
+    fingerprint = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    row["payload_hash"] = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+    row["synced_at"] = synced_at
+    return row
+
+
+def _patient_from_row(row: PatientDirectory) -> dict[str, Any]:
+    # Тот же формат, что у yclients_client.find_client
+    return {"id": row.id, "name": row.name, "email": row.email, "phone": row.phone}
+
+
+class PatientDirectoryService:
+    """
+    Держит в таблице patients копию базы пациентов (полная синхронизация по интервалу)
+    и ищет пациента по телефону локально, по индексам E.164 и суффикса номера.
+
+    Не нашли локально — идём в /patients?search= (пациента могли завести после
+    синхронизации) и кладём найденного в справочник. Номера, которых нет и в API,
+    какое-то время помним, чтобы повторные нажатия и волна регистраций после
+    рассылки не превращались в поиски по API.
+    """
+
+    def __init__(self):
+        self.enabled = settings.PATIENTS_DIRECTORY_ENABLED
+        self.interval = timedelta(minutes=max(1, settings.PATIENTS_SYNC_INTERVAL_MINUTES))
+        self.negative_ttl = max(0, settings.PATIENTS_NEGATIVE_CACHE_SECONDS)
+        self.last_success_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.last_stats: dict[str, int] = {}
+        self.lookup_stats = {"local": 0, "api": 0, "negative": 0, "not_found": 0}
+        self._unknown: dict[str, float] = {}  # номер -> time.monotonic(), до которого он «неизвестен»
+        self._lock = asyncio.Lock()
+
+    async def sync(self) -> dict[str, int]:
+        """Полная выгрузка пациентов; в БД пишутся только новые/изменившиеся."""
+        if self._lock.locked():
+            logger.info("Patients directory sync already running, skip")
+            return self.last_stats
+        async with self._lock:
+            synced_at = datetime.now(timezone.utc)
+            try:
+                patients = await yclients_client.get_patients()
+            except YClientsAPIError as e:
+                self.last_error = str(e)
+                logger.warning("Patients directory sync failed, keeping previous data: %s", e)
+                return self.last_stats
+
+            rows = {row["id"]: row for row in (_row_from_patient(p, synced_at) for p in patients)}
+            async for session in db_manager.get_session():
+                known = await PatientDirectoryCRUD.get_hashes(session)
+                changed = [row for row in rows.values() if known.get(row["id"]) != row["payload_hash"]]
+                await PatientDirectoryCRUD.upsert_many(session, changed)
+                removed = await PatientDirectoryCRUD.delete_ids(
+                    session, [patient_id for patient_id in known if patient_id not in rows]
+                )
+
+            # Новые пациенты могли оказаться среди «неизвестных» номеров
+            self._unknown.clear()
+            self.last_success_at = synced_at
+            self.last_error = None
+            self.last_stats = {"fetched": len(rows), "upserted": len(changed), "removed": removed}
+            logger.info("Patients directory synced: %s", self.last_stats)
+            return self.last_stats
+
+    def _is_known_unknown(self, phone: str) -> bool:
+        expires_at = self._unknown.get(phone)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del self._unknown[phone]
+            return False
+        return True
+
+    def _remember_unknown(self, phone: str) -> None:
+        if not self.negative_ttl:
+            return
+        now = time.monotonic()
+        if len(self._unknown) >= 10_000:
+            self._unknown = {p: t for p, t in self._unknown.items() if t > now}
+        self._unknown[phone] = now + self.negative_ttl
+
+    async def find_by_phone(self, phone: str) -> Optional[dict[str, Any]]:
+        """Пациент по телефону в формате find_client, None — такого номера в клинике нет."""
+        phone_e164, phone_suffix = phone_keys(phone)
+        key = phone_e164 or phone
+
+        if self.enabled and (phone_e164 or phone_suffix):
+            async for session in db_manager.get_session():
+                row = await PatientDirectoryCRUD.find_by_phone(session, phone_e164, phone_suffix)
+                if row:
+                    self.lookup_stats["local"] += 1
+                    return _patient_from_row(row)
+
+        if self._is_known_unknown(key):
+            self.lookup_stats["negative"] += 1
+            return None
+
+        self.lookup_stats["api"] += 1
+        try:
+            patient = await yclients_client.find_client(phone=phone, raise_errors=True)
+        except YClientsAPIError:
+            # API недоступен — это не «номера нет», в отрицательный кэш не кладём
+            return None
+        if not patient or not patient.get("id"):
+            self.lookup_stats["not_found"] += 1
+            self._remember_unknown(key)
+            return None
+
+        if self.enabled:
+            row = _row_from_patient(patient, datetime.now(timezone.utc))
+            async for session in db_manager.get_session():
+                await PatientDirectoryCRUD.upsert_many(session, [row])
+        return patient
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "last_success_at": self.last_success_at.isoformat() if self.last_success_at else None,
+            "last_error": self.last_error,
+            "unknown_numbers": len(self._unknown),
+            **self.last_stats,
+            **{f"lookups_{name}": value for name, value in self.lookup_stats.items()},
+        }
+
+
+patient_directory = PatientDirectoryService()
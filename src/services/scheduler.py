@@ -1,29 +1,32 @@
 """Планировщик автоматических задач"""
+import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import Any, Optional
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot
 from apscheduler.executors.asyncio import AsyncIOExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 from src.config import settings
 from src.database.crud import ReminderCRUD, UserCRUD
 from src.database.database import db_manager
+from src.database.models import Reminder
 from src.services.notifications import send_reminder_notification
 from src.services.admin_report import send_admin_report_for_date
+from src.services.patient_directory import patient_directory
+from src.services.visit_mirror import visit_mirror
 from src.services.yclients import yclients_client
-from src.utils.record_helpers import (
-    record_appointment_datetime,
-    record_client_id,
-    record_id as record_id_safe,
-    record_service_name,
-    record_staff_name,
-)
+from src.utils.visit import Visit
 
 logger = logging.getLogger(__name__)
 
+# Пользователей бота и напоминания готовим одним заходом на столько визитов (размер страницы /visits)
+_USER_LOOKUP_BATCH = 200
+
 
 class ReminderScheduler:
     """Планировщик напоминаний"""
@@ -52,18 +55,20 @@ class ReminderScheduler:
             pass
         return 10, 0
 
-    async def check_and_send_reminders(self) -> dict[str, int | str]:
+    async def check_and_send_reminders(self) -> dict[str, Any]:
         """
         Проверка и отправка напоминаний.
 
         Логика:
         1. Получить все записи из Dentist plus на завтра (следующий календарный день в REMINDER_TIMEZONE)
-        2. Для каждой записи найти зарегистрированного пользователя
-        3. Создать reminder если ещё не создан
-        4. Отправить если ещё не отправлен
+        2. Для пачки записей найти зарегистрированных пользователей (один запрос)
+        3. Создать/обновить reminders одним upsert'ом, получив ещё не отправленные
+        4. Отправить неотправленные
+
+        Филиалы обрабатываются параллельно; в stats["branches"] — счётчики по каждому.
         """
         logger.info("Starting reminder check...")
-        stats: dict[str, int | str] = {
+        stats: dict[str, Any] = {
             "records_count": 0,
             "sent_count": 0,
             "skipped_count": 0,
@@ -73,6 +78,7 @@ class ReminderScheduler:
             "skip_already_sent": 0,
             "send_failed": 0,
             "process_errors": 0,
+            "branches": {},
         }
 
         try:
@@ -82,100 +88,161 @@ class ReminderScheduler:
         now = datetime.now(tz)
         tomorrow = now.date() + timedelta(days=1)
         start_date = datetime(tomorrow.year, tomorrow.month, tomorrow.day, 0, 0, 0, tzinfo=tz)
-        # Один день в API: оба параметра — дата завтра (Y-m-d совпадает)
-        end_date = start_date
 
+        sent_count = 0
+        skipped_count = 0
+        records_count = 0
+        seen_ids: set[int] = set()
+        chat_ids: dict[int, Optional[int]] = {}  # yclients_client_id -> chat_id пользователя бота
+
+        async def resolve_users(visits: list[Visit]) -> None:
+            missing = {v.client_id for v in visits if v.client_id is not None and v.client_id not in chat_ids}
+            if not missing:
+                return
+            async for session in db_manager.get_session():
+                users = await UserCRUD.get_many_by_yclients_client_ids(session, missing)
+                for client_id in missing:
+                    user = users.get(client_id)
+                    chat_ids[client_id] = user.chat_id if user else None
+
+        def branch_stats(visit: Visit) -> dict[str, int]:
+            key = str(visit.branch_id) if visit.branch_id is not None else "—"
+            return stats["branches"].setdefault(key, {"records": 0, "sent": 0, "skipped": 0})
+
+        def count(visit: Visit, result: str) -> None:
+            nonlocal sent_count, skipped_count
+            per_branch = branch_stats(visit)
+            if result == "sent":
+                sent_count += 1
+                per_branch["sent"] += 1
+                return
+            skipped_count += 1
+            per_branch["skipped"] += 1
+            if result in stats:
+                stats[result] = int(stats[result]) + 1
+
+        async def handle_batch(visits: list[Visit]) -> None:
+            # Визиты без id или с неразборчивым временем отсеиваются ещё при разборе ответа API
+            nonlocal records_count
+            batch: list[Visit] = []
+            for visit in visits:
+                # Визит без филиала может прийти в потоке нескольких филиалов — обрабатываем один раз
+                if visit.id in seen_ids:
+                    continue
+                seen_ids.add(visit.id)
+                records_count += 1
+                branch_stats(visit)["records"] += 1
+                if visit.client_id is None:
+                    logger.info(f"Skip record {visit.id}: no client")
+                    count(visit, "skip_missing_id_or_client")
+                    continue
+                batch.append(visit)
+            if not batch:
+                return
+
+            # Пользователи бота и напоминания на всю пачку — пара запросов вместо нескольких на визит
+            try:
+                await resolve_users(batch)
+                pending = await self._prepare_reminders(batch, chat_ids)
+            except Exception as e:
+                logger.error(f"Failed to prepare reminders for {len(batch)} records: {e}", exc_info=True)
+                for visit in batch:
+                    count(visit, "process_errors")
+                return
+
+            for visit in batch:
+                try:
+                    result = await self._process_single_record(
+                        visit=visit,
+                        user_chat_id=chat_ids.get(visit.client_id),
+                        reminder=pending.get(visit.id),
+                    )
+                except Exception as e:
+                    logger.error(f"Error processing record {visit.id}: {str(e)}", exc_info=True)
+                    result = "process_errors"
+                count(visit, result)
+
+        async def process_branch(branch_id: int | None) -> None:
+            # Записи обрабатываются по мере загрузки страниц — первые напоминания уходят,
+            # пока остальные страницы ещё качаются. Клиент сам знает, как API трактует
+            # date_to, поэтому пустой день — один запрос, а не день + запасные два дня.
+            batch: list[Visit] = []
+            async for visit in yclients_client.iter_records_for_day(tomorrow, branch_id=branch_id):
+                batch.append(visit)
+                if len(batch) >= _USER_LOOKUP_BATCH:
+                    await handle_batch(batch)
+                    batch = []
+            await handle_batch(batch)
+
+        day_after = start_date + timedelta(days=1)
         try:
-            records = await yclients_client.get_records(
-                start_date=start_date,
-                end_date=end_date,
-            )
-            # Если пусто — пробуем диапазон на 2 дня (некоторые версии API ожидают end как следующий день)
-            if not records:
-                day_after = start_date + timedelta(days=1)
-                records = await yclients_client.get_records(
-                    start_date=start_date,
-                    end_date=day_after,
-                )
-                if records:
-                    filtered = []
-                    for r in records:
-                        dt_str = r.get("datetime") or ""
-                        try:
-                            rd = datetime.fromisoformat(
-                                dt_str.replace("Z", "+00:00")
-                            )
-                            if rd.tzinfo:
-                                rd = rd.astimezone(tz)
-                            if rd.date() == tomorrow:
-                                filtered.append(r)
-                        except (ValueError, TypeError):
-                            continue
-                    records = filtered
+            if visit_mirror.can_serve(start_date, day_after):
+                # Зеркало свежее — берём точный диапазон завтрашнего дня из БД
+                await handle_batch(await visit_mirror.get_records(start_date, day_after))
+                stats["source"] = "mirror"
+            else:
+                branches = yclients_client.branch_ids or [None]
+                await asyncio.gather(*(process_branch(branch_id) for branch_id in branches))
+                stats["source"] = "api"
 
             logger.info(
                 f"Reminder check: tomorrow={tomorrow} tz={settings.REMINDER_TIMEZONE}, "
-                f"records_count={len(records)}"
+                f"records_count={records_count}"
             )
-            stats["records_count"] = len(records)
+            stats["records_count"] = records_count
 
         except Exception as e:
             logger.error(f"Failed to get records from Dentist plus: {str(e)}")
             stats["error"] = f"get_records_failed: {e}"
+            stats["records_count"] = records_count
+            stats["sent_count"] = sent_count
+            stats["skipped_count"] = skipped_count
             return stats
 
-        sent_count = 0
-        skipped_count = 0
-
-        for record in records:
-            if not isinstance(record, dict):
-                continue
-            rid = record_id_safe(record)
-            cid = record_client_id(record)
-            if rid is None or cid is None:
-                logger.info(f"Skip record (missing id or client): keys={list(record.keys())[:10]}")
-                skipped_count += 1
-                stats["skip_missing_id_or_client"] = int(stats["skip_missing_id_or_client"]) + 1
-                continue
-            appt_dt = record_appointment_datetime(record)
-            if appt_dt is None:
-                logger.info(f"Skip record {rid}: no valid datetime")
-                skipped_count += 1
-                stats["skip_invalid_datetime"] = int(stats["skip_invalid_datetime"]) + 1
-                continue
-
-            try:
-                result = await self._process_single_record(
-                    record=record,
-                    rid=rid,
-                    cid=cid,
-                    appt_dt=appt_dt,
-                )
-                if result == "sent":
-                    sent_count += 1
-                else:
-                    skipped_count += 1
-                    if result in stats:
-                        stats[result] = int(stats[result]) + 1
-            except Exception as e:
-                logger.error(f"Error processing record {rid}: {str(e)}", exc_info=True)
-                skipped_count += 1
-                stats["process_errors"] = int(stats["process_errors"]) + 1
-
-        logger.info(f"Reminder check completed. Sent: {sent_count}, Skipped: {skipped_count}")
+        logger.info(
+            f"Reminder check completed. Sent: {sent_count}, Skipped: {skipped_count}, "
+            f"by branch: {stats['branches']}"
+        )
         stats["sent_count"] = sent_count
         stats["skipped_count"] = skipped_count
         return stats
 
+    @staticmethod
+    async def _prepare_reminders(visits: list[Visit], chat_ids: dict[int, Optional[int]]) -> dict[int, Reminder]:
+        """
+        Напоминания на визиты зарегистрированных пользователей — одним upsert'ом.
+        Возвращает ещё не отправленные по record_id.
+        """
+        rows = [
+            {
+                "user_chat_id": chat_ids[visit.client_id],
+                "record_id": visit.id,
+                "appointment_datetime": visit.start,
+                "service_name": visit.service_name,
+                "staff_name": visit.doctor_name,
+            }
+            for visit in visits
+            if chat_ids.get(visit.client_id)
+        ]
+        pending: dict[int, Reminder] = {}
+        if not rows:
+            return pending
+        async for session in db_manager.get_session():
+            reminders = await ReminderCRUD.upsert_many(session, rows)
+            pending = {reminder.record_id: reminder for reminder in reminders}
+        return pending
+
     async def _process_single_record(
         self,
         *,
-        record: dict,
-        rid: int,
-        cid: int,
-        appt_dt: datetime,
+        visit: Visit,
+        user_chat_id: Optional[int],
+        reminder: Optional[Reminder],
     ) -> str:
-        """Обработка одной записи в отдельной сессии.
+        """Отправка напоминания по одной записи.
+
+        user_chat_id — пользователь бота (None — не зарегистрирован), reminder — неотправленное
+        напоминание из _prepare_reminders (None — уже отправлено раньше).
 
         Возвращает:
             'sent' — отправлено
@@ -183,53 +250,28 @@ class ReminderScheduler:
             'skip_already_sent' — уже отправлено ранее
             'send_failed' — ошибка при отправке
         """
-        async for session in db_manager.get_session():
-            user = await UserCRUD.get_by_yclients_client_id(
-                session=session,
-                yclients_client_id=cid,
-            )
-
-            if not user:
-                logger.info(
-                    f"Skip record {rid}: no bot user for yclients_client_id={cid}"
-                )
-                return "skip_no_user"
-
-            existing = await ReminderCRUD.get_by_record_id(
-                session=session,
-                record_id=rid,
+        rid = visit.id
+        if not user_chat_id:
+            logger.info(
+                f"Skip record {rid}: no bot user for yclients_client_id={visit.client_id}"
             )
+            return "skip_no_user"
 
-            if existing and existing.is_sent:
-                logger.info(f"Skip record {rid}: reminder already sent")
-                return "skip_already_sent"
-
-            if not existing:
-                reminder = await ReminderCRUD.create(
-                    session=session,
-                    user_chat_id=user.chat_id,
-                    record_id=rid,
-                    appointment_datetime=appt_dt,
-                    service_name=record_service_name(record),
-                    staff_name=record_staff_name(record),
-                )
-            else:
-                reminder = existing
+        if reminder is None:
+            logger.info(f"Skip record {rid}: reminder already sent")
+            return "skip_already_sent"
 
-            success = await send_reminder_notification(
-                bot=self.bot,
-                reminder=reminder,
-            )
-
-            if success:
-                logger.info(f"Reminder for record {rid} sent successfully")
-                return "sent"
-            else:
-                logger.warning(f"Reminder for record {rid} failed to send")
-                return "send_failed"
+        success = await send_reminder_notification(
+            bot=self.bot,
+            reminder=reminder,
+        )
 
-        # Если генератор не отдал сессию (теоретически невозможно)
-        return "send_failed"
+        if success:
+            logger.info(f"Reminder for record {rid} sent successfully")
+            return "sent"
+        else:
+            logger.warning(f"Reminder for record {rid} failed to send")
+            return "send_failed"
 
     def start(self) -> None:
         """Запуск планировщика: раз в день в REMINDER_CHECK_TIME по REMINDER_TIMEZONE."""
@@ -263,6 +305,35 @@ class ReminderScheduler:
             executor="asyncio",
         )
 
+        if visit_mirror.enabled:
+            # Первая синхронизация сразу при старте, дальше — по интервалу
+            self.scheduler.add_job(
+                visit_mirror.sync,
+                trigger=IntervalTrigger(seconds=int(visit_mirror.interval.total_seconds()), timezone=tz),
+                id="sync_visits",
+                replace_existing=True,
+                next_run_time=datetime.now(tz),
+                max_instances=1,
+                coalesce=True,
+                executor="asyncio",
+            )
+            logger.info(
+                f"Visits mirror sync every {visit_mirror.interval}, {visit_mirror.days_ahead} days ahead"
+            )
+
+        if patient_directory.enabled:
+            self.scheduler.add_job(
+                patient_directory.sync,
+                trigger=IntervalTrigger(seconds=int(patient_directory.interval.total_seconds()), timezone=tz),
+                id="sync_patients",
+                replace_existing=True,
+                next_run_time=datetime.now(tz),
+                max_instances=1,
+                coalesce=True,
+                executor="asyncio",
+            )
+            logger.info(f"Patients directory sync every {patient_directory.interval}")
+
         self.scheduler.start()
         job = self.scheduler.get_job("check_reminders")
         logger.info(
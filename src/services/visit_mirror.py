@@ -0,0 +1,171 @@
+"""Локальное зеркало визитов Dentist plus: фоновая синхронизация и чтение из БД."""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from zoneinfo import ZoneInfo
+
+from src.config import settings
+from src.database.crud import VisitMirrorCRUD
+from src.database.database import db_manager
+from src.database.models import VisitMirror
+from src.services.yclients import YClientsAPIError, yclients_client
+from src.utils.visit import Visit
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # SQLite возвращает naive datetime — в зеркале всё хранится в UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _row_from_visit(visit: Visit, synced_at: datetime) -> dict[str, Any]:
+    row: dict[str, Any] = {
+        "id": visit.id,
+        "client_id": visit.client_id,
+        "client_name": visit.client_name,
+        "client_phone": visit.client_phone,
+        "staff_id": visit.staff_id,
+        "staff_name": visit.staff_name,
+        "branch_id": visit.branch_id,
+        "appointment_datetime": visit.start,
+        "is_cancelled": visit.is_cancelled,
+    }
+    fingerprint = json.dumps(row, sort_keys=True, default=str, ensure_ascii=False)
+    row["payload_hash"] = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+    row["synced_at"] = synced_at
+    return row
+
+
+def _visit_from_row(row: VisitMirror) -> Visit:
+    return Visit(
+        id=row.id,
+        start=_as_utc(row.appointment_datetime),
+        client_id=row.client_id,
+        client_name=row.client_name,
+        client_phone=row.client_phone,
+        staff_id=row.staff_id,
+        staff_name=row.staff_name or "Доктор",
+        branch_id=row.branch_id,
+        is_cancelled=row.is_cancelled,
+    )
+
+
+class VisitMirrorService:
+    """
+    Держит в таблице visits скользящее окно визитов (сегодня .. +VISITS_SYNC_DAYS_AHEAD
+    с запасом в день)
+    и отдаёт их локальными индексированными запросами.
+
+    Читать из зеркала можно, только если последняя синхронизация свежая и окно
+    покрывает запрошенный диапазон (can_serve) — иначе вызывающий идёт в API.
+    """
+
+    def __init__(self):
+        self.enabled = settings.VISITS_MIRROR_ENABLED
+        self.interval = timedelta(minutes=max(1, settings.VISITS_SYNC_INTERVAL_MINUTES))
+        self.days_ahead = max(1, settings.VISITS_SYNC_DAYS_AHEAD)
+        self.last_success_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.last_stats: dict[str, int] = {}
+        self._window: Optional[tuple[datetime, datetime]] = None
+        self._lock = asyncio.Lock()
+
+    def _tz(self) -> ZoneInfo:
+        try:
+            return ZoneInfo(settings.REMINDER_TIMEZONE or "UTC")
+        except Exception:
+            return ZoneInfo("UTC")
+
+    def is_fresh(self) -> bool:
+        if not self.enabled or self.last_success_at is None:
+            return False
+        # Пропустили пару синхронизаций (API тормозит) — зеркало ещё годится
+        return datetime.now(timezone.utc) - self.last_success_at <= self.interval * 3
+
+    def can_serve(self, start: datetime, end: datetime) -> bool:
+        if not self.is_fresh() or self._window is None:
+            return False
+        window_start, window_end = self._window
+        return window_start <= _as_utc(start) and _as_utc(end) <= window_end
+
+    async def sync(self) -> dict[str, int]:
+        """Подтягивает окно из API и пишет в БД только новые/изменившиеся визиты."""
+        if self._lock.locked():
+            logger.info("Visits mirror sync already running, skip")
+            return self.last_stats
+        async with self._lock:
+            tz = self._tz()
+            today = datetime.now(tz).date()
+            start = datetime(today.year, today.month, today.day, tzinfo=tz)
+            # Покрытое окно — до начала дня today + days_ahead + 1: запрос «сейчас .. +days_ahead»
+            # (например, «Мои записи») помещается в него в любое время дня.
+            # Ещё один день сверху — на случай, если API не включает date_to
+            end = start + timedelta(days=self.days_ahead + 2)
+            synced_at = datetime.now(timezone.utc)
+            try:
+                # Мимо кэша окон: иначе в зеркало попадёт выборка возрастом до TTL+stale
+                # с отметкой synced_at=сейчас
+                visits = await yclients_client.get_records(start, end, raise_errors=True, cached=False)
+            except YClientsAPIError as e:
+                self.last_error = str(e)
+                logger.warning("Visits mirror sync failed, keeping previous data: %s", e)
+                return self.last_stats
+
+            rows = [_row_from_visit(visit, synced_at) for visit in visits]
+            async for session in db_manager.get_session():
+                known = await VisitMirrorCRUD.get_hashes(session, [row["id"] for row in rows])
+                changed = [row for row in rows if known.get(row["id"]) != row["payload_hash"]]
+                unchanged_ids = [row["id"] for row in rows if known.get(row["id"]) == row["payload_hash"]]
+                await VisitMirrorCRUD.upsert_many(session, changed)
+                await VisitMirrorCRUD.touch(session, unchanged_ids, synced_at)
+                # Последний день окна не чистим: API может не включать date_to
+                removed = await VisitMirrorCRUD.delete_missing(
+                    session,
+                    _as_utc(start),
+                    _as_utc(end - timedelta(days=1)),
+                    {row["id"] for row in rows},
+                )
+                await VisitMirrorCRUD.delete_before(session, _as_utc(start))
+
+            # Последний день окна тоже не считаем покрытым
+            self._window = (_as_utc(start), _as_utc(end - timedelta(days=1)))
+            self.last_success_at = synced_at
+            self.last_error = None
+            self.last_stats = {
+                "fetched": len(rows),
+                "upserted": len(changed),
+                "unchanged": len(unchanged_ids),
+                "removed": removed,
+            }
+            logger.info("Visits mirror synced: %s", self.last_stats)
+            return self.last_stats
+
+    async def get_records(
+        self,
+        start: datetime,
+        end: datetime,
+        client_id: Optional[int] = None,
+    ) -> list[Visit]:
+        """Визиты с временем начала в [start, end) из локального зеркала."""
+        async for session in db_manager.get_session():
+            rows = await VisitMirrorCRUD.get_window(session, _as_utc(start), _as_utc(end), client_id)
+            return [_visit_from_row(row) for row in rows]
+        return []
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "fresh": self.is_fresh(),
+            "last_success_at": self.last_success_at.isoformat() if self.last_success_at else None,
+            "last_error": self.last_error,
+            **self.last_stats,
+        }
+
+
+visit_mirror = VisitMirrorService()
@@ -1,7 +1,8 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TypeVar
 from zoneinfo import ZoneInfo
 from urllib.parse import urlparse
 
@@ -9,9 +10,24 @@ import aiohttp
 from aiohttp import ClientError, ClientTimeout
 
 from src.config import settings
+from src.utils.async_cache import AsyncTTLCache
+from src.utils.host_health import HostSelector, HostStats
+from src.utils.json_codec import get_json_loads
+from src.utils.metrics import MetricsRegistry, NullMetricsRegistry, metrics
+from src.utils.rate_limiter import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    TokenBucketRateLimiter,
+    current_priority,
+)
+from src.utils.retry import RetryBudget, RetryPolicy, call_path, parse_retry_after
+from src.utils.state_file import read_json_state, write_json_state
+from src.utils.visit import Visit
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class YClientsAPIError(Exception):
     """Совместимое имя исключения для интеграционного слоя."""
@@ -20,6 +36,23 @@ class YClientsAPIError(Exception):
 class YClientsRateLimitError(YClientsAPIError):
     """Ошибка превышения лимита запросов."""
 
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _RetryableError(Exception):
+    """Внутренний маркер: ответ API, после которого запрос стоит повторить (на другом хосте)."""
+
+    def __init__(self, error: YClientsAPIError, *hosts: str):
+        super().__init__(str(error))
+        self.error = error
+        self.hosts = hosts
+
+
+class _TokenRejected(Exception):
+    """Внутренний маркер: API ответил 401 на запрос с токеном."""
+
 
 def _full_name(user: dict[str, Any]) -> str:
     return " ".join(
@@ -29,6 +62,15 @@ def _full_name(user: dict[str, Any]) -> str:
     ).strip()
 
 
+def _patient_summary(patient: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": patient.get("id"),
+        "name": _full_name(patient),
+        "email": patient.get("email", ""),
+        "phone": patient.get("phone", ""),
+    }
+
+
 def _clinic_tz() -> ZoneInfo:
     try:
         return ZoneInfo(settings.REMINDER_TIMEZONE or "UTC")
@@ -36,24 +78,24 @@ def _clinic_tz() -> ZoneInfo:
         return ZoneInfo("UTC")
 
 
-def _visit_start_to_iso_utc(raw: Any) -> str | None:
+def _parse_visit_start(raw: Any) -> datetime | None:
     """
     Dentist plus может отдавать start как 'YYYY-MM-DD HH:MM:SS' (локаль клиники),
     ISO-8601 с 'T', строку с оффсетом через пробел, или unix timestamp.
+    Возвращает aware datetime в UTC.
     """
     if raw is None:
         return None
     if isinstance(raw, (int, float)):
         try:
-            dt = datetime.fromtimestamp(float(raw), tz=timezone.utc)
-            return dt.isoformat()
+            return datetime.fromtimestamp(float(raw), tz=timezone.utc)
         except (ValueError, OSError, OverflowError):
             return None
     if isinstance(raw, datetime):
         dt = raw
         if dt.tzinfo is None:
             dt = dt.replace(tzinfo=_clinic_tz())
-        return dt.astimezone(timezone.utc).isoformat()
+        return dt.astimezone(timezone.utc)
     if not isinstance(raw, str):
         return None
     s = raw.strip()
@@ -80,45 +122,336 @@ def _visit_start_to_iso_utc(raw: Any) -> str | None:
         return None
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=clinic_tz)
-    return dt.astimezone(timezone.utc).isoformat()
-
-
-def _extract_page_items_and_meta(payload: Any) -> tuple[list[Any], dict[str, Any]]:
-    """Ответ API может быть {data, meta}, списком, или с ключом visits/records."""
-    if isinstance(payload, list):
-        return payload, {}
-    if not isinstance(payload, dict):
-        return [], {}
-    meta = payload.get("meta")
-    if not isinstance(meta, dict):
-        meta = {}
-    data = payload.get("data")
-    if isinstance(data, list):
-        return data, meta
-    if isinstance(data, dict):
-        for key in ("visits", "records", "items", "data"):
-            block = data.get(key)
-            if isinstance(block, list):
-                return block, meta
-    for key in ("visits", "records", "items", "results", "result"):
-        block = payload.get(key)
-        if isinstance(block, list):
-            return block, meta
-    return [], meta
-
-
-def _last_page_from_meta(meta: dict[str, Any], page: int) -> int:
-    for src in (meta, meta.get("pagination") if isinstance(meta.get("pagination"), dict) else {}):
-        if not isinstance(src, dict):
+    return dt.astimezone(timezone.utc)
+
+
+def _start_from_timestamp(raw: Any) -> datetime:
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        raise TypeError("not a timestamp")
+    return datetime.fromtimestamp(raw, tz=timezone.utc)
+
+
+def _start_from_iso(raw: Any) -> datetime:
+    # Строка со своим оффсетом: '2026-04-12T10:30:00+03:00' или через пробел
+    dt = datetime.fromisoformat(raw)
+    if dt.tzinfo is None:
+        raise ValueError("no UTC offset")
+    return dt.astimezone(timezone.utc)
+
+
+def _start_from_iso_z(raw: Any) -> datetime:
+    # До Python 3.11 fromisoformat не понимает суффикс 'Z'; оффсет в строке дешевле,
+    # чем .replace(tzinfo=...) у готового datetime
+    if not raw.endswith("Z"):
+        raise ValueError("no Z suffix")
+    return datetime.fromisoformat(raw[:-1] + "+00:00")
+
+
+def _day_offset(day: str, clinic_tz: ZoneInfo) -> timedelta | None:
+    """Смещение клиники от UTC на день 'YYYY-MM-DD'; None — в этот день оно меняется."""
+    start = datetime(int(day[0:4]), int(day[5:7]), int(day[8:10]))
+    offset = clinic_tz.utcoffset(start)
+    if offset != clinic_tz.utcoffset(start.replace(hour=23, minute=59, second=59, microsecond=999999)):
+        return None
+    return offset
+
+
+def _local_start_parser(clinic_tz: ZoneInfo) -> Callable[[Any], datetime]:
+    """
+    Разборщик основного формата API — локального времени клиники без оффсета
+    ('YYYY-MM-DD HH:MM:SS', через пробел или 'T').
+
+    Строка разбирается сразу как UTC, и из неё вычитается смещение клиники. Смещение
+    считается через ZoneInfo один раз на день и запоминается на всю страницу — перевод
+    каждого визита через ZoneInfo вдвое дороже самого разбора. День перехода на
+    летнее/зимнее время уходит в общий путь.
+    """
+    offsets: dict[str, timedelta | None] = {}
+
+    def parse(raw: Any) -> datetime:
+        if len(raw) < 16 or raw[10] not in " T":
+            raise ValueError("not a local date-time")
+        day = raw[:10]
+        if day not in offsets:
+            offsets[day] = _day_offset(day, clinic_tz)
+        offset = offsets[day]
+        if offset is None:
+            raise ValueError("UTC offset changes on this day")
+        # Строка со своим оффсетом здесь не разберётся (ValueError) — значит, не наш формат
+        return datetime.fromisoformat(raw + "+00:00") - offset
+
+    return parse
+
+
+def _detect_start_parser(sample: Any, clinic_tz: ZoneInfo) -> Callable[[Any], datetime] | None:
+    """Быстрый разборщик под формат первого визита страницы (None — только общий путь)."""
+    if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+        return _start_from_timestamp
+    if not isinstance(sample, str):
+        return None
+    if sample.endswith("Z"):
+        return _start_from_iso_z
+    try:
+        naive = datetime.fromisoformat(sample).tzinfo is None
+    except ValueError:
+        return None
+    return _local_start_parser(clinic_tz) if naive else _start_from_iso
+
+
+def _parse_visit_starts(values: list[Any]) -> list[datetime | None]:
+    """
+    Разбирает start всех визитов страницы за один проход.
+
+    Формат на странице почти всегда один, поэтому он определяется по первому
+    значению, и дальше используется только подходящий быстрый путь. Значения,
+    которые быстрый путь не осилил, разбираются общим _parse_visit_start.
+    Одинаковые строки (один слот у разных докторов) разбираются один раз.
+    """
+    sample = next((v for v in values if v is not None), None)
+    fast = _detect_start_parser(sample, _clinic_tz())
+    seen: dict[Any, datetime | None] = {}
+    result: list[datetime | None] = []
+    for raw in values:
+        # Запоминаем только строки: timestamp разбирается быстрее поиска в словаре.
+        # Проверка без исключения: на страницах с уникальным временем KeyError на
+        # каждом промахе стоил дороже самого разбора
+        memo = isinstance(raw, str)
+        if memo and raw in seen:
+            result.append(seen[raw])
             continue
-        for key in ("last_page", "total_pages", "pages"):
-            lp = src.get(key)
-            if lp is not None:
-                try:
-                    return max(page, int(lp))
-                except (TypeError, ValueError):
-                    pass
-    return page
+        dt = None
+        if fast is not None:
+            try:
+                dt = fast(raw)
+            except (TypeError, ValueError, OSError, OverflowError):
+                dt = None
+        if dt is None:
+            dt = _parse_visit_start(raw)
+        if memo:
+            seen[raw] = dt
+        result.append(dt)
+    return result
+
+
+def _visit_local_date(visit: dict[str, Any]) -> date | None:
+    """Дата визита в таймзоне клиники — именно она уходит в date_from/date_to."""
+    start = _parse_visit_start(visit.get("start"))
+    if start is None:
+        return None
+    return start.astimezone(_clinic_tz()).date()
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Где в ответе лежит список элементов страницы: () — ответ сам список, иначе путь из ключей.
+# Порядок важен: так проверяли всегда, и на первом совпадении останавливаемся.
+_PAGE_ITEM_PATHS: tuple[tuple[str, ...], ...] = (
+    (),
+    ("data",),
+    ("data", "visits"),
+    ("data", "records"),
+    ("data", "items"),
+    ("data", "data"),
+    ("visits",),
+    ("records",),
+    ("items",),
+    ("results",),
+    ("result",),
+)
+_LAST_PAGE_PATHS: tuple[tuple[str, ...], ...] = tuple(
+    ("meta", *prefix, key)
+    for prefix in ((), ("pagination",))
+    for key in ("last_page", "total_pages", "pages")
+)
+
+
+def _read_path(node: Any, path: tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+def _page_items(payload: Any, hint: Optional[tuple[str, ...]] = None) -> tuple[list[Any], Optional[tuple[str, ...]]]:
+    """
+    Элементы страницы и путь, по которому они нашлись.
+    hint — путь с прошлых страниц того же endpoint'а: подходит — перебор форматов не нужен.
+    """
+    if hint is not None:
+        items = _read_path(payload, hint)
+        if isinstance(items, list):
+            return items, hint
+    for path in _PAGE_ITEM_PATHS:
+        items = _read_path(payload, path)
+        if isinstance(items, list):
+            return items, path
+    return [], None
+
+
+def _page_last(payload: Any, page: int, hint: Optional[tuple[str, ...]] = None) -> tuple[int, Optional[tuple[str, ...]]]:
+    """Номер последней страницы из meta (не меньше page) и путь к нему; см. _page_items."""
+    for path in ((hint,) if hint is not None else ()) + _LAST_PAGE_PATHS:
+        value = _read_path(payload, path)
+        if value is None:
+            continue
+        try:
+            return max(page, int(value)), path
+        except (TypeError, ValueError):
+            pass
+    return page, None
+
+
+def _visit_from_api(
+    v: dict[str, Any],
+    start: datetime | None,
+    *,
+    keep_raw: bool = False,
+    branch_id: Optional[int] = None,
+) -> Visit | None:
+    """
+    Визит Dentist plus -> Visit. start уже разобран (см. _parse_visit_starts).
+    Без id или с неразборчивым start визит пропускается.
+    branch_id — филиал запроса, если в самом визите его нет.
+    """
+    visit_id = _int_or_none(v.get("id"))
+    if start is None or visit_id is None:
+        logger.debug(
+            "Skip visit without id or parseable start: id=%r start=%r",
+            v.get("id"),
+            v.get("start"),
+        )
+        return None
+
+    patient = v.get("patient") if isinstance(v.get("patient"), dict) else {}
+    doctor = v.get("doctor") if isinstance(v.get("doctor"), dict) else {}
+    client_id = patient.get("id")
+    if client_id is None:
+        client_id = v.get("patient_id")
+    staff_id = doctor.get("id")
+    if staff_id is None:
+        staff_id = v.get("doctor_id")
+
+    return Visit(
+        id=visit_id,
+        start=start,
+        client_id=_int_or_none(client_id),
+        client_name=_full_name(patient),
+        client_phone=str(patient.get("phone") or ""),
+        staff_id=_int_or_none(staff_id),
+        staff_name=_full_name(doctor) or "Доктор",
+        branch_id=_int_or_none(v.get("branch_id")) or branch_id,
+        is_cancelled=bool(v.get("is_cancelled", False)),
+        raw=v if keep_raw else None,
+    )
+
+
+def _visits_from_page(
+    items: list[Any],
+    *,
+    keep_raw: bool = False,
+    branch_id: Optional[int] = None,
+) -> list[Visit]:
+    raw_visits = [v for v in items if isinstance(v, dict)]
+    starts = _parse_visit_starts([v.get("start") for v in raw_visits])
+    visits: list[Visit] = []
+    for v, start in zip(raw_visits, starts):
+        visit = _visit_from_api(v, start, keep_raw=keep_raw, branch_id=branch_id)
+        if visit is not None:
+            visits.append(visit)
+    return visits
+
+
+def _in_branches(visits: Iterable[Visit], branches: Iterable[Optional[int]]) -> list[Visit]:
+    """
+    Визиты нужных филиалов из выборки без фильтра. Визит без филиала может быть чужим —
+    его не берём: иначе напоминание получит пациент другого филиала.
+    """
+    wanted = {branch for branch in branches if branch is not None}
+    return [v for v in visits if v.branch_id in wanted]
+
+
+def _branch_filter_evidence(unfiltered: Iterable[Visit], branches: Iterable[Optional[int]]) -> Optional[bool]:
+    """
+    Что выборка без branch_id говорит о фильтре API, когда с фильтром было пусто:
+    есть визиты, явно помеченные нашим филиалом, — фильтр не работает (False);
+    помечены только чужие — работает, у нас просто пусто (True);
+    пустой день или визиты без филиала — ничего не известно (None), запоминать нечего.
+    """
+    wanted = set(branches)
+    tagged = [v.branch_id for v in unfiltered if v.branch_id is not None]
+    if not tagged:
+        return None
+    return not any(branch in wanted for branch in tagged)
+
+
+async def _merge_streams(streams: list[AsyncIterator[T]]) -> AsyncIterator[T]:
+    """Элементы нескольких потоков по мере готовности в любом из них (потоки идут параллельно)."""
+    if len(streams) == 1:
+        async for item in streams[0]:
+            yield item
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def pump(stream: AsyncIterator[T]) -> None:
+        try:
+            async for item in stream:
+                await queue.put(item)
+            await queue.put(finished)
+        except Exception as e:
+            await queue.put(e)
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _parse_branch_ids(raw: str, single: int) -> list[int]:
+    """DENTIST_PLUS_BRANCH_IDS ("2, 5") или, если пусто, DENTIST_PLUS_BRANCH_ID; 0 и мусор отбрасываются."""
+    ids: list[int] = []
+    for part in (raw or "").replace(";", ",").split(","):
+        value = _int_or_none(part.strip())
+        if value and value > 0 and value not in ids:
+            ids.append(value)
+    if not ids and single > 0:
+        ids.append(single)
+    return ids
+
+
+def _merge_visit_chunks(chunks: list[tuple[Visit, ...]]) -> tuple[Visit, ...]:
+    """Склеивает куски окна: без дублей по id, по времени начала."""
+    by_id: dict[int, Visit] = {}
+    for chunk in chunks:
+        for visit in chunk:
+            by_id.setdefault(visit.id, visit)
+    return tuple(sorted(by_id.values(), key=lambda v: (v.start, v.id)))
+
+
+# Справочники, которые кэшируются на клиенте: имя -> (endpoint, params)
+_REFERENCE_ENDPOINTS: dict[str, tuple[str, Optional[dict[str, Any]]]] = {
+    "record_statuses": ("/record_statuses", None),
+    "doctors": ("/doctors", {"page": 1, "per_page": 200}),
+    "services": ("/services", {"page": 1, "per_page": 200}),
+}
 
 
 class YClientsClient:
@@ -130,34 +463,109 @@ class YClientsClient:
     def __init__(self):
         self.base_url = settings.DENTIST_PLUS_API_URL.rstrip("/")
         self._base_urls = self._build_base_url_candidates(self.base_url)
-        self._base_url_idx = 0
+        # Запрос уходит на самый быстрый хост с замкнутым breaker'ом
+        self._hosts = HostSelector(
+            self._base_urls,
+            failure_threshold=settings.DENTIST_PLUS_BREAKER_FAILURES,
+            open_seconds=settings.DENTIST_PLUS_BREAKER_OPEN_SECONDS,
+        )
         self.login = settings.DENTIST_PLUS_LOGIN
         self.password = settings.DENTIST_PLUS_PASSWORD
-        self.branch_id = settings.DENTIST_PLUS_BRANCH_ID
-        self.use_branch_filter = self.branch_id > 0
+        # Филиалы клиники: визиты каждого запрашиваются отдельно и параллельно
+        self.branch_ids = _parse_branch_ids(settings.DENTIST_PLUS_BRANCH_IDS, settings.DENTIST_PLUS_BRANCH_ID)
+        self.branch_id = self.branch_ids[0] if self.branch_ids else 0
+        self.use_branch_filter = bool(self.branch_ids)
         masked_login = f"{self.login[:2]}***" if self.login else "<empty>"
         logger.info(
-            "Dentist plus client init: base_url=%s branch_id=%s login=%s password_set=%s",
+            "Dentist plus client init: base_url=%s branch_ids=%s login=%s password_set=%s",
             self.base_url,
-            self.branch_id,
+            self.branch_ids,
             masked_login,
             bool(self.password),
         )
         logger.info("Dentist plus base URL candidates: %s", self._base_urls)
-        if self.branch_id == 1:
+        if self.branch_ids == [1]:
             logger.warning(
                 "DENTIST_PLUS_BRANCH_ID is 1. If your real branch differs, reminders will always get 0 visits."
             )
         if not self.use_branch_filter:
-            logger.info("Branch filter disabled (DENTIST_PLUS_BRANCH_ID <= 0)")
-
-        self.timeout = ClientTimeout(total=30)
+            logger.info("Branch filter disabled (DENTIST_PLUS_BRANCH_ID <= 0, DENTIST_PLUS_BRANCH_IDS empty)")
+
+        # Профили таймаутов: пациент ждёт ответа в чате — сдаёмся быстро (дальше повтор/хедж),
+        # фоновая синхронизация и напоминания могут подождать медленный API
+        connect_timeout = max(0.1, settings.DENTIST_PLUS_CONNECT_TIMEOUT_SECONDS)
+        self.timeouts: dict[int, ClientTimeout] = {
+            PRIORITY_INTERACTIVE: ClientTimeout(
+                total=max(connect_timeout, settings.DENTIST_PLUS_INTERACTIVE_TIMEOUT_SECONDS),
+                connect=connect_timeout,
+            ),
+            PRIORITY_BATCH: ClientTimeout(
+                total=max(connect_timeout, settings.DENTIST_PLUS_BATCH_TIMEOUT_SECONDS),
+                connect=connect_timeout,
+            ),
+        }
+        self.timeout = self.timeouts[PRIORITY_BATCH]
+        self.retry_policy = RetryPolicy(
+            max_attempts=max(1, settings.DENTIST_PLUS_RETRY_ATTEMPTS),
+            base_delay=max(0.0, settings.DENTIST_PLUS_RETRY_BASE_DELAY),
+            max_delay=max(0.0, settings.DENTIST_PLUS_RETRY_MAX_DELAY),
+        )
+        self._retry_budgets: dict[str, RetryBudget] = {}
+        self.hedging_enabled = settings.DENTIST_PLUS_HEDGING_ENABLED and len(self._base_urls) > 1
+        # Пока у хоста нет замеров p95, хеджируем после этой паузы
+        self.hedge_default_delay = max(0.05, settings.DENTIST_PLUS_HEDGE_DELAY_MS / 1000)
+        self.hedge_stats = {"sent": 0, "won": 0}
         self._session: Optional[aiohttp.ClientSession] = None
         self._token: Optional[str] = None
         self._token_expires_at: Optional[datetime] = None
+        self._token_lock = asyncio.Lock()
+        self._token_refresh_task: Optional[asyncio.Task] = None
+        self._auth_payload_idx = 0
+        self.token_cache_path = settings.DENTIST_PLUS_TOKEN_CACHE_PATH
+        self._token_loaded = not self.token_cache_path
+
+        self._rate_limiter = TokenBucketRateLimiter(
+            rate_per_minute=settings.DENTIST_PLUS_RATE_LIMIT_PER_MINUTE,
+            burst=settings.DENTIST_PLUS_RATE_LIMIT_BURST,
+        )
+        self.page_concurrency = max(1, settings.DENTIST_PLUS_PAGE_CONCURRENCY)
+        # Длинные окна /visits режутся на куски по N дней и качаются параллельно
+        self.range_chunk_days = max(0, settings.DENTIST_PLUS_RANGE_CHUNK_DAYS)
+
+        reference_ttl = max(0, settings.DENTIST_PLUS_REFERENCE_TTL_SECONDS)
+        self.reference_cache_path = settings.DENTIST_PLUS_REFERENCE_CACHE_PATH
+        self._reference_cache: AsyncTTLCache[list[dict[str, Any]]] = AsyncTTLCache(
+            ttl=reference_ttl,
+            # После TTL ещё сутки отдаём старое значение, обновляя его в фоне
+            stale_ttl=24 * 60 * 60,
+            name="dentist_plus_reference",
+            on_store=self._save_reference_snapshot,
+        )
+        self._restore_reference_snapshot()
+
+        # В кэше лежат уже разобранные Visit без сырого payload
+        self._visits_cache: AsyncTTLCache[tuple[Visit, ...]] = AsyncTTLCache(
+            ttl=max(0, settings.DENTIST_PLUS_VISITS_CACHE_TTL_SECONDS),
+            stale_ttl=max(0, settings.DENTIST_PLUS_VISITS_CACHE_STALE_SECONDS),
+            name="dentist_plus_visits",
+            max_entries=500,
+        )
 
-        self._request_times: list[datetime] = []
-        self._max_requests_per_minute = 60
+        # Разбор ответов: быстрый JSON-декодер и запомненная форма страниц по endpoint'ам —
+        # (путь к списку элементов, путь к last_page), чтобы не перебирать форматы на каждой странице
+        self.json_decoder, self._json_loads = get_json_loads(settings.DENTIST_PLUS_JSON_DECODER)
+        self._page_shapes: dict[str, tuple[Optional[tuple[str, ...]], Optional[tuple[str, ...]]]] = {}
+        self.compression_stats = {"responses": 0, "compressed": 0}
+        # Реестр метрик можно подменить (см. MetricsRegistry); по умолчанию — общий реестр процесса
+        self.metrics: MetricsRegistry = metrics
+        self._last_host: Optional[str] = None
+
+        # Выученное поведение API (включает ли date_to последний день, работает ли фильтр
+        # по филиалу): без него пустой день стоит до 4 запросов из-за запасных перезапросов
+        self.semantics_path = settings.DENTIST_PLUS_SEMANTICS_PATH
+        self.semantics_recheck = timedelta(hours=max(1, settings.DENTIST_PLUS_SEMANTICS_RECHECK_HOURS))
+        self._semantics: dict[str, dict[str, Any]] = {}
+        self._load_semantics()
 
     @staticmethod
     def _build_base_url_candidates(primary_url: str) -> list[str]:
@@ -175,55 +583,64 @@ class YClientsClient:
         return candidates or ["https://api2.dentist-plus.com/partner"]
 
     def _active_base_url(self) -> str:
-        if not self._base_urls:
-            self._base_urls = ["https://api2.dentist-plus.com/partner"]
-            self._base_url_idx = 0
-        self._base_url_idx = max(0, min(self._base_url_idx, len(self._base_urls) - 1))
-        return self._base_urls[self._base_url_idx]
-
-    def _rotate_base_url(self) -> bool:
-        if self._base_url_idx + 1 >= len(self._base_urls):
-            return False
-        prev = self._active_base_url()
-        self._base_url_idx += 1
-        self.base_url = self._active_base_url()
-        logger.warning("Switching Dentist plus base URL from %s to %s", prev, self.base_url)
-        return True
+        """Хост, который сейчас выбран для запросов (самый быстрый из здоровых)."""
+        return self._hosts.pick()
+
+    def _record_host_response(self, host: str, status: int, latency: float) -> None:
+        if status >= 500:
+            self._hosts.record_failure(host)
+        elif status == 429:
+            # Хост жив, но троттлит — это не повод его размыкать и не честная задержка
+            self._hosts.release(host)
+        else:
+            self._hosts.record_success(host, latency)
 
     async def _get_session(self) -> aiohttp.ClientSession:
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(timeout=self.timeout)
+            # Пул соединений с keep-alive: страницы /visits и повторы идут по уже
+            # открытым TLS-соединениям, DNS хостов API кэшируется
+            connector = aiohttp.TCPConnector(
+                limit=max(1, settings.DENTIST_PLUS_POOL_LIMIT),
+                limit_per_host=max(1, settings.DENTIST_PLUS_POOL_LIMIT_PER_HOST),
+                keepalive_timeout=max(1.0, settings.DENTIST_PLUS_KEEPALIVE_SECONDS),
+                ttl_dns_cache=max(0, settings.DENTIST_PLUS_DNS_CACHE_SECONDS) or None,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
         return self._session
 
+    def _timeout_for_priority(self) -> ClientTimeout:
+        return self.timeouts.get(current_priority(), self.timeout)
+
     async def close(self) -> None:
+        if self._token_refresh_task and not self._token_refresh_task.done():
+            self._token_refresh_task.cancel()
+            await asyncio.gather(self._token_refresh_task, return_exceptions=True)
+        self._token_refresh_task = None
+        await self._reference_cache.aclose()
+        await self._visits_cache.aclose()
         if self._session and not self._session.closed:
             await self._session.close()
 
-    async def _check_rate_limit(self) -> None:
-        now = datetime.now()
-        self._request_times = [t for t in self._request_times if now - t < timedelta(minutes=1)]
-        if len(self._request_times) >= self._max_requests_per_minute:
-            wait_time = 60 - (now - self._request_times[0]).total_seconds()
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-                self._request_times.clear()
-        self._request_times.append(now)
-
     async def _auth(self) -> None:
         if not self.login or not self.password:
             raise YClientsAPIError("Dentist plus credentials are not configured")
 
         session = await self._get_session()
-        url = f"{self._active_base_url()}/auth"
         payloads = (
             {"login": self.login, "pass": self.password},
             {"login": self.login, "password": self.password},
         )
+        # Сначала пробуем формат, который сработал в прошлый раз
+        order = sorted(range(len(payloads)), key=lambda i: i != self._auth_payload_idx)
         last_error: Exception | None = None
+        failed_hosts: set[str] = set()
 
-        for payload in payloads:
+        started = time.monotonic()
+        for idx in order:
+            payload = payloads[idx]
+            host = self._hosts.pick(exclude=failed_hosts)
             try:
-                async with session.post(url, json=payload) as response:
+                async with session.post(f"{host}/auth", json=payload) as response:
                     try:
                         data = await response.json()
                     except Exception:
@@ -234,194 +651,848 @@ class YClientsClient:
                     if response.status >= 400:
                         raise YClientsAPIError(f"Dentist plus auth failed: {response.status} {data}")
 
-                self._token = data.get("token")
+                token = data.get("token")
                 expires_at_raw = data.get("expires_at")
-                if not self._token:
+                if not token:
                     raise YClientsAPIError("Dentist plus auth token missing")
 
                 if isinstance(expires_at_raw, str):
-                    self._token_expires_at = datetime.fromisoformat(expires_at_raw.replace("Z", "+00:00"))
+                    expires_at = datetime.fromisoformat(expires_at_raw.replace("Z", "+00:00"))
+                    if expires_at.tzinfo is None:
+                        expires_at = expires_at.replace(tzinfo=timezone.utc)
                 else:
-                    self._token_expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+                    expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+                self._token = token
+                self._token_expires_at = expires_at
+                self._auth_payload_idx = idx
+                self._save_token()
+                self._schedule_token_refresh()
+                self.metrics.observe("dentist_plus_auth_seconds", time.monotonic() - started)
+                self.metrics.inc("dentist_plus_auth_total", result="ok")
                 return
-            except (ClientError, asyncio.TimeoutError, YClientsAPIError, ValueError) as e:
+            except (ClientError, asyncio.TimeoutError) as e:
+                # Хост недоступен — следующий формат пробуем уже на другом
+                self._hosts.record_failure(host)
+                failed_hosts.add(host)
+                last_error = e
+                continue
+            except (YClientsAPIError, ValueError) as e:
                 last_error = e
                 continue
 
+        self.metrics.observe("dentist_plus_auth_seconds", time.monotonic() - started)
+        self.metrics.inc("dentist_plus_auth_total", result="error")
         raise YClientsAPIError(f"Unable to authorize in Dentist plus: {last_error}")
 
+    def _token_valid(self) -> bool:
+        if not self._token or not self._token_expires_at:
+            return False
+        return datetime.now(timezone.utc) < self._token_expires_at - timedelta(minutes=1)
+
     async def _ensure_token(self) -> None:
-        now = datetime.now(timezone.utc)
-        if not self._token or not self._token_expires_at or now >= (self._token_expires_at - timedelta(minutes=1)):
+        if self._token_valid():
+            return
+        # Single-flight: при протухшем токене в _auth идёт только одна корутина,
+        # остальные ждут на локе и получают уже свежий токен
+        async with self._token_lock:
+            if self._token_valid():
+                return
+            if not self._token_loaded and self._load_token() and self._token_valid():
+                return
             await self._auth()
 
+    def _invalidate_token(self, token: Optional[str]) -> None:
+        """Сбрасывает токен после 401, если его ещё не обновила другая корутина."""
+        if token is not None and token == self._token:
+            self._token = None
+            self._token_expires_at = None
+
+    def _load_token(self) -> bool:
+        self._token_loaded = True
+        data = read_json_state(self.token_cache_path)
+        if not data or data.get("login") != self.login:
+            return False
+        try:
+            expires_at = datetime.fromisoformat(str(data["expires_at"]))
+            token = str(data["token"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not token or expires_at.tzinfo is None:
+            return False
+        self._token = token
+        self._token_expires_at = expires_at
+        if self._token_valid():
+            logger.info("Dentist plus token restored from %s (expires_at=%s)", self.token_cache_path, expires_at)
+            self._schedule_token_refresh()
+            return True
+        return False
+
+    def _save_token(self) -> None:
+        if not self.token_cache_path or not self._token or not self._token_expires_at:
+            return
+        write_json_state(
+            self.token_cache_path,
+            {
+                "login": self.login,
+                "token": self._token,
+                "expires_at": self._token_expires_at.isoformat(),
+            },
+        )
+
+    def _schedule_token_refresh(self) -> None:
+        """Обновляет токен в фоне заранее, чтобы запросы не ждали auth при истечении."""
+        if not self._token_expires_at:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._token_refresh_task and not self._token_refresh_task.done():
+            if self._token_refresh_task is asyncio.current_task():
+                self._token_refresh_task = None
+            else:
+                self._token_refresh_task.cancel()
+        lifetime = (self._token_expires_at - datetime.now(timezone.utc)).total_seconds()
+        # За 5 минут до истечения, а для коротких токенов — на половине срока
+        delay = max(lifetime - min(300.0, lifetime / 2), 0.0)
+        self._token_refresh_task = loop.create_task(self._refresh_token_later(delay))
+
+    async def _refresh_token_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            async with self._token_lock:
+                await self._auth()
+            logger.info("Dentist plus token refreshed in background (expires_at=%s)", self._token_expires_at)
+        except YClientsAPIError as e:
+            # Не страшно: следующий запрос обновит токен сам через _ensure_token
+            logger.warning("Background Dentist plus token refresh failed: %s", e)
+
+    def _retry_budget(self, method: str, endpoint: str) -> RetryBudget:
+        key = call_path(method, endpoint)
+        budget = self._retry_budgets.get(key)
+        if budget is None:
+            budget = RetryBudget(ratio=settings.DENTIST_PLUS_RETRY_BUDGET_RATIO)
+            self._retry_budgets[key] = budget
+        return budget
+
     async def _make_request(self, method: str, endpoint: str, *, auth: bool = True, **kwargs) -> Any:
-        await self._check_rate_limit()
-        if auth:
-            await self._ensure_token()
+        path = endpoint if endpoint.startswith("/") else "/" + endpoint
+        endpoint_label = call_path(method, path)
+        policy = self.retry_policy
+        budget = self._retry_budget(method, path)
+        budget.record_request()
+        # 5xx повторяем только для запросов без побочных эффектов
+        retry_server_errors = method.upper() in ("GET", "HEAD")
+        # Пациент ждёт ответа в чате — GET можно продублировать на второй хост
+        hedge = (
+            self.hedging_enabled
+            and method.upper() == "GET"
+            and current_priority() == PRIORITY_INTERACTIVE
+        )
 
         session = await self._get_session()
-        url = f"{self._active_base_url()}{endpoint if endpoint.startswith('/') else '/' + endpoint}"
         headers = kwargs.pop("headers", {})
-        if auth and self._token:
-            headers["Authorization"] = f"Bearer {self._token}"
         headers["Content-Type"] = "application/json"
         headers["Accept"] = "application/json"
+        # aiohttp распаковывает сам; явно, чтобы страницы по 200 визитов шли сжатыми
+        headers["Accept-Encoding"] = "gzip, deflate"
 
-        for attempt in range(1, 4):
+        attempt = 0
+        reauthorized = False
+        failed_hosts: set[str] = set()
+        while True:
+            attempt += 1
+            # Приоритет берётся из контекста: interactive_priority() в хендлерах пациента.
+            # Каждая попытка — отдельный запрос к API и проходит через лимитер.
+            wait_started = time.monotonic()
+            await self._rate_limiter.acquire()
+            waited = time.monotonic() - wait_started
+            if waited >= 0.001:
+                self.metrics.inc("dentist_plus_rate_limit_waits_total", priority=current_priority())
+                self.metrics.inc("dentist_plus_rate_limit_wait_seconds_total", waited, priority=current_priority())
+            if auth:
+                await self._ensure_token()
+            # Повтор уходит на другой хост, если есть здоровый
+            host = self._hosts.pick(exclude=failed_hosts)
+            if self._last_host is not None and host != self._last_host:
+                self.metrics.inc("dentist_plus_host_switches_total")
+            self._last_host = host
+            used_token = self._token if auth else None
+            if used_token:
+                headers["Authorization"] = f"Bearer {used_token}"
+
+            retry_after: Optional[float] = None
+            send_args = (session, method, path, headers, kwargs)
             try:
-                async with session.request(method, url, headers=headers, **kwargs) as response:
-                    try:
-                        data = await response.json()
-                    except Exception:
-                        text = await response.text()
-                        raise YClientsAPIError(f"Dentist plus non-JSON response: {response.status} {text[:400]}")
-
-                    # Протух токен — один раз пробуем переавторизоваться
-                    if response.status == 401 and auth and attempt == 1:
-                        self._token = None
-                        self._token_expires_at = None
-                        await self._ensure_token()
-                        continue
-
-                    if response.status >= 400:
-                        raise YClientsAPIError(f"Dentist plus API error: {response.status} {data}")
-                    return data
-            except (ClientError, asyncio.TimeoutError) as e:
-                host = urlparse(url).netloc
+                if hedge:
+                    return await self._send_hedged(host, *send_args, retry_server_errors=retry_server_errors)
+                return await self._send(host, *send_args, retry_server_errors=retry_server_errors)
+            except _TokenRejected:
+                # Протух токен — один раз пробуем переавторизоваться (не считается попыткой)
+                if not auth or reauthorized:
+                    raise YClientsAPIError("Dentist plus API error: 401 unauthorized")
+                reauthorized = True
+                attempt -= 1
+                self.metrics.inc("dentist_plus_auth_refreshes_total", reason="401")
+                self._invalidate_token(used_token)
+                await self._ensure_token()
+                continue
+            except YClientsRateLimitError as e:
+                error: YClientsAPIError = e
+                retry_after = e.retry_after
+                if retry_after is not None and retry_after > policy.max_retry_after:
+                    raise
+            except _RetryableError as e:
+                failed_hosts.update(e.hosts)
+                error = e.error
+
+            if attempt >= policy.max_attempts:
+                raise error
+            if not budget.try_spend():
+                self.metrics.inc("dentist_plus_retry_budget_exhausted_total", endpoint=endpoint_label)
                 logger.warning(
-                    "Dentist plus request failed (%s %s): %s (attempt %s)",
-                    method,
-                    host,
-                    e,
-                    attempt,
+                    "Dentist plus retry budget exhausted for %s, failing fast: %s",
+                    endpoint_label,
+                    error,
                 )
-                if attempt == 2:
-                    self._rotate_base_url()
-                if attempt < 3:
-                    await asyncio.sleep(1)
-                    continue
-                raise YClientsAPIError(f"Connection error: {e}")
+                raise error
+            self.metrics.inc(
+                "dentist_plus_retries_total",
+                endpoint=endpoint_label,
+                reason="rate_limit" if retry_after is not None else "error",
+            )
+            # При Retry-After ждать заставит лимитер (pause в _send), иначе — backoff с jitter
+            delay = 0.0 if retry_after else policy.backoff(attempt)
+            logger.info(
+                "Retrying Dentist plus %s %s in %.2fs (attempt %s/%s): %s",
+                method,
+                path,
+                delay,
+                attempt + 1,
+                policy.max_attempts,
+                error,
+            )
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def _send(
+        self,
+        host: str,
+        session: aiohttp.ClientSession,
+        method: str,
+        path: str,
+        headers: dict[str, str],
+        kwargs: dict[str, Any],
+        *,
+        retry_server_errors: bool,
+    ) -> Any:
+        """Один HTTP-запрос на конкретный хост. Исход записывается в статистику хоста."""
+        url = f"{host}{path}"
+        endpoint = call_path(method, path)
+        recorded = False
+        self._hosts.begin(host)
+        started = time.monotonic()
+        try:
+            request_kwargs = {"timeout": self._timeout_for_priority(), **kwargs}
+            async with session.request(method, url, headers=headers, **request_kwargs) as response:
+                recorded = True
+                self._record_host_response(host, response.status, time.monotonic() - started)
+                self.metrics.inc("dentist_plus_requests_total", endpoint=endpoint, status=response.status)
+                if response.status == 429:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if retry_after:
+                        # Пауза для всех запросов клиента, а не только для этого;
+                        # совсем длинный Retry-After не должен останавливать бота надолго
+                        self._rate_limiter.pause(min(retry_after, self.retry_policy.max_retry_after))
+                    raise YClientsRateLimitError(
+                        f"Dentist plus rate limit exceeded (Retry-After={retry_after})",
+                        retry_after=retry_after,
+                    )
+                body = await response.read()
+                self.metrics.observe("dentist_plus_request_seconds", time.monotonic() - started, endpoint=endpoint)
+                self.metrics.inc("dentist_plus_response_bytes_total", len(body), endpoint=endpoint)
+                self.compression_stats["responses"] += 1
+                if response.headers.get("Content-Encoding", "") in ("gzip", "deflate"):
+                    self.compression_stats["compressed"] += 1
+                try:
+                    data = self._json_loads(body) if body.strip() else None
+                except ValueError:
+                    text = body.decode("utf-8", errors="replace")
+                    error = YClientsAPIError(f"Dentist plus non-JSON response: {response.status} {text[:400]}")
+                    if response.status >= 500 and retry_server_errors:
+                        raise _RetryableError(error, host)
+                    raise error
+
+                if response.status == 401:
+                    raise _TokenRejected()
+                if response.status >= 500 and retry_server_errors:
+                    raise _RetryableError(YClientsAPIError(f"Dentist plus API error: {response.status} {data}"), host)
+                if response.status >= 400:
+                    raise YClientsAPIError(f"Dentist plus API error: {response.status} {data}")
+                return data
+        except (ClientError, asyncio.TimeoutError) as e:
+            recorded = True
+            self._hosts.record_failure(host)
+            self.metrics.inc("dentist_plus_requests_total", endpoint=endpoint, status="error")
+            logger.warning("Dentist plus request failed (%s %s): %s", method, urlparse(url).netloc, e)
+            raise _RetryableError(YClientsAPIError(f"Connection error: {e}"), host) from e
+        finally:
+            if not recorded:
+                # Запрос отменили (проиграл хедж) — вердикта о хосте нет
+                self._hosts.release(host)
+
+    def _hedge_delay(self, host: str) -> float:
+        p95 = self._hosts.stats[host].percentile(0.95)
+        if p95 is None:
+            return self.hedge_default_delay
+        return max(p95, 0.05)
+
+    async def _send_hedged(self, host: str, *send_args: Any, retry_server_errors: bool) -> Any:
+        """
+        Хеджированный GET: если основной хост не ответил за свой p95, тот же запрос
+        уходит на следующий здоровый хост, и берётся первый успешный ответ.
+        Проигравший запрос отменяется.
+        """
+        primary = asyncio.ensure_future(self._send(host, *send_args, retry_server_errors=retry_server_errors))
+        pending: set[asyncio.Future] = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self._hedge_delay(host))
+            backup = self._hosts.backup_for(host)
+            if not done and backup is not None:
+
+                async def hedge() -> Any:
+                    await self._rate_limiter.acquire()
+                    return await self._send(backup, *send_args, retry_server_errors=retry_server_errors)
+
+                self.hedge_stats["sent"] += 1
+                logger.info("Hedging Dentist plus request to %s: %s is slower than its p95", backup, host)
+                pending.add(asyncio.ensure_future(hedge()))
+
+            errors: list[BaseException] = []
+            while True:
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        if task is not primary:
+                            self.hedge_stats["won"] += 1
+                        return task.result()
+                    errors.append(exc)
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        # Оба упали: для повтора исключаем все упавшие хосты
+        retryable = [e for e in errors if isinstance(e, _RetryableError)]
+        if len(retryable) == len(errors):
+            raise _RetryableError(retryable[-1].error, *(h for e in retryable for h in e.hosts))
+        raise next(e for e in reversed(errors) if not isinstance(e, _RetryableError))
+
+    async def _fetch_page(
+        self,
+        endpoint: str,
+        params: dict[str, Any],
+        page: int,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """Элементы страницы и номер последней страницы."""
+        query = dict(params)
+        query["page"] = page
+        query.setdefault("per_page", 200)
+        payload = await self._make_request("GET", endpoint, params=query)
+        items_hint, last_hint = self._page_shapes.get(endpoint, (None, None))
+        chunk, items_path = _page_items(payload, items_hint)
+        last_page, last_path = _page_last(payload, page, last_hint)
+        shape = (
+            items_path if items_path is not None else items_hint,
+            last_path if last_path is not None else last_hint,
+        )
+        if shape != (items_hint, last_hint):
+            self._page_shapes[endpoint] = shape
+        return [item for item in chunk if isinstance(item, dict)], last_page
+
+    async def _iter_pages(
+        self,
+        endpoint: str,
+        params: dict[str, Any],
+        *,
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Отдаёт страницы endpoint'а по мере загрузки, строго в порядке страниц.
+
+        Первая страница всегда запрашивается отдельно — из её meta узнаём last_page.
+        Если fan-out > 1, остальные страницы качаются параллельно (не больше
+        `concurrency` запросов одновременно), пока вызывающий код обрабатывает уже
+        полученные. Все запросы идут через _make_request, поэтому делят общий rate limit.
+        """
+        fan_out = self.page_concurrency if concurrency is None else concurrency
+        chunk, last_page = await self._fetch_page(endpoint, params, 1)
+        yield chunk
+
+        if fan_out <= 1:
+            page = 1
+            while page < last_page:
+                page += 1
+                chunk, last_page = await self._fetch_page(endpoint, params, page)
+                yield chunk
+            return
+
+        semaphore = asyncio.Semaphore(fan_out)
+
+        async def fetch(page: int) -> list[dict[str, Any]]:
+            async with semaphore:
+                page_chunk, _last_page = await self._fetch_page(endpoint, params, page)
+                return page_chunk
+
+        tasks = [asyncio.create_task(fetch(page)) for page in range(2, last_page + 1)]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            # Ошибка на одной из страниц или вызывающий код прервал обход —
+            # остальные страницы больше не нужны
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
     async def _collect_paginated(
         self,
         endpoint: str,
         params: dict[str, Any],
+        *,
+        concurrency: Optional[int] = None,
     ) -> list[dict[str, Any]]:
-        page = 1
+        """Собирает все страницы endpoint'а в один список (см. _iter_pages)."""
         result: list[dict[str, Any]] = []
-        while True:
-            query = dict(params)
-            query["page"] = page
-            query.setdefault("per_page", 200)
-            payload = await self._make_request("GET", endpoint, params=query)
-            chunk, meta = _extract_page_items_and_meta(payload)
-            for item in chunk:
-                if isinstance(item, dict):
-                    result.append(item)
-            last_page = _last_page_from_meta(meta, page)
-            if page >= last_page:
-                break
-            page += 1
+        started = time.monotonic()
+        pages = 0
+        async for chunk in self._iter_pages(endpoint, params, concurrency=concurrency):
+            pages += 1
+            result.extend(chunk)
+        label = call_path("GET", endpoint)
+        self.metrics.observe("dentist_plus_paginated_seconds", time.monotonic() - started, endpoint=label)
+        self.metrics.inc("dentist_plus_pages_total", pages, endpoint=label)
         return result
 
-    async def get_records(
+    def _load_semantics(self) -> None:
+        data = read_json_state(self.semantics_path)
+        if not data:
+            return
+        for name, entry in data.items():
+            if isinstance(entry, dict) and isinstance(entry.get("value"), bool):
+                self._semantics[name] = entry
+        if self._semantics:
+            logger.info("Dentist plus API semantics restored from %s: %s", self.semantics_path, self._semantics)
+
+    def _learned(self, name: str) -> Optional[bool]:
+        """
+        Выученное значение или None, если не знаем, оно устарело (пора перепроверить)
+        или относится к другому API/филиалу.
+        """
+        entry = self._semantics.get(name)
+        if not entry or entry.get("base_url") != self.base_url:
+            return None
+        if name == "branch_filter" and entry.get("branch_ids") != self.branch_ids:
+            return None
+        try:
+            checked_at = datetime.fromisoformat(str(entry["checked_at"]))
+        except (KeyError, ValueError):
+            return None
+        if datetime.now(timezone.utc) - checked_at > self.semantics_recheck:
+            return None
+        return entry["value"]
+
+    def _learn(self, name: str, value: bool) -> None:
+        previous = self._learned(name)
+        self._semantics[name] = {
+            "value": value,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "base_url": self.base_url,
+            "branch_ids": self.branch_ids,
+        }
+        if previous != value:
+            logger.info("Dentist plus API semantics: %s=%s", name, value)
+            if name == "branch_filter" and not value:
+                logger.warning(
+                    "Dentist plus returned visits only without branch_id; "
+                    "visits are now requested unfiltered and split by branch locally."
+                )
+        write_json_state(self.semantics_path, self._semantics)
+
+    def _branch_scopes(self, branch_id: Optional[int] = None) -> list[Optional[int]]:
+        """Филиалы запроса: заданный, все настроенные или [None] — без фильтра."""
+        if not self.use_branch_filter:
+            return [None]
+        if branch_id is not None:
+            return [branch_id]
+        return list(self.branch_ids)
+
+    def _visits_params(
         self,
         start_date: datetime,
         end_date: datetime,
         client_id: Optional[int] = None,
-    ) -> list[dict[str, Any]]:
+        branch_id: Optional[int] = None,
+    ) -> dict[str, Any]:
         params: dict[str, Any] = {
             "date_from": start_date.strftime("%Y-%m-%d"),
             "date_to": end_date.strftime("%Y-%m-%d"),
             "with_deleted": "1",
         }
-        if self.use_branch_filter:
-            params["branch_id"] = self.branch_id
+        if branch_id is not None:
+            params["branch_id"] = branch_id
         if client_id:
             params["patient_id"] = client_id
+        return params
+
+    @staticmethod
+    def _log_empty_visits(params: dict[str, Any]) -> None:
+        logger.info(
+            "No visits from Dentist plus API for date_from=%s date_to=%s branch_id=%s — "
+            "проверьте DENTIST_PLUS_BRANCH_ID, URL и доступ партнёрского аккаунта.",
+            params["date_from"],
+            params["date_to"],
+            params.get("branch_id"),
+        )
+
+    @staticmethod
+    def _log_unmapped_visits(visits: list[Any]) -> None:
+        sample = visits[0] if visits else {}
+        keys = list(sample.keys())[:30] if isinstance(sample, dict) else []
+        logger.warning(
+            "Dentist plus returned %s visits but none mapped — likely unexpected `start` format. "
+            "sample_start=%r keys=%s",
+            len(visits),
+            sample.get("start") if isinstance(sample, dict) else None,
+            keys,
+        )
+
+    @staticmethod
+    def _visits_cache_key(params: dict[str, Any]) -> tuple[Any, ...]:
+        return (
+            params["date_from"],
+            params["date_to"],
+            params.get("branch_id"),
+            params.get("patient_id"),
+        )
+
+    async def _fetch_visits(
+        self,
+        params: dict[str, Any],
+        *,
+        keep_raw: bool = False,
+        ranges: list[tuple[datetime, datetime]] | None = None,
+    ) -> tuple[Visit, ...]:
+        if ranges and len(ranges) > 1:
+            return await self._fetch_visits_split(params, ranges, keep_raw=keep_raw)
+        raw_visits = await self._collect_paginated("/visits", params)
+        visits = tuple(_visits_from_page(raw_visits, keep_raw=keep_raw, branch_id=params.get("branch_id")))
+        if raw_visits and not visits:
+            self._log_unmapped_visits(raw_visits)
+        return visits
+
+    async def _fetch_visits_split(
+        self,
+        params: dict[str, Any],
+        ranges: list[tuple[datetime, datetime]],
+        *,
+        keep_raw: bool = False,
+    ) -> tuple[Visit, ...]:
+        """
+        Длинное окно: сначала первая страница целиком. Уместилось на одной странице
+        (типично для окна одного пациента) — это и есть ответ, один запрос. Иначе окно
+        качается кусками ranges параллельно; первая страница выбрасывается — куски её перекрывают.
+        """
+        page, last_page = await self._fetch_page("/visits", params, 1)
+        if last_page <= 1:
+            visits = tuple(_visits_from_page(page, keep_raw=keep_raw, branch_id=params.get("branch_id")))
+            if page and not visits:
+                self._log_unmapped_visits(page)
+            return visits
+
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def fetch(chunk_start: datetime, chunk_end: datetime) -> tuple[Visit, ...]:
+            query = {
+                **params,
+                "date_from": chunk_start.strftime("%Y-%m-%d"),
+                "date_to": chunk_end.strftime("%Y-%m-%d"),
+            }
+            async with semaphore:
+                return await self._fetch_visits(query, keep_raw=keep_raw)
+
+        return _merge_visit_chunks(await asyncio.gather(*(fetch(*chunk) for chunk in ranges)))
+
+    async def _load_visits(
+        self,
+        params: dict[str, Any],
+        ranges: list[tuple[datetime, datetime]] | None = None,
+    ) -> tuple[Visit, ...]:
+        """
+        Окно визитов через кэш: планировщик, отчёт и хендлеры, запросившие одно и то же
+        окно одновременно или с небольшим интервалом, делят одну выборку из API.
+        """
+        if self._visits_cache.ttl <= 0:
+            # DENTIST_PLUS_VISITS_CACHE_TTL_SECONDS=0 — кэш выключен
+            return await self._fetch_visits(params, ranges=ranges)
+        return await self._visits_cache.get_or_load(
+            self._visits_cache_key(params),
+            lambda: self._fetch_visits(params, ranges=ranges),
+        )
+
+    async def _stream_visit_pages(self, params: dict[str, Any]) -> AsyncIterator[list[Visit]]:
+        """Страницы окна визитов прямо из API, по мере загрузки."""
+        sample: list[Any] = []
+        seen = mapped = 0
+        async for chunk in self._iter_pages("/visits", params):
+            if chunk and not sample:
+                sample = chunk[:1]
+            seen += len(chunk)
+            visits = _visits_from_page(chunk, branch_id=params.get("branch_id"))
+            mapped += len(visits)
+            yield visits
+        if seen and not mapped:
+            self._log_unmapped_visits(sample)
+
+    async def _iter_visit_pages(self, params: dict[str, Any]) -> AsyncIterator[list[Visit]]:
+        """
+        Страницы окна визитов для потокового чтения.
+        Окно уже в кэше или его прямо сейчас грузит другой вызов — ждём и отдаём оттуда.
+        Иначе загрузка регистрируется в кэше как идущая: одновременные вызовы по тому же
+        окну ждут её, а этому вызову страницы отдаются по мере прихода.
+        """
+        if self._visits_cache.ttl <= 0:
+            async for visits in self._stream_visit_pages(params):
+                yield visits
+            return
+
+        key = self._visits_cache_key(params)
+        if self._visits_cache.contains(key):
+            yield list(await self._load_visits(params))
+            return
+
+        pages: asyncio.Queue[Optional[list[Visit]]] = asyncio.Queue()
+
+        async def load() -> tuple[Visit, ...]:
+            collected: list[Visit] = []
+            try:
+                async for visits in self._stream_visit_pages(params):
+                    collected.extend(visits)
+                    pages.put_nowait(visits)
+            finally:
+                pages.put_nowait(None)
+            return tuple(collected)
+
+        # Загрузка общая: если этот вызов прервут, она доработает для остальных и для кэша.
+        # Инвалидация во время загрузки (подтверждение/отмена) не даст положить её в кэш
+        task = self._visits_cache.start_load(key, load)
+        while (visits := await pages.get()) is not None:
+            yield visits
+        # Ошибка API всплывает здесь, после уже отданных страниц
+        await asyncio.shield(task)
+
+    def invalidate_visits(self, visit_date: Optional[date] = None) -> int:
+        """
+        Сбрасывает закэшированные окна визитов, в которые попадает visit_date
+        (или все окна, если дата неизвестна). Вызывается после подтверждения/отмены.
+        """
+        if visit_date is None:
+            return self._visits_cache.invalidate()
+        day = visit_date.isoformat()
+        return self._visits_cache.invalidate(lambda key: key[0] <= day <= key[1])
+
+    def _split_range(self, start_date: datetime, end_date: datetime) -> list[tuple[datetime, datetime]]:
+        """
+        Режет длинное окно на куски не короче range_chunk_days дней. Кусков не больше,
+        чем запросов в burst лимитера за вычетом пробной первой страницы, — иначе
+        параллельные куски просто ждут токенов и окно грузится дольше, чем целиком.
+        Соседние куски делят граничный день: API может не включать date_to,
+        а дубли всё равно убираются при склейке по id визита.
+        """
+        days = (end_date.date() - start_date.date()).days
+        max_chunks = self._rate_limiter.capacity - 1
+        if self.range_chunk_days <= 0 or max_chunks < 2 or days <= self.range_chunk_days:
+            return [(start_date, end_date)]
+        chunk_days = max(self.range_chunk_days, -(-days // max_chunks))
+        chunks: list[tuple[datetime, datetime]] = []
+        cursor = start_date
+        while cursor.date() < end_date.date():
+            chunk_end = min(cursor + timedelta(days=chunk_days), end_date)
+            chunks.append((cursor, chunk_end))
+            cursor = chunk_end
+        return chunks
+
+    async def get_records(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        client_id: Optional[int] = None,
+        *,
+        raise_errors: bool = False,
+        keep_raw: bool = False,
+        branch_id: Optional[int] = None,
+        cached: bool = True,
+    ) -> list[Visit]:
+        """
+        Визиты за [start_date, end_date] (даты в формате API) всех настроенных филиалов
+        или только branch_id; у каждого визита проставлен его филиал.
+        По умолчанию ошибка API превращается в пустой список; raise_errors=True —
+        для вызывающих, которым важно отличить «визитов нет» от «API недоступен».
+        keep_raw=True сохраняет сырой payload в Visit.raw (такие выборки не кэшируются).
+        cached=False — свежая выборка из API мимо кэша окон (синхронизация зеркала).
+        """
+        branches = self._branch_scopes(branch_id)
+        # Окно режется на куски, только если API отдаёт его больше чем на одной странице
+        ranges = self._split_range(start_date, end_date)
+
+        def queries(*scopes: Optional[int]) -> list[dict[str, Any]]:
+            return [self._visits_params(start_date, end_date, client_id, scope) for scope in scopes]
+
+        async def load_one(query: dict[str, Any]) -> tuple[Visit, ...]:
+            if keep_raw or not cached:
+                return await self._fetch_visits(query, keep_raw=keep_raw, ranges=ranges)
+            return await self._load_visits(query, ranges)
+
+        async def load(queries: list[dict[str, Any]]) -> tuple[Visit, ...]:
+            if len(queries) == 1:
+                return await load_one(queries[0])
+            # Филиалы качаются параллельно; частоту запросов держит общий лимитер
+            semaphore = asyncio.Semaphore(self.page_concurrency)
 
+            async def bounded(query: dict[str, Any]) -> tuple[Visit, ...]:
+                async with semaphore:
+                    return await load_one(query)
+
+            return _merge_visit_chunks(await asyncio.gather(*(bounded(q) for q in queries)))
+
+        # Если фильтр API по филиалу не работает —
+        # один запрос без branch_id, а свои филиалы отбираем локально
+        works = self._learned("branch_filter") if branches != [None] else True
         try:
-            visits = await self._collect_paginated("/visits", params)
+            if works is False:
+                visits = _in_branches(await load(queries(None)), branches)
+            else:
+                visits = list(await load(queries(*branches)))
         except YClientsAPIError as e:
             logger.error("Failed to get visits: %s", e)
+            if raise_errors:
+                raise
             return []
 
-        if not visits:
-            logger.info(
-                "No visits from Dentist plus API for date_from=%s date_to=%s branch_id=%s — "
-                "проверьте DENTIST_PLUS_BRANCH_ID, URL и доступ партнёрского аккаунта.",
-                params["date_from"],
-                params["date_to"],
-                params.get("branch_id"),
-            )
-            if self.use_branch_filter:
-                params_no_branch = dict(params)
-                params_no_branch.pop("branch_id", None)
+        if works is None:
+            if visits:
+                self._learn("branch_filter", True)
+            else:
+                self._log_empty_visits(queries(*branches)[0])
                 try:
-                    visits = await self._collect_paginated("/visits", params_no_branch)
+                    unfiltered = await load(queries(None))
                 except YClientsAPIError as e:
                     logger.warning("Retry without branch_id failed: %s", e)
-                    visits = []
-                if visits:
-                    logger.warning(
-                        "Dentist plus returned visits only without branch_id. "
-                        "Set DENTIST_PLUS_BRANCH_ID=0 to disable branch filtering."
-                    )
+                    unfiltered = ()
+                # Запасная выборка — только для этого вызова; запоминаем лишь явное свидетельство
+                visits = _in_branches(unfiltered, branches)
+                evidence = _branch_filter_evidence(unfiltered, branches)
+                if evidence is not None:
+                    self._learn("branch_filter", evidence)
+        elif not visits:
+            self._log_empty_visits(queries(*branches)[0])
+        return list(visits)
+
+    async def iter_records(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        client_id: Optional[int] = None,
+        *,
+        branch_id: Optional[int] = None,
+    ) -> AsyncIterator[Visit]:
+        """
+        Потоковый аналог get_records: отдаёт визиты постранично,
+        пока следующие страницы ещё качаются. Филиалы стримятся параллельно.
+        Ошибки API, как и в get_records, логируются и завершают поток.
+        """
+        branches = self._branch_scopes(branch_id)
+        works = self._learned("branch_filter") if branches != [None] else True
+
+        if works is not False:
+            streams = [
+                self._iter_visit_pages(self._visits_params(start_date, end_date, client_id, scope))
+                for scope in branches
+            ]
+            mapped = 0
+            try:
+                async for chunk in _merge_streams(streams):
+                    mapped += len(chunk)
+                    for visit in chunk:
+                        yield visit
+            except YClientsAPIError as e:
+                logger.error("Failed to get visits: %s", e)
+                return
+            if mapped:
+                if works is None:
+                    self._learn("branch_filter", True)
+                return
+            self._log_empty_visits(self._visits_params(start_date, end_date, client_id, branches[0]))
+            if works is True:
+                return
+
+        unfiltered: list[Visit] = []
+        try:
+            async for chunk in self._iter_visit_pages(self._visits_params(start_date, end_date, client_id)):
+                unfiltered.extend(chunk)
+                for visit in _in_branches(chunk, branches):
+                    yield visit
+        except YClientsAPIError as e:
+            logger.warning("Retry without branch_id failed: %s", e)
+            return
+        if works is None:
+            evidence = _branch_filter_evidence(unfiltered, branches)
+            if evidence is not None:
+                self._learn("branch_filter", evidence)
+
+    async def iter_records_for_day(self, day: date, *, branch_id: Optional[int] = None) -> AsyncIterator[Visit]:
+        """
+        Визиты одного дня клиники (в её таймзоне).
 
-        # Нормализуем в старый формат для текущего кода
-        records: list[dict[str, Any]] = []
-        for v in visits:
-            if not isinstance(v, dict):
+        Если уже известно, включает ли API date_to, это один запрос: [day, day]
+        или [day, day+1] с фильтром по дате. Пока не известно — запрос на день,
+        а если он пуст, запасной на два дня; по их результату семантика и выучивается.
+        """
+        tz = _clinic_tz()
+        start = datetime(day.year, day.month, day.day, tzinfo=tz)
+        next_day = start + timedelta(days=1)
+        inclusive = self._learned("date_to_inclusive")
+
+        found = 0
+        async for visit in self.iter_records(
+            start,
+            start if inclusive is not False else next_day,
+            branch_id=branch_id,
+        ):
+            if visit.start.astimezone(tz).date() != day:
                 continue
-            patient = v.get("patient") if isinstance(v.get("patient"), dict) else {}
-            doctor = v.get("doctor") if isinstance(v.get("doctor"), dict) else {}
-            start = v.get("start")
-            dt_iso = _visit_start_to_iso_utc(start)
-            if dt_iso is None:
-                logger.debug(
-                    "Skip visit without parseable start: id=%s start=%r",
-                    v.get("id"),
-                    start,
-                )
+            found += 1
+            yield visit
+        if found:
+            if inclusive is None:
+                self._learn("date_to_inclusive", True)
+            return
+        if inclusive is not None:
+            return
+
+        async for visit in self.iter_records(start, next_day, branch_id=branch_id):
+            if visit.start.astimezone(tz).date() != day:
                 continue
-
-            client_id = patient.get("id")
-            if client_id is None:
-                client_id = v.get("patient_id")
-            staff_id = doctor.get("id")
-            if staff_id is None:
-                staff_id = v.get("doctor_id")
-
-            records.append(
-                {
-                    "id": v.get("id"),
-                    "datetime": dt_iso,
-                    "client": {
-                        "id": client_id,
-                        "name": _full_name(patient),
-                        "phone": patient.get("phone", ""),
-                    },
-                    "staff": {
-                        "id": staff_id,
-                        "name": _full_name(doctor) or "Доктор",
-                    },
-                    "services": [],
-                    "is_cancelled": bool(v.get("is_cancelled", False)),
-                    "_raw": v,
-                }
-            )
-        if visits and not records:
-            sample = visits[0] if visits else {}
-            keys = list(sample.keys())[:30] if isinstance(sample, dict) else []
-            logger.warning(
-                "Dentist plus returned %s visits but none mapped — likely unexpected `start` format. "
-                "sample_start=%r keys=%s",
-                len(visits),
-                sample.get("start") if isinstance(sample, dict) else None,
-                keys,
-            )
-        return records
+            found += 1
+            yield visit
+        if found:
+            self._learn("date_to_inclusive", False)
 
     async def get_record(self, record_id: int) -> Optional[dict[str, Any]]:
         try:
@@ -438,16 +1509,57 @@ class YClientsClient:
             logger.error("Failed to get visit %s: %s", record_id, e)
             return None
 
+    async def _get_reference(self, name: str) -> list[dict[str, Any]]:
+        """
+        Справочник Dentist plus (статусы, доктора, услуги) через TTL-кэш.
+        Меняются они редко, поэтому после TTL отдаём кэш и обновляем в фоне.
+        """
+        endpoint, params = _REFERENCE_ENDPOINTS[name]
+
+        async def load() -> list[dict[str, Any]]:
+            kwargs: dict[str, Any] = {"params": params} if params else {}
+            payload = await self._make_request("GET", endpoint, **kwargs)
+            if isinstance(payload, dict):
+                payload = payload.get("data", [])
+            if not isinstance(payload, list):
+                raise YClientsAPIError(f"Unexpected {endpoint} payload: {type(payload).__name__}")
+            return [item for item in payload if isinstance(item, dict)]
+
+        return await self._reference_cache.get_or_load(name, load)
+
+    def _restore_reference_snapshot(self) -> None:
+        data = read_json_state(self.reference_cache_path)
+        if not data:
+            return
+        restored = 0
+        for name, entry in data.items():
+            if name not in _REFERENCE_ENDPOINTS or not isinstance(entry, dict):
+                continue
+            value = entry.get("value")
+            stored_at = entry.get("stored_at")
+            if isinstance(value, list) and isinstance(stored_at, (int, float)):
+                self._reference_cache.set(name, value, stored_at=float(stored_at))
+                restored += 1
+        if restored:
+            logger.info("Dentist plus reference data restored from %s (%s lists)", self.reference_cache_path, restored)
+
+    def _save_reference_snapshot(self) -> None:
+        if not self.reference_cache_path:
+            return
+        write_json_state(
+            self.reference_cache_path,
+            {
+                str(name): {"value": value, "stored_at": stored_at}
+                for name, value, stored_at in self._reference_cache.items()
+            },
+        )
+
     async def _get_confirmed_status_id(self) -> Optional[int]:
         try:
-            statuses = await self._make_request("GET", "/record_statuses")
+            statuses = await self._get_reference("record_statuses")
         except YClientsAPIError:
             return None
-        if not isinstance(statuses, list):
-            return None
         for st in statuses:
-            if not isinstance(st, dict):
-                continue
             title = str(st.get("title", "")).lower()
             if "подтверж" in title:
                 sid = st.get("id")
@@ -468,6 +1580,7 @@ class YClientsClient:
             reason = comment or "Отменено пациентом через Telegram"
             try:
                 await self._make_request("POST", f"/visits/{record_id}/cancel", json={"reason": reason})
+                self.invalidate_visits(_visit_local_date(visit))
                 return True
             except YClientsAPIError as e:
                 logger.error("Failed to cancel visit %s: %s", record_id, e)
@@ -496,6 +1609,7 @@ class YClientsClient:
             payload = {k: v for k, v in payload.items() if v is not None}
             try:
                 await self._make_request("PUT", f"/visits/{record_id}", json=payload)
+                self.invalidate_visits(_visit_local_date(visit))
                 return True
             except YClientsAPIError as e:
                 logger.error("Failed to confirm visit %s: %s", record_id, e)
@@ -505,20 +1619,14 @@ class YClientsClient:
 
     async def get_services(self) -> list[dict[str, Any]]:
         try:
-            payload = await self._make_request("GET", "/services", params={"page": 1, "per_page": 200})
-            if isinstance(payload, dict):
-                return payload.get("data", [])
-            return []
+            return await self._get_reference("services")
         except YClientsAPIError as e:
             logger.error("Failed to get services: %s", e)
             return []
 
     async def get_staff(self) -> list[dict[str, Any]]:
         try:
-            payload = await self._make_request("GET", "/doctors", params={"page": 1, "per_page": 200})
-            if isinstance(payload, dict):
-                return payload.get("data", [])
-            return []
+            return await self._get_reference("doctors")
         except YClientsAPIError as e:
             logger.error("Failed to get doctors: %s", e)
             return []
@@ -527,6 +1635,8 @@ class YClientsClient:
         self,
         phone: Optional[str] = None,
         email: Optional[str] = None,
+        *,
+        raise_errors: bool = False,
     ) -> Optional[dict[str, Any]]:
         if not phone and not email:
             return None
@@ -538,6 +1648,8 @@ class YClientsClient:
             payload = await self._make_request("GET", "/patients", params=params)
         except YClientsAPIError as e:
             logger.error("Failed to find patient: %s", e)
+            if raise_errors:
+                raise
             return None
 
         patients = payload.get("data", []) if isinstance(payload, dict) else []
@@ -559,12 +1671,15 @@ class YClientsClient:
 
         if not best:
             return None
-        return {
-            "id": best.get("id"),
-            "name": _full_name(best),
-            "email": best.get("email", ""),
-            "phone": best.get("phone", ""),
-        }
+        return _patient_summary(best)
+
+    async def get_patients(self) -> list[dict[str, Any]]:
+        """
+        Вся база пациентов (для локального справочника) в виде find_client-словарей.
+        Ошибки API пробрасываются: синхронизация должна отличать «пусто» от «недоступно».
+        """
+        raw_patients = await self._collect_paginated("/patients", {})
+        return [_patient_summary(p) for p in raw_patients if p.get("id") is not None]
 
     async def diagnose_connection(self) -> dict[str, Any]:
         """
@@ -575,9 +1690,15 @@ class YClientsClient:
         report: dict[str, Any] = {
             "base_url": self._active_base_url(),
             "base_urls": list(self._base_urls),
+            "hosts": self._hosts.snapshot(),
+            "hedging": {"enabled": self.hedging_enabled, **self.hedge_stats},
+            "json_decoder": self.json_decoder,
+            "compression": dict(self.compression_stats),
+            "metrics": self.metrics.snapshot(),
             "login_configured": bool(self.login),
             "password_configured": bool(self.password),
             "branch_id": self.branch_id,
+            "branch_ids": list(self.branch_ids),
             "auth_ok": False,
             "auth_error": None,
             "visits_ok": False,
@@ -604,5 +1725,101 @@ class YClientsClient:
             report["visits_error"] = str(e)
             return report
 
+    def _probe_for_host(self, host: str) -> "YClientsClient":
+        """
+        Клиент, который ходит только на host: без хеджа, повторов и кэшей, токен
+        не пишется на диск, метрики не смешиваются с рабочими. Лимитер общий —
+        замер не должен съесть квоту API, нужную напоминаниям.
+        """
+        probe = YClientsClient()
+        probe.login, probe.password = self.login, self.password
+        probe._base_urls = [host]
+        probe._hosts = HostSelector([host])
+        probe.hedging_enabled = False
+        probe.retry_policy = RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0)
+        probe.token_cache_path = ""
+        probe._token_loaded = True
+        probe.semantics_path = ""
+        probe.reference_cache_path = ""
+        probe._auth_payload_idx = self._auth_payload_idx
+        probe._rate_limiter = self._rate_limiter
+        probe.metrics = NullMetricsRegistry()
+        return probe
+
+    async def _benchmark_host(self, host: str, params: dict[str, Any], iterations: int) -> dict[str, Any]:
+        probe = self._probe_for_host(host)
+        auth, first_page, window = (HostStats(window=iterations) for _ in range(3))
+        pages = items = total_items = 0
+        window_seconds = 0.0
+        last_error: Optional[str] = None
+        try:
+            for _ in range(iterations):
+                started = time.monotonic()
+                try:
+                    await probe._auth()
+                except YClientsAPIError as e:
+                    auth.record(False)
+                    last_error = str(e)
+                    continue
+                auth.record(True, time.monotonic() - started)
+
+                # Один обход окна: время до первой страницы и до последней
+                started = time.monotonic()
+                run_pages = run_items = 0
+                try:
+                    async for chunk in probe._iter_pages("/visits", params):
+                        if not run_pages:
+                            first_page.record(True, time.monotonic() - started)
+                        run_pages += 1
+                        run_items += len(chunk)
+                except YClientsAPIError as e:
+                    if not run_pages:
+                        first_page.record(False)
+                    window.record(False)
+                    last_error = str(e)
+                    continue
+                elapsed = time.monotonic() - started
+                window.record(True, elapsed)
+                window_seconds += elapsed
+                total_items += run_items
+                pages, items = run_pages, run_items
+        finally:
+            await probe.close()
+
+        def ms(stats: HostStats, q: float) -> Optional[int]:
+            value = stats.percentile(q)
+            return round(value * 1000) if value is not None else None
+
+        operations = auth.requests + window.requests
+        return {
+            "url": host,
+            "auth_p50_ms": ms(auth, 0.5),
+            "auth_p95_ms": ms(auth, 0.95),
+            "first_page_p50_ms": ms(first_page, 0.5),
+            "first_page_p95_ms": ms(first_page, 0.95),
+            "window_p50_ms": ms(window, 0.5),
+            "window_p95_ms": ms(window, 0.95),
+            "pages": pages,
+            "items": items,
+            "items_per_second": round(total_items / window_seconds, 1) if window_seconds else 0.0,
+            "error_rate": round((auth.errors + window.errors) / operations, 3) if operations else 0.0,
+            "last_error": last_error,
+        }
+
+    async def benchmark_connection(self, iterations: int = 5, window_days: int = 7) -> dict[str, Any]:
+        """
+        Замер всех кандидатов base URL (параллельно, по iterations прогонов на хост):
+        задержка auth, время до первой страницы и до полного окна /visits на
+        window_days вперёд, страницы, элементов в секунду, доля ошибок.
+        Нужен для /dpdiag bench — выбрать DENTIST_PLUS_API_URL по цифрам.
+        """
+        iterations = max(1, iterations)
+        tz = _clinic_tz()
+        now = datetime.now(tz)
+        start = datetime(now.year, now.month, now.day, tzinfo=tz)
+        params = self._visits_params(start, start + timedelta(days=max(1, window_days)), branch_id=self._branch_scopes()[0])
+        hosts = await asyncio.gather(*(self._benchmark_host(host, params, iterations) for host in self._base_urls))
+        return {"iterations": iterations, "window_days": window_days, "hosts": list(hosts)}
+
 
 yclients_client = YClientsClient()
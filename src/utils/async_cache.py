@@ -0,0 +1,160 @@
+"""Асинхронный TTL-кэш с single-flight загрузкой и stale-while-revalidate."""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry(Generic[T]):
+    value: T
+    stored_at: float  # time.time(), чтобы снапшот переживал перезапуск
+
+
+class AsyncTTLCache(Generic[T]):
+    """
+    Кэш результатов корутин.
+
+    - моложе ttl — значение отдаётся как есть;
+    - от ttl до ttl + stale_ttl — отдаётся старое значение, а обновление идёт в фоне;
+    - старше — загрузка синхронно; если она упала, отдаётся последнее известное значение.
+
+    Одновременные промахи по одному ключу делят одну загрузку (single-flight).
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        name: str = "cache",
+        on_store: Optional[Callable[[], None]] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self.max_entries = max_entries
+        # Растёт при каждой инвалидации: по нему можно понять, что данные,
+        # начатые загружаться раньше, уже устарели
+        self.generation = 0
+        # Вызывается после каждой успешной загрузки (например, чтобы сохранить снапшот)
+        self._on_store = on_store
+        self._entries: dict[Hashable, _Entry[T]] = {}
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: Hashable) -> Optional[T]:
+        entry = self._entries.get(key)
+        return entry.value if entry else None
+
+    def contains(self, key: Hashable) -> bool:
+        """Есть ли по ключу значение, которое ещё можно отдать, или идущая загрузка."""
+        if key in self._in_flight:
+            return True
+        entry = self._entries.get(key)
+        return entry is not None and time.time() - entry.stored_at < self.ttl + self.stale_ttl
+
+    def set(self, key: Hashable, value: T, stored_at: Optional[float] = None) -> None:
+        self._entries[key] = _Entry(value=value, stored_at=time.time() if stored_at is None else stored_at)
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        limit = self.ttl + self.stale_ttl
+        for key in [k for k, e in self._entries.items() if now - e.stored_at >= limit]:
+            del self._entries[key]
+        overflow = len(self._entries) - (self.max_entries or 0)
+        if overflow > 0:
+            oldest = sorted(self._entries.items(), key=lambda item: item[1].stored_at)[:overflow]
+            for key, _entry in oldest:
+                del self._entries[key]
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Удаляет все ключи (или подходящие под predicate). Возвращает число удалённых."""
+        self.generation += 1
+        keys = [k for k in self._entries if predicate is None or predicate(k)]
+        for key in keys:
+            del self._entries[key]
+        # Загрузка, начатая до инвалидации, не должна записать в кэш старые данные
+        for key in list(self._in_flight):
+            if predicate is None or predicate(key):
+                del self._in_flight[key]
+        return len(keys)
+
+    def items(self) -> Iterable[tuple[Hashable, T, float]]:
+        for key, entry in self._entries.items():
+            yield key, entry.value, entry.stored_at
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.time() - entry.stored_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.hits += 1
+                self.start_load(key, loader)
+                return entry.value
+
+        self.misses += 1
+        task = self.start_load(key, loader)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if entry is not None:
+                logger.warning("%s: reload of %r failed, serving stale value", self.name, key)
+                return entry.value
+            raise
+
+    def start_load(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """
+        Загрузка ключа независимо от свежести записи — или уже идущая по нему.
+        Пока она идёт, get_or_load по этому ключу ждёт её, а не грузит заново.
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            return task
+
+        async def run() -> T:
+            try:
+                value = await loader()
+                # Ключ инвалидировали во время загрузки — результат не кладём
+                if self._in_flight.get(key) is task:
+                    self.set(key, value)
+                    if self._on_store is not None:
+                        self._on_store()
+                return value
+            finally:
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+
+        task = asyncio.get_running_loop().create_task(run())
+        task.add_done_callback(self._log_background_failure)
+        self._in_flight[key] = task
+        return task
+
+    def _log_background_failure(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.debug("%s: load failed: %s", self.name, exc)
+
+    async def aclose(self) -> None:
+        tasks = list(self._in_flight.values())
+        self._in_flight.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,199 @@
+"""Здоровье хостов внешнего API: circuit breaker и скользящая статистика задержек на каждый хост."""
+import itertools
+import statistics
+import time
+from collections import deque
+from typing import Any, Iterable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Классический breaker: после failure_threshold ошибок подряд хост «размыкается»
+    на open_seconds. Затем пропускается один пробный запрос (half-open): успех —
+    хост снова в работе, ошибка — размыкаемся на вдвое больший срок (до max_open_seconds).
+    """
+
+    def __init__(self, failure_threshold: int = 3, open_seconds: float = 30.0, max_open_seconds: float = 300.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max(open_seconds, max_open_seconds)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self._current_open = open_seconds
+        self._probe_in_flight = False
+
+    def _refresh(self) -> None:
+        if self.state == OPEN and time.monotonic() >= self.opened_until:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+
+    def available(self) -> bool:
+        """Можно ли сейчас отправить запрос на хост (не резервирует пробу)."""
+        self._refresh()
+        if self.state == CLOSED:
+            return True
+        return self.state == HALF_OPEN and not self._probe_in_flight
+
+    def begin(self) -> None:
+        self._refresh()
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = True
+
+    def release(self) -> None:
+        """Запрос завершился без вердикта о здоровье хоста (429, отмена) — проба свободна."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._current_open = self.open_seconds
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._refresh()
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self._current_open = min(self._current_open * 2, self.max_open_seconds)
+            self._open()
+        elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_until = time.monotonic() + self._current_open
+        self._probe_in_flight = False
+
+
+class HostStats:
+    """Скользящие окна последних задержек (успешных запросов) и исходов."""
+
+    def __init__(self, window: int = 100):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, ok: bool, latency: Optional[float] = None) -> None:
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        cuts = statistics.quantiles(self.latencies, n=100, method="inclusive")
+        return cuts[max(0, min(98, round(q * 100) - 1))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class HostSelector:
+    """
+    Выбирает хост для очередного запроса: самый быстрый (по медиане задержки)
+    среди тех, чей breaker замкнут. Хосты без статистики идут в порядке
+    кандидатов, поэтому до первых измерений используется настроенный URL.
+
+    Каждый explore_every-й запрос уходит на хост с самыми старыми замерами,
+    чтобы статистика по запасным хостам не застывала и можно было вернуться
+    на выздоровевший быстрый хост.
+    """
+
+    def __init__(
+        self,
+        hosts: Iterable[str],
+        *,
+        failure_threshold: int = 3,
+        open_seconds: float = 30.0,
+        explore_every: int = 50,
+    ):
+        self.hosts = list(dict.fromkeys(hosts))
+        self.breakers = {
+            host: CircuitBreaker(failure_threshold=failure_threshold, open_seconds=open_seconds)
+            for host in self.hosts
+        }
+        self.stats = {host: HostStats() for host in self.hosts}
+        self._last_used = {host: 0.0 for host in self.hosts}
+        self.explore_every = explore_every
+        self._counter = itertools.count(1)
+
+    def _score(self, host: str) -> tuple[float, int]:
+        median = self.stats[host].percentile(0.5)
+        # Без замеров — как будто очень медленный, но порядок кандидатов сохраняется
+        return (median if median is not None else float("inf"), self.hosts.index(host))
+
+    def pick(self, exclude: Iterable[str] = ()) -> str:
+        excluded = set(exclude)
+        healthy = [h for h in self.hosts if h not in excluded and self.breakers[h].available()]
+        if not healthy:
+            # Все разомкнуты — идём туда, где breaker откроется раньше всех
+            candidates = [h for h in self.hosts if h not in excluded] or self.hosts
+            return min(candidates, key=lambda h: self.breakers[h].opened_until)
+
+        measured = [h for h in healthy if self.stats[h].latencies]
+        if self.explore_every and len(healthy) > 1 and next(self._counter) % self.explore_every == 0:
+            host = min(healthy, key=lambda h: self._last_used[h])
+        elif measured:
+            host = min(measured, key=self._score)
+        else:
+            host = healthy[0]
+        return host
+
+    def backup_for(self, host: str) -> Optional[str]:
+        """Самый быстрый здоровый хост, кроме host (для хеджирования); None — запасного нет."""
+        healthy = [h for h in self.hosts if h != host and self.breakers[h].available()]
+        if not healthy:
+            return None
+        measured = [h for h in healthy if self.stats[h].latencies]
+        return min(measured, key=self._score) if measured else healthy[0]
+
+    def begin(self, host: str) -> None:
+        self.breakers[host].begin()
+        self._last_used[host] = time.monotonic()
+
+    def record_success(self, host: str, latency: float) -> None:
+        self.breakers[host].record_success()
+        self.stats[host].record(True, latency)
+
+    def record_failure(self, host: str) -> None:
+        self.breakers[host].record_failure()
+        self.stats[host].record(False)
+
+    def release(self, host: str) -> None:
+        self.breakers[host].release()
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        result = []
+        for host in self.hosts:
+            breaker = self.breakers[host]
+            stats = self.stats[host]
+            breaker.available()  # обновить OPEN -> HALF_OPEN по времени
+            p50 = stats.percentile(0.5)
+            p95 = stats.percentile(0.95)
+            result.append(
+                {
+                    "url": host,
+                    "state": breaker.state,
+                    "open_for_seconds": round(max(0.0, breaker.opened_until - now), 1) if breaker.state == OPEN else 0,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.error_rate, 3),
+                    "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000) if p95 is not None else None,
+                }
+            )
+        return result
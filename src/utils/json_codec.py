@@ -0,0 +1,34 @@
+"""Разбор JSON ответов внешнего API: orjson (зависимость проекта), при его отсутствии — stdlib json."""
+import json
+import logging
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # окружение собрано без uv.lock — работаем на stdlib json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JsonLoads = Callable[[bytes], Any]
+
+
+def _stdlib_loads(body: bytes) -> Any:
+    return json.loads(body)
+
+
+def get_json_loads(name: str = "auto") -> tuple[str, JsonLoads]:
+    """
+    Декодер по имени из настроек: "auto" (orjson, если есть), "orjson" или "json".
+    Возвращает (фактическое имя, функция bytes -> объект). Ошибки разбора обоих
+    декодеров — подклассы ValueError.
+    """
+    name = (name or "auto").strip().lower()
+    if name not in ("auto", "orjson", "json"):
+        logger.warning("Unknown JSON decoder %r, using auto", name)
+        name = "auto"
+    if name in ("auto", "orjson") and orjson is not None:
+        return "orjson", orjson.loads
+    if name in ("auto", "orjson"):
+        logger.warning("orjson is not installed, falling back to stdlib json")
+    return "json", _stdlib_loads
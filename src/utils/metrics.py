@@ -0,0 +1,158 @@
+"""Метрики процесса: счётчики и гистограммы с метками, выдача в формате Prometheus."""
+import bisect
+import math
+from typing import Any, Iterable, Optional
+
+# Границы гистограмм задержек, секунды: от быстрых ответов API до таймаута фоновых задач
+DEFAULT_BUCKETS: tuple[float, ...] = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Iterable[tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами; квантили — оценка по верхней границе корзины."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя корзина — +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.buckets[i] if i < len(self.buckets) else math.inf
+        return math.inf
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик в памяти процесса.
+
+    Код пишет через inc/observe и не знает, куда метрики уходят: клиент API держит
+    ссылку на реестр, и её можно подменить (NullMetricsRegistry в тестах или
+    адаптер к другой системе мониторинга с теми же двумя методами).
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Сумма счётчика по всем сериям, у которых совпадают переданные метки."""
+        wanted = {(k, str(v)) for k, v in labels.items()}
+        return sum(
+            value for key, value in self._counters.get(name, {}).items() if wanted.issubset(key)
+        )
+
+    def histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+        return self._histograms.get(name, {}).get(_label_key(labels))
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Счётчики и сводка гистограмм (count, sum, p50, p95) — для /dpdiag.
+        Серии — по строке меток вида "endpoint=GET /visits,status=200" ("" — без меток).
+        """
+        def series_name(key: LabelKey) -> str:
+            return ",".join(f"{name}={value}" for name, value in key)
+
+        return {
+            "counters": {
+                name: {series_name(key): value for key, value in series.items()}
+                for name, series in self._counters.items()
+            },
+            "histograms": {
+                name: {
+                    series_name(key): {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                    }
+                    for key, histogram in series.items()
+                }
+                for name, series in self._histograms.items()
+            },
+        }
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus (text/plain; version=0.0.4)."""
+        lines: list[str] = []
+        for name in sorted(self._counters):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(self._counters[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+        for name in sorted(self._histograms):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(self._histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f"{name}_bucket{_format_labels(key, [('le', _format_number(bound))])} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_number(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._histograms.clear()
+
+
+class NullMetricsRegistry(MetricsRegistry):
+    """Ничего не записывает — если метрики не нужны."""
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        pass
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,115 @@
+"""Асинхронный token bucket с приоритетной очередью ожидающих."""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Чем меньше число, тем раньше запрос получит токен
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+_request_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "request_priority",
+    default=PRIORITY_BATCH,
+)
+
+
+def current_priority() -> int:
+    return _request_priority.get()
+
+
+@contextmanager
+def interactive_priority() -> Iterator[None]:
+    """
+    Помечает запросы внутри блока как интерактивные (пациент ждёт ответа в чате).
+    Контекст наследуется задачами, созданными внутри блока (asyncio копирует contextvars).
+    """
+    token = _request_priority.set(PRIORITY_INTERACTIVE)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket, безопасный для конкурентных корутин.
+
+    Ёмкость ведра = burst, пополнение подобрано так, чтобы в любом скользящем
+    окне 60 секунд уходило не больше rate_per_minute запросов:
+    burst + (rate_per_minute - burst) = rate_per_minute.
+
+    Ожидающие обслуживаются по приоритету, внутри приоритета — по очереди прихода.
+    """
+
+    def __init__(self, rate_per_minute: int, burst: int = 1):
+        rate_per_minute = max(1, rate_per_minute)
+        self.rate_per_minute = rate_per_minute
+        self.capacity = max(1, min(burst, rate_per_minute))
+        self._refill_per_second = max(rate_per_minute - self.capacity, 1) / 60.0
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Не выдавать токены ближайшие seconds секунд (сервер ответил 429 с Retry-After).
+        Ведро уходит в минус; ожидающие сами досчитают паузу при следующем пересчёте.
+        """
+        if seconds <= 0:
+            return
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self._refill_per_second
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self._refill_per_second)
+            self._updated_at = now
+
+    async def acquire(self, priority: int | None = None) -> float:
+        """Забирает один токен, при необходимости ждёт. Возвращает время ожидания в секундах."""
+        if priority is None:
+            priority = current_priority()
+        entry = (priority, next(self._seq))
+        started = time.monotonic()
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    is_head = self._waiters[0] == entry
+                    if is_head and self._tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        break
+                    # Таймер держит только голова очереди, остальные ждут notify
+                    timeout = (1 - self._tokens) / self._refill_per_second if is_head else None
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+            finally:
+                # Голова очереди сменилась — пусть новая пересчитает своё ожидание
+                self._cond.notify_all()
+        return time.monotonic() - started
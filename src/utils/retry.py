@@ -0,0 +1,86 @@
+"""Политика повторов запросов к внешнему API: backoff с jitter, Retry-After, бюджет повторов."""
+import random
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# Числовые сегменты пути (/visits/123) схлопываются, чтобы бюджет был на «вид» запроса
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def call_path(method: str, endpoint: str) -> str:
+    """Ключ бюджета повторов: метод + путь без id, например 'GET /visits/{id}'."""
+    path = endpoint.split("?", 1)[0]
+    return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: поддерживаются оба формата из RFC 9110 (секунды и HTTP-дата)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Сколько раз и с какой паузой повторять запрос.
+
+    Пауза — «full jitter»: случайное число от 0 до base_delay * 2^(attempt-1),
+    но не больше max_delay. Так одновременно упавшие запросы не возвращаются
+    к API одной волной. Если сервер прислал Retry-After, ждём его, а не backoff.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    # Retry-After длиннее этого — не ждём, а сразу отдаём ошибку вызывающему
+    max_retry_after: float = 60.0
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(0, attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class RetryBudget:
+    """
+    Бюджет повторов для одного вида запросов.
+
+    Каждый первый запрос добавляет ratio токена (до max_tokens), каждый повтор
+    тратит один. Пока API здоров, бюджет полон; когда падает большинство
+    запросов, повторы быстро кончаются и запросы падают сразу, не умножая
+    нагрузку на и так перегруженный API.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self.exhausted = 0
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def record_request(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens < 1:
+            self.exhausted += 1
+            return False
+        self._tokens -= 1
+        return True
@@ -0,0 +1,51 @@
+"""Небольшие JSON-файлы состояния (кэш токена, снапшоты справочников) между перезапусками."""
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def read_json_state(path: str) -> Optional[dict[str, Any]]:
+    """Читает JSON-объект из файла. Нет файла или он битый — None (это не ошибка)."""
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable state file %s: %s", path, e)
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def write_json_state(path: str, data: dict[str, Any]) -> bool:
+    """
+    Атомарно записывает JSON (через временный файл + rename), права 0600 —
+    в файлах может лежать токен API.
+    """
+    if not path:
+        return False
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    except OSError as e:
+        logger.warning("Failed to write state file %s: %s", path, e)
+        return False
+    return True
@@ -0,0 +1,39 @@
+"""Компактная запись визита, которой пользуются планировщик, отчёт и хендлеры."""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+
+@dataclass(frozen=True, slots=True)
+class Visit:
+    """
+    Нормализованный визит Dentist plus.
+
+    Всё разобрано один раз при получении из API (или чтении из зеркала):
+    start — aware datetime в UTC, id — int. Сырой payload хранится только
+    если его явно попросили (keep_raw), на больших окнах он заметно ест память.
+    """
+
+    id: int
+    start: datetime
+    client_id: Optional[int] = None
+    client_name: str = ""
+    client_phone: str = ""
+    staff_id: Optional[int] = None
+    staff_name: str = ""
+    branch_id: Optional[int] = None
+    is_cancelled: bool = False
+    raw: Optional[dict[str, Any]] = field(default=None, repr=False, compare=False)
+
+    @property
+    def doctor_name(self) -> str:
+        """Имя доктора для сообщений пациенту и админу."""
+        name = self.staff_name.strip()
+        if not name or name.lower() == "мастер":
+            return "Доктор"
+        return name
+
+    @property
+    def service_name(self) -> str:
+        # Услуги визита Dentist plus в /visits не отдаёт
+        return "Услуга"
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+
+from src.database.database import DatabaseManager, db_manager
+from src.database.crud import PatientDirectoryCRUD
+from src.services.patient_directory import PatientDirectoryService, phone_keys
+from src.services.yclients import YClientsAPIError, yclients_client
+
+
+async def test_phone_lookup_is_local_with_api_fallback() -> None:
+    await db_manager.init_db()
+    directory = PatientDirectoryService()
+    directory.enabled = True
+    directory.negative_ttl = 60
+
+    assert phone_keys("8 (999) 123-45-67") == ("+79991234567", "9991234567")
+
+    api_patients = [
+        {"id": 501, "name": "Иванова Мария", "email": "", "phone": "8 (999) 123-45-67"},
+        {"id": 502, "name": "Петров Олег", "email": "o@example.com", "phone": "+7 916 000-11-22"},
+    ]
+    searches: list[str] = []
+    api_down = False
+
+    async def fake_get_patients():
+        return list(api_patients)
+
+    async def fake_find_client(phone=None, email=None, *, raise_errors=False):
+        searches.append(phone)
+        if api_down:
+            raise YClientsAPIError("down")
+        if phone == "+79035550000":
+            return {"id": 503, "name": "Новый Пациент", "email": "", "phone": "+7 903 555-00-00"}
+        return None
+
+    original = (yclients_client.get_patients, yclients_client.find_client)
+    yclients_client.get_patients = fake_get_patients  # type: ignore[method-assign]
+    yclients_client.find_client = fake_find_client  # type: ignore[method-assign]
+    try:
+        first = await directory.sync()
+        assert first == {"fetched": 2, "upserted": 2, "removed": 0}
+        assert (await directory.sync())["upserted"] == 0
+
+        # Телефон из Telegram в E.164 находит номер, записанный в клинике через 8
+        found = await directory.find_by_phone("+79991234567")
+        assert found and found["id"] == 501
+        assert (await directory.find_by_phone("+79160001122"))["id"] == 502
+        assert searches == []
+
+        # Пациента завели после синхронизации — нашли в API и запомнили локально
+        assert (await directory.find_by_phone("+79035550000"))["id"] == 503
+        assert (await directory.find_by_phone("+79035550000"))["id"] == 503
+        assert searches == ["+79035550000"]
+
+        # Неизвестный номер ищется в API один раз, дальше — отрицательный кэш
+        searches.clear()
+        assert await directory.find_by_phone("+79990000000") is None
+        assert await directory.find_by_phone("+79990000000") is None
+        assert searches == ["+79990000000"]
+
+        # Недоступный API не делает номер «неизвестным»
+        api_down = True
+        assert await directory.find_by_phone("+79991112233") is None
+        api_down = False
+        assert await directory.find_by_phone("+79991112233") is None
+        assert searches.count("+79991112233") == 2
+
+        # Пациент пропал из выгрузки — удаляется; синхронизация сбрасывает отрицательный кэш
+        del api_patients[1]
+        api_patients.append({"id": 503, "name": "Новый Пациент", "email": "", "phone": "+7 903 555-00-00"})
+        assert (await directory.sync())["removed"] == 1
+        assert directory.status()["unknown_numbers"] == 0
+    finally:
+        yclients_client.get_patients, yclients_client.find_client = original  # type: ignore[method-assign]
+
+    async for session in db_manager.get_session():
+        assert await PatientDirectoryCRUD.count(session) == 2
+
+
+def _use_temporary_database(directory: str) -> None:
+    """
+    Синхронизация удаляет из patients всё, чего нет в выгрузке, — тест работает на
+    своей SQLite-БД, а не на DATABASE_URL из окружения. Сервис берёт сессии из
+    общего db_manager — подменяем его движок.
+    """
+    isolated = DatabaseManager(f"sqlite+aiosqlite:///{os.path.join(directory, 'patient_directory.db')}")
+    db_manager.engine, db_manager.async_session_maker = isolated.engine, isolated.async_session_maker
+
+
+async def main() -> None:
+    tmp = tempfile.TemporaryDirectory()
+    _use_temporary_database(tmp.name)
+    await test_phone_lookup_is_local_with_api_fallback()
+    await db_manager.close()
+    tmp.cleanup()
+    print("PASS: patients directory tests")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,361 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, func, insert, select, update
+
+from src.database.database import DatabaseManager, db_manager
+from src.database.crud import NotificationLogCRUD, ReminderCRUD, RescheduleRequestCRUD, UserCRUD
+from src.database.models import NotificationLog, Reminder, RescheduleRequest, User
+from src.services import scheduler as scheduler_module
+from src.services.notification_log import NotificationLogWriter
+from src.services.scheduler import ReminderScheduler
+from src.services.yclients import yclients_client
+from src.utils.visit import Visit
+
+_CLIENT_IDS = (7001, 7002, 7003)
+
+
+class _StatementCounter:
+    """Считает SQL-запросы к БД, в тексте которых есть заданный фрагмент."""
+
+    def __init__(self, fragment: str):
+        self.fragment = fragment
+        self.count = 0
+
+        self.statements: list[tuple[str, tuple]] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.fragment in statement:
+            self.count += 1
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(db_manager.engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db_manager.engine.sync_engine, "before_cursor_execute", self)
+        return False
+
+
+async def _seed_users() -> None:
+    await db_manager.init_db()
+    async for session in db_manager.get_session():
+        await session.execute(delete(User).where(User.yclients_client_id.in_(_CLIENT_IDS)))
+        await session.execute(delete(Reminder).where(Reminder.record_id >= 80000))
+        await session.commit()
+        for i, client_id in enumerate(_CLIENT_IDS[:2]):
+            await UserCRUD.create(
+                session, chat_id=880000 + i, phone=f"+7999880000{i}", yclients_client_id=client_id
+            )
+
+
+async def test_users_resolved_in_bulk() -> None:
+    await _seed_users()
+    async for session in db_manager.get_session():
+        with _StatementCounter("FROM users") as counter:
+            users = await UserCRUD.get_many_by_yclients_client_ids(session, [7001, 7003, 7002, 7001])
+        assert counter.count == 1
+        assert {cid: user.chat_id for cid, user in users.items()} == {7001: 880000, 7002: 880001}
+
+    # 250 визитов на завтра: пользователи ищутся пачками, а не запросом на визит
+    tomorrow = datetime.now(timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    visits = [
+        Visit(
+            id=80000 + i,
+            start=tomorrow,
+            client_id=_CLIENT_IDS[i % 3] if i < 3 else 90000 + i,
+            client_name="Пациент",
+            staff_name="Доктор",
+            branch_id=yclients_client.branch_id,
+        )
+        for i in range(250)
+    ]
+
+    async def fake_iter_records_for_day(day, *, branch_id=None):
+        for visit in visits:
+            yield visit
+
+    async def fake_send(bot, reminder):
+        return True
+
+    original = (yclients_client.iter_records_for_day, scheduler_module.send_reminder_notification)
+    yclients_client.iter_records_for_day = fake_iter_records_for_day  # type: ignore[method-assign]
+    scheduler_module.send_reminder_notification = fake_send
+    try:
+        with _StatementCounter("FROM users") as users_queries, _StatementCounter("reminders") as reminder_queries:
+            stats = await ReminderScheduler(bot=None).check_and_send_reminders()  # type: ignore[arg-type]
+    finally:
+        yclients_client.iter_records_for_day, scheduler_module.send_reminder_notification = original
+    assert stats["records_count"] == 250
+    assert stats["sent_count"] == 2
+    assert stats["skip_no_user"] == 248
+    assert users_queries.count == 2
+    # Напоминания двух зарегистрированных — один INSERT ... ON CONFLICT, без SELECT на визит
+    assert reminder_queries.count == 1
+
+
+async def test_reminder_upsert_returns_pending() -> None:
+    await _seed_users()
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+
+    def rows(staff: str) -> list[dict]:
+        return [
+            {
+                "user_chat_id": 880000,
+                "record_id": 80000 + i,
+                "appointment_datetime": start + timedelta(hours=i),
+                "service_name": "Осмотр",
+                "staff_name": staff,
+            }
+            for i in range(3)
+        ]
+
+    async for session in db_manager.get_session():
+        with _StatementCounter("INSERT INTO reminders") as counter:
+            created = await ReminderCRUD.upsert_many(session, rows("Петрова Анна"))
+        assert counter.count == 1
+        assert sorted(r.record_id for r in created) == [80000, 80001, 80002]
+        assert not any(r.is_sent for r in created)
+
+        await ReminderCRUD.mark_as_sent(session, 80001)
+        # Отправленное не возвращается и не перезаписывается, остальные получают свежие данные
+        pending = await ReminderCRUD.upsert_many(session, rows("Сидоров Пётр"))
+        assert sorted(r.record_id for r in pending) == [80000, 80002]
+        assert {r.staff_name for r in pending} == {"Сидоров Пётр"}
+        sent = await ReminderCRUD.get_by_record_id(session, 80001)
+        assert sent.is_sent and sent.staff_name == "Петрова Анна"
+
+
+async def test_notification_log_written_in_batches() -> None:
+    await db_manager.init_db()
+    async for session in db_manager.get_session():
+        await session.execute(delete(NotificationLog).where(NotificationLog.record_id >= 80000))
+        await session.commit()
+
+    async def stored() -> int:
+        count = 0
+        async for session in db_manager.get_session():
+            result = await session.execute(select(func.count()).where(NotificationLog.record_id >= 80000))
+            count = int(result.scalar_one())
+        return count
+
+    writer = NotificationLogWriter()
+    writer.batch_size, writer.flush_interval, writer.max_buffer, writer.sync = 3, 0.05, 10, False
+    with _StatementCounter("INSERT INTO notification_logs") as inserts:
+        await writer.log(chat_id=1, message_type="reminder", record_id=80000)
+        await writer.log(chat_id=1, message_type="reminder", record_id=80001, is_successful=False, error_message="x")
+        assert await stored() == 0
+        # Набралась пачка — пишется одним INSERT в фоне
+        await writer.log(chat_id=1, message_type="confirmation", record_id=80000)
+        await asyncio.sleep(0.01)
+        assert await stored() == 3
+        # Одиночная запись уходит по таймеру
+        await writer.log(chat_id=1, message_type="cancellation", record_id=80002)
+        await asyncio.sleep(0.1)
+        assert await stored() == 4
+        # Остаток дописывается при остановке
+        await writer.log(chat_id=1, message_type="reminder", record_id=80003)
+        await writer.close()
+        assert await stored() == 5
+    assert inserts.count == 3
+    assert writer.stats == {"logged": 5, "written": 5, "flushes": 3, "dropped": 0}
+
+    async for session in db_manager.get_session():
+        failed = await NotificationLogCRUD.get_latest_by_record_and_type(session, 80001, "reminder")
+        assert failed is not None and not failed.is_successful and failed.error_message == "x"
+
+    # Синхронный режим — запись сразу
+    writer.sync = True
+    await writer.log(chat_id=1, message_type="reminder", record_id=80004)
+    assert await stored() == 6
+
+
+async def test_notification_log_close_waits_for_running_flush() -> None:
+    await db_manager.init_db()
+    async for session in db_manager.get_session():
+        await session.execute(delete(NotificationLog).where(NotificationLog.record_id >= 80000))
+        await session.commit()
+
+    original = NotificationLogCRUD.insert_many
+    started = asyncio.Event()
+
+    async def slow_insert_many(session, rows):
+        started.set()
+        await asyncio.sleep(0.05)
+        return await original(session, rows)
+
+    writer = NotificationLogWriter()
+    writer.batch_size, writer.flush_interval, writer.max_buffer, writer.sync = 2, 10, 10, False
+    NotificationLogCRUD.insert_many = slow_insert_many  # type: ignore[method-assign]
+    try:
+        await writer.log(chat_id=1, message_type="reminder", record_id=80000)
+        await writer.log(chat_id=1, message_type="reminder", record_id=80001)
+        # Пачка уже пишется в фоне, строки вынуты из очереди — остановка не должна их потерять
+        await started.wait()
+        await writer.close()
+    finally:
+        NotificationLogCRUD.insert_many = original  # type: ignore[method-assign]
+    assert writer.stats["written"] == 2 and not writer._buffer
+
+    async for session in db_manager.get_session():
+        result = await session.execute(select(func.count()).where(NotificationLog.record_id >= 80000))
+        assert result.scalar_one() == 2
+
+
+async def test_report_state_loaded_in_one_query() -> None:
+    await _seed_users()
+    async for session in db_manager.get_session():
+        await session.execute(delete(RescheduleRequest).where(RescheduleRequest.record_id >= 80000))
+        await session.execute(delete(NotificationLog).where(NotificationLog.record_id >= 80000))
+        start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+        await ReminderCRUD.upsert_many(
+            session,
+            [
+                {
+                    "user_chat_id": 880000,
+                    "record_id": 80000 + i,
+                    "appointment_datetime": start,
+                    "service_name": "Осмотр",
+                    "staff_name": "Петрова Анна",
+                }
+                for i in range(3)
+            ],
+        )
+        await ReminderCRUD.mark_as_sent(session, 80000)
+        await ReminderCRUD.mark_as_confirmed(session, 80000)
+        # У 80001 — два запроса на перенос, актуален последний
+        for status in ("processed", "pending"):
+            await RescheduleRequestCRUD.create(
+                session, 80001, 880000, start, "+79990000000", "Пациент", "Осмотр"
+            )
+            await session.execute(
+                update(RescheduleRequest)
+                .where(RescheduleRequest.id == select(func.max(RescheduleRequest.id)).scalar_subquery())
+                .values(status=status)
+            )
+            await session.commit()
+        # У 80002 — сначала успешная отправка, потом ошибка; и подтверждение, которое не учитывается
+        writer = NotificationLogWriter()
+        writer.sync = True
+        await writer.log(chat_id=880000, message_type="reminder", record_id=80002)
+        await writer.log(chat_id=880000, message_type="reminder", record_id=80002, is_successful=False, error_message="blocked")
+        await writer.log(chat_id=880000, message_type="confirmation", record_id=80002)
+
+    async for session in db_manager.get_session():
+        with _StatementCounter("SELECT") as selects:
+            state = await ReminderCRUD.get_report_state(session, [80000, 80001, 80002, 80003])
+        assert selects.count == 1
+        assert sorted(state) == [80000, 80001, 80002]
+        assert state[80000].is_sent and state[80000].is_confirmed
+        assert state[80000].reschedule_status is None and state[80000].log_is_successful is None
+        assert state[80001].reschedule_status == "pending"
+        assert state[80002].log_is_successful is False
+        assert state[80002].log_error_message == "blocked"
+
+
+async def _query_plan(statement: str, parameters: tuple) -> str:
+    async with db_manager.engine.connect() as conn:
+        result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        plan = "\n".join(str(row[-1]) for row in result)
+    return plan
+
+
+async def test_hot_queries_use_indexes() -> None:
+    await _seed_users()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    async for session in db_manager.get_session():
+        await session.execute(delete(User).where(User.chat_id.between(881000, 881999)))
+        await session.execute(delete(Reminder).where(Reminder.record_id >= 80000))
+        await session.execute(delete(NotificationLog).where(NotificationLog.record_id >= 80000))
+        await session.execute(delete(RescheduleRequest).where(RescheduleRequest.record_id >= 80000))
+        # Как в жизни: зарегистрированных меньшинство, почти все напоминания уже отправлены
+        await session.execute(
+            insert(User),
+            [
+                {"chat_id": 881000 + i, "phone": f"+7999881{i:04d}", "is_registered": i % 20 == 0}
+                for i in range(500)
+            ],
+        )
+        await session.execute(
+            insert(Reminder),
+            [
+                {
+                    "user_chat_id": 880000,
+                    "record_id": 80000 + i,
+                    "appointment_datetime": now - timedelta(hours=i),
+                    "service_name": "Осмотр",
+                    "staff_name": "Петрова Анна",
+                    "is_sent": i % 50 != 0,
+                }
+                for i in range(500)
+            ],
+        )
+        await session.execute(
+            insert(NotificationLog),
+            [
+                {"chat_id": 880000, "record_id": 80000 + i % 100, "message_type": message_type, "sent_at": now}
+                for i in range(300)
+                for message_type in ("reminder", "confirmation")
+            ],
+        )
+        await session.commit()
+        for i in range(3):
+            await RescheduleRequestCRUD.create(session, 80000 + i, 880000, now, "+79990000000", "Пациент", "Осмотр")
+    async with db_manager.engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+
+    async for session in db_manager.get_session():
+        with _StatementCounter("FROM") as queries:
+            await ReminderCRUD.get_unsent_reminders(session, now)
+            await UserCRUD.list_registered(session)
+            await NotificationLogCRUD.get_latest_by_record_and_type(session, 80001, "reminder")
+            await RescheduleRequestCRUD.get_latest_by_record_id(session, 80001)
+    expected = [
+        "ix_reminders_unsent_appointment",
+        "ix_users_registered_id",
+        "ix_notification_logs_record_type_sent",
+        "ix_reschedule_requests_record_created",
+    ]
+    assert len(queries.statements) == len(expected)
+    for (statement, parameters), index_name in zip(queries.statements, expected):
+        plan = await _query_plan(statement, parameters)
+        assert index_name in plan, f"{index_name} not used:\n{statement}\n{plan}"
+
+    async for session in db_manager.get_session():
+        await session.execute(delete(User).where(User.chat_id.between(881000, 881999)))
+        await session.execute(delete(Reminder).where(Reminder.record_id >= 80000))
+        await session.execute(delete(NotificationLog).where(NotificationLog.record_id >= 80000))
+        await session.execute(delete(RescheduleRequest).where(RescheduleRequest.record_id >= 80000))
+        await session.commit()
+
+
+def _use_temporary_database(directory: str) -> None:
+    """
+    Тесты чистят и засевают таблицы, поэтому работают на своей SQLite-БД, а не на
+    DATABASE_URL из окружения. Сервисы (планировщик, журнал уведомлений) берут
+    сессии из общего db_manager — подменяем его движок.
+    """
+    isolated = DatabaseManager(f"sqlite+aiosqlite:///{os.path.join(directory, 'reminder_queries.db')}")
+    db_manager.engine, db_manager.async_session_maker = isolated.engine, isolated.async_session_maker
+
+
+async def main() -> None:
+    tmp = tempfile.TemporaryDirectory()
+    _use_temporary_database(tmp.name)
+    await test_users_resolved_in_bulk()
+    await test_reminder_upsert_returns_pending()
+    await test_notification_log_written_in_batches()
+    await test_notification_log_close_waits_for_running_flush()
+    await test_report_state_loaded_in_one_query()
+    await test_hot_queries_use_indexes()
+    await db_manager.close()
+    tmp.cleanup()
+    print("PASS: reminder query tests")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from src.database.database import DatabaseManager, db_manager
+from src.database.crud import VisitMirrorCRUD
+from src.services.visit_mirror import VisitMirrorService
+from src.services.yclients import yclients_client
+from src.utils.visit import Visit
+
+
+def _visit(visit_id: int, start: datetime, client_id: int, doctor: str = "Петрова Анна") -> Visit:
+    return Visit(
+        id=visit_id,
+        start=start.astimezone(timezone.utc),
+        client_id=client_id,
+        client_name=f"Пациент {client_id}",
+        client_phone="+79990000000",
+        staff_id=3,
+        staff_name=doctor,
+        branch_id=2,
+    )
+
+
+async def test_sync_upserts_only_changes() -> None:
+    await db_manager.init_db()
+    mirror = VisitMirrorService()
+    mirror.enabled = True
+    mirror.days_ahead = 180
+
+    tomorrow = datetime.now(timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    api_records = [
+        _visit(9001, tomorrow, 10),
+        _visit(9002, tomorrow + timedelta(hours=1), 11),
+        _visit(9003, tomorrow + timedelta(days=2), 10),
+    ]
+
+    requested: list[dict] = []
+
+    async def fake_get_records(start, end, client_id=None, *, raise_errors=False, cached=True):
+        requested.append({"start": start, "end": end, "cached": cached})
+        return list(api_records)
+
+    original = yclients_client.get_records
+    yclients_client.get_records = fake_get_records  # type: ignore[method-assign]
+    try:
+        first = await mirror.sync()
+        assert first["fetched"] == 3
+        assert first["upserted"] == 3
+
+        # Второй прогон без изменений ничего не пишет
+        second = await mirror.sync()
+        assert second["upserted"] == 0
+        assert second["unchanged"] == 3
+
+        # Поменяли доктора у одного визита, другой пропал из API
+        api_records[0] = _visit(9001, tomorrow, 10, doctor="Сидоров Пётр")
+        del api_records[1]
+        third = await mirror.sync()
+        assert third["upserted"] == 1
+        assert third["removed"] == 1
+    finally:
+        yclients_client.get_records = original  # type: ignore[method-assign]
+
+    day_start = tomorrow.replace(hour=0)
+    assert mirror.can_serve(day_start, day_start + timedelta(days=1))
+    day = await mirror.get_records(day_start, day_start + timedelta(days=1))
+    assert [r.id for r in day] == [9001]
+    assert day[0].staff_name == "Сидоров Пётр"
+    assert day[0].branch_id == 2
+    assert day[0].start == tomorrow
+
+    patient = await mirror.get_records(day_start, day_start + timedelta(days=30), client_id=10)
+    assert [r.id for r in patient] == [9001, 9003]
+
+    # Синхронизация читает API мимо кэша окон
+    assert requested and not any(r["cached"] for r in requested)
+
+    # «Мои записи» спрашивают «сейчас .. +180 дней» — в любое время дня это окно зеркала
+    tz = mirror._tz()
+    late_evening = datetime.now(tz).replace(hour=23, minute=59)
+    assert mirror.can_serve(late_evening, late_evening + timedelta(days=180))
+
+    # За пределами окна зеркало не отвечает — вызывающий пойдёт в API
+    assert not mirror.can_serve(day_start, day_start + timedelta(days=400))
+
+    async for session in db_manager.get_session():
+        assert await VisitMirrorCRUD.count(session) == 2
+
+
+def _use_temporary_database(directory: str) -> None:
+    """
+    Синхронизация чистит в visits всё окно и прошлые визиты — тест работает на своей
+    SQLite-БД, а не на DATABASE_URL из окружения. Сервис берёт сессии из общего
+    db_manager — подменяем его движок.
+    """
+    isolated = DatabaseManager(f"sqlite+aiosqlite:///{os.path.join(directory, 'visit_mirror.db')}")
+    db_manager.engine, db_manager.async_session_maker = isolated.engine, isolated.async_session_maker
+
+
+async def main() -> None:
+    tmp = tempfile.TemporaryDirectory()
+    _use_temporary_database(tmp.name)
+    await test_sync_upserts_only_changes()
+    await db_manager.close()
+    tmp.cleanup()
+    print("PASS: visits mirror tests")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
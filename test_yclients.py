@@ -1,7 +1,34 @@
 import asyncio
-from datetime import datetime, timedelta
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
 
-from src.services.yclients import YClientsClient
+import aiohttp
+
+from fake_dentist_api import start_fake_api
+from src.config import settings
+from src.services.metrics_server import start_metrics_server
+from src.services.yclients import (
+    YClientsClient,
+    YClientsRateLimitError,
+    _page_items,
+    _page_last,
+    _parse_visit_start,
+    _parse_visit_starts,
+)
+from src.utils.async_cache import AsyncTTLCache
+from src.utils.host_health import HostSelector
+from src.utils.json_codec import get_json_loads
+from src.utils.metrics import MetricsRegistry
+from src.utils.rate_limiter import (
+    PRIORITY_BATCH,
+    TokenBucketRateLimiter,
+    current_priority,
+    interactive_priority,
+)
+from src.utils.retry import RetryBudget, RetryPolicy, call_path, parse_retry_after
 
 
 async def test_client_init() -> None:
@@ -12,11 +39,247 @@ async def test_client_init() -> None:
 
 
 async def test_rate_limit_tracking() -> None:
-    client = YClientsClient()
-    client._max_requests_per_minute = 5
+    limiter = TokenBucketRateLimiter(rate_per_minute=60, burst=5)
     for _ in range(5):
-        await client._check_rate_limit()
-    assert len(client._request_times) == 5
+        assert await limiter.acquire() < 0.05
+    assert limiter.tokens < 1
+
+
+async def test_rate_limit_interactive_lane_first() -> None:
+    # ~10 токенов в секунду, чтобы тест шёл быстро
+    limiter = TokenBucketRateLimiter(rate_per_minute=601, burst=1)
+    await limiter.acquire()
+    order: list[str] = []
+
+    async def take(name: str, priority: int) -> None:
+        await limiter.acquire(priority)
+        order.append(name)
+
+    batch = [asyncio.create_task(take(f"batch{i}", PRIORITY_BATCH)) for i in range(3)]
+    await asyncio.sleep(0)
+    with interactive_priority():
+        # Приоритет из контекста наследуется созданной задачей
+        patient = asyncio.create_task(take("patient", current_priority()))
+    await asyncio.gather(patient, *batch)
+    assert order[0] == "patient"
+    assert order[1:] == ["batch0", "batch1", "batch2"]
+    assert limiter.waiting == 0
+
+
+class _FakeResponse:
+    def __init__(self, status: int, body: dict, headers: dict | None = None):
+        self.status = status
+        self._body = body
+        self.headers = headers or {}
+
+    async def json(self):
+        return self._body
+
+    async def read(self):
+        return json.dumps(self._body).encode()
+
+    async def text(self):
+        return str(self._body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    def __init__(self, responses: list):
+        self.responses = responses
+        self.calls = 0
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_retry_policy_backoff_and_retry_after() -> None:
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=2.0)
+    for attempt in range(1, 6):
+        assert 0 <= policy.backoff(attempt) <= min(2.0, 0.5 * 2 ** (attempt - 1))
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert call_path("get", "/visits/123") == "GET /visits/{id}"
+
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_spend()
+
+
+async def test_make_request_retries_429_then_raises_rate_limit_error() -> None:
+    client = YClientsClient()
+    client._token = "t"
+    client._token_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    client._token_loaded = True
+    client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=6000, burst=10)
+
+    session = _FakeSession(
+        [
+            _FakeResponse(429, {"error": "slow down"}, {"Retry-After": "0.05"}),
+            _FakeResponse(503, {"error": "busy"}),
+            _FakeResponse(200, {"ok": True}),
+        ]
+    )
+    client._session = session  # type: ignore[assignment]
+    started = asyncio.get_running_loop().time()
+    assert await client._make_request("GET", "/visits") == {"ok": True}
+    assert session.calls == 3
+    # Retry-After соблюдён через паузу лимитера
+    assert asyncio.get_running_loop().time() - started >= 0.04
+
+    session.responses = [_FakeResponse(429, {}, {"Retry-After": "0"}) for _ in range(3)]
+    try:
+        await client._make_request("GET", "/visits")
+    except YClientsRateLimitError as e:
+        assert e.retry_after == 0.0
+    else:
+        raise AssertionError("429 must surface as YClientsRateLimitError")
+
+    # Слишком длинный Retry-After — не ждём, ошибка сразу
+    client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0, max_retry_after=0.05)
+    session.calls = 0
+    session.responses = [_FakeResponse(429, {}, {"Retry-After": "3600"})]
+    try:
+        await client._make_request("GET", "/visits")
+    except YClientsRateLimitError as e:
+        assert e.retry_after == 3600.0
+    else:
+        raise AssertionError("long Retry-After must fail fast")
+    assert session.calls == 1
+
+    # 5xx у POST не повторяется
+    session.calls = 0
+    session.responses = [_FakeResponse(500, {})]
+    try:
+        await client._make_request("POST", "/visits/1/cancel")
+    except YClientsRateLimitError:
+        raise AssertionError("500 is not a rate limit error")
+    except Exception:
+        pass
+    assert session.calls == 1
+    client._session = None
+    await client.close()
+
+
+async def test_host_selector_breaker_and_latency() -> None:
+    selector = HostSelector(["https://a", "https://b"], failure_threshold=2, open_seconds=0.05, explore_every=0)
+    # Без замеров — первый кандидат (настроенный URL)
+    assert selector.pick() == "https://a"
+    selector.record_success("https://a", 0.5)
+    selector.record_success("https://b", 0.1)
+    assert selector.pick() == "https://b"
+
+    # b падает дважды подряд — breaker размыкается, запросы идут на a
+    selector.record_failure("https://b")
+    selector.record_failure("https://b")
+    assert selector.pick() == "https://a"
+    assert selector.snapshot()[1]["state"] == "open"
+
+    # После паузы на b пускается ровно одна проба; успех возвращает быстрый хост
+    await asyncio.sleep(0.06)
+    assert selector.pick() == "https://b"
+    selector.begin("https://b")
+    assert selector.pick() == "https://a"
+    selector.record_success("https://b", 0.1)
+    assert selector.pick() == "https://b"
+    assert selector.snapshot()[1]["state"] == "closed"
+
+
+async def test_make_request_fails_over_to_healthy_host() -> None:
+    client = YClientsClient()
+    client._token = "t"
+    client._token_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    client._token_loaded = True
+    client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=6000, burst=10)
+    hosts = client._hosts.hosts
+    assert len(hosts) >= 2
+    requested: list[str] = []
+
+    class Session(_FakeSession):
+        def request(self, method, url, **kwargs):
+            requested.append(url)
+            if url.startswith(hosts[0]):
+                raise aiohttp.ClientConnectionError("down")
+            return _FakeResponse(200, {"ok": True})
+
+    client._session = Session([])  # type: ignore[assignment]
+    assert await client._make_request("GET", "/visits") == {"ok": True}
+    assert requested[0].startswith(hosts[0]) and requested[1].startswith(hosts[1])
+    # Следующий запрос сразу идёт на хост с замерами, а не на упавший
+    requested.clear()
+    await client._make_request("GET", "/visits")
+    assert requested == [f"{hosts[1]}/visits"]
+    diag_hosts = client._hosts.snapshot()
+    assert diag_hosts[0]["errors"] == 1 and diag_hosts[1]["p50_ms"] is not None
+    client._session = None
+    await client.close()
+
+
+async def test_interactive_get_is_hedged_to_second_host() -> None:
+    client = YClientsClient()
+    client._token = "t"
+    client._token_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    client._token_loaded = True
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=6000, burst=10)
+    client.hedging_enabled = True
+    client.hedge_default_delay = 0.05
+    hosts = client._hosts.hosts
+    requested: list[str] = []
+
+    class _Stalled(_FakeResponse):
+        async def __aenter__(self):
+            await asyncio.sleep(10)
+            return self
+
+    class Session(_FakeSession):
+        def request(self, method, url, **kwargs):
+            requested.append(url)
+            if url.startswith(hosts[0]):
+                return _Stalled(200, {"host": 0})
+            return _FakeResponse(200, {"host": 1})
+
+    client._session = Session([])  # type: ignore[assignment]
+    # Фоновый запрос не хеджируется
+    batch = asyncio.create_task(client._make_request("GET", "/visits/1"))
+    await asyncio.sleep(0.1)
+    assert not batch.done() and client.hedge_stats["sent"] == 0
+    batch.cancel()
+
+    with interactive_priority():
+        started = asyncio.get_running_loop().time()
+        assert await client._make_request("GET", "/visits/1") == {"host": 1}
+    assert asyncio.get_running_loop().time() - started < 1
+    assert client.hedge_stats == {"sent": 1, "won": 1}
+    # Отменённый запрос к медленному хосту не считается его ошибкой
+    assert client._hosts.snapshot()[0]["errors"] == 0
+    client._session = None
+    await client.close()
+
+
+async def test_timeout_profile_follows_priority() -> None:
+    client = YClientsClient()
+    assert client._timeout_for_priority() is client.timeout
+    with interactive_priority():
+        fast = client._timeout_for_priority()
+    assert fast.total is not None and client.timeout.total is not None
+    assert fast.total < client.timeout.total
+    session = await client._get_session()
+    assert session.connector is not None and session.connector.limit_per_host >= 1
     await client.close()
 
 
@@ -42,10 +305,16 @@ async def test_get_records_mapping() -> None:
     records = await client.get_records(now, now + timedelta(days=1))
     assert len(records) == 1
     rec = records[0]
-    assert rec["id"] == 123
-    assert rec["client"]["id"] == 10
-    assert rec["staff"]["id"] == 3
-    assert rec["datetime"].startswith("2026-04-12T10:30:00")
+    assert rec.id == 123
+    assert rec.client_id == 10
+    assert rec.staff_id == 3
+    assert rec.client_name == "Иванов Иван"
+    assert rec.start.isoformat().startswith("2026-04-12T10:30:00")
+    assert rec.raw is None
+
+    # Сырой payload — только по запросу, такие выборки мимо кэша
+    with_raw = await client.get_records(now, now + timedelta(days=1), keep_raw=True)
+    assert with_raw[0].raw is not None and with_raw[0].raw["id"] == 123
     await client.close()
 
 
@@ -75,7 +344,105 @@ async def test_get_records_iso_start_variants() -> None:
     day = datetime(2026, 4, 12)
     records = await client.get_records(day, day)
     assert len(records) == 2
-    assert all("T" in r["datetime"] for r in records)
+    assert all(r.start.utcoffset() == timedelta(0) for r in records)
+    assert records[0].start.hour == 7
+    await client.close()
+
+
+async def test_batch_start_parser_matches_general_path() -> None:
+    """Быстрый разбор страницы совпадает с общим разбором для всех форматов start."""
+    pages = [
+        ["2026-04-12 10:30:00", "2026-04-12 11:00:00", "2026-04-12 10:30:00"],
+        ["2026-04-12T10:30:00", "2026-04-12T11:00:00.250000"],
+        ["2026-04-12T10:30:00+03:00", "2026-04-12 11:00:00+05:00", "2026-04-12T08:00:00Z"],
+        [1776000000, 1776003600.5],
+        # Смешанная страница и мусор — всё, что не взял быстрый путь, уходит в общий
+        ["2026-04-12 10:30:00", 1776000000, " 2026-04-12 12:00:00 ", "2026-04-12", None, "not a date"],
+    ]
+    for page in pages:
+        assert _parse_visit_starts(page) == [_parse_visit_start(v) for v in page]
+    parsed = _parse_visit_starts(["2026-04-12T08:00:00Z", "2026-04-12 11:00:00+05:00"])
+    assert all(dt is not None and dt.utcoffset() == timedelta(0) for dt in parsed)
+    assert [dt.hour for dt in parsed] == [8, 6]
+
+    # Локальное время клиники со сменой смещения: часы перехода на летнее/зимнее время
+    # (несуществующий 02:30 и дважды прожитый 02:30) совпадают с общим путём
+    original_tz = settings.REMINDER_TIMEZONE
+    settings.REMINDER_TIMEZONE = "Europe/Berlin"
+    try:
+        local = [
+            "2026-03-29 01:59:59", "2026-03-29 02:30:00", "2026-03-29 03:00:00",
+            "2026-10-25T01:30:00", "2026-10-25 02:30:00", "2026-10-25 03:15:00",
+            "2026-07-01 10:00:00", "2026-12-01 10:00:00.500000", "2026-07-01 12:00",
+        ]
+        parsed = _parse_visit_starts(local)
+        assert parsed == [_parse_visit_start(v) for v in local]
+        assert [dt.hour for dt in parsed[-3:]] == [8, 9, 10]
+        assert all(dt.tzinfo is timezone.utc for dt in parsed)
+    finally:
+        settings.REMINDER_TIMEZONE = original_tz
+
+
+async def test_long_window_split_into_parallel_chunks() -> None:
+    client = YClientsClient()
+    client.range_chunk_days = 7
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=60, burst=5)
+    queries: list[tuple[str, str, int]] = []
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        nonlocal in_flight, max_in_flight
+        params = kwargs["params"]
+        queries.append((params["date_from"], params["date_to"], params["page"]))
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        day = datetime.strptime(params["date_from"], "%Y-%m-%d")
+        last = datetime.strptime(params["date_to"], "%Y-%m-%d")
+        visits = []
+        # По визиту в день (граничный день попадает в оба соседних куска), у пациента 5 — раз в месяц
+        while day <= last:
+            patient = 5 if day.day == 15 else 1
+            if params.get("patient_id") in (None, patient):
+                visits.append(
+                    {"id": day.toordinal(), "start": day.strftime("%Y-%m-%d 10:00:00"), "patient": {"id": patient}}
+                )
+            day += timedelta(days=1)
+        # Страница API — 10 визитов
+        page = params["page"]
+        return {"data": visits[(page - 1) * 10 : page * 10], "meta": {"last_page": max(1, -(-len(visits) // 10))}}
+
+    client._make_request = fake_make_request  # type: ignore[method-assign]
+    start = datetime(2026, 4, 1)
+    records = await client.get_records(start, start + timedelta(days=30))
+    # Первая страница показала, что окно многостраничное, — дальше 4 куска (burst 5 минус пробный запрос)
+    assert queries[0] == ("2026-04-01", "2026-05-01", 1)
+    assert queries[1:] == [
+        ("2026-04-01", "2026-04-09", 1),
+        ("2026-04-09", "2026-04-17", 1),
+        ("2026-04-17", "2026-04-25", 1),
+        ("2026-04-25", "2026-05-01", 1),
+    ]
+    assert max_in_flight > 1
+    assert len(records) == 31 and len({r.id for r in records}) == 31
+    assert [r.start for r in records] == sorted(r.start for r in records)
+
+    # «Мои записи»: полгода одного пациента укладываются в одну страницу — один запрос без ожидания лимитера
+    queries.clear()
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=60, burst=5)
+    started = time.monotonic()
+    with interactive_priority():
+        mine = await client.get_records(start, start + timedelta(days=180), client_id=5)
+    assert len(queries) == 1
+    assert time.monotonic() - started < 1
+    assert len(mine) == 6 and {r.client_id for r in mine} == {5}
+
+    # Короткое окно — одним запросом
+    queries.clear()
+    await client.get_records(start, start + timedelta(days=3))
+    assert len(queries) == 1
     await client.close()
 
 
@@ -100,12 +467,532 @@ async def test_find_client_match_by_phone() -> None:
     await client.close()
 
 
+async def test_collect_paginated_concurrent_keeps_page_order() -> None:
+    client = YClientsClient()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        nonlocal in_flight, max_in_flight
+        page = kwargs["params"]["page"]
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # Поздние страницы отвечают быстрее — порядок всё равно должен сохраниться
+        await asyncio.sleep(0.01 * (6 - page))
+        in_flight -= 1
+        return {"data": [{"id": page * 10}, {"id": page * 10 + 1}], "meta": {"last_page": 5}}
+
+    client._make_request = fake_make_request  # type: ignore[method-assign]
+    items = await client._collect_paginated("/visits", {}, concurrency=3)
+    assert [i["id"] for i in items] == [10, 11, 20, 21, 30, 31, 40, 41, 50, 51]
+    assert max_in_flight <= 3
+
+    sequential = await client._collect_paginated("/visits", {}, concurrency=1)
+    assert sequential == items
+    await client.close()
+
+
+async def test_iter_records_streams_pages_and_falls_back_without_branch() -> None:
+    client = YClientsClient()
+    calls: list[dict] = []
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        params = kwargs["params"]
+        calls.append(dict(params))
+        if "branch_id" in params:
+            return {"data": [], "meta": {"last_page": 1}}
+        page = params["page"]
+        return {
+            "data": [
+                {
+                    "id": page,
+                    "start": f"2026-04-12 1{page}:00:00",
+                    "branch_id": client.branch_id,
+                    "patient": {"id": 7, "fname": "A"},
+                    "doctor": {"id": 8, "fname": "B"},
+                }
+            ],
+            "meta": {"last_page": 3},
+        }
+
+    client._make_request = fake_make_request  # type: ignore[method-assign]
+    day = datetime(2026, 4, 12)
+    got = [r async for r in client.iter_records(day, day)]
+    assert [r.id for r in got] == [1, 2, 3]
+    assert all(r.raw is None for r in got)
+    assert "branch_id" in calls[0]
+    assert all("branch_id" not in c for c in calls[1:])
+
+    # Прерванный обход не оставляет висящих задач
+    agen = client.iter_records(day, day)
+    first = await agen.__anext__()
+    assert first.id == 1
+    await agen.aclose()
+    await client.close()
+
+
+async def test_ensure_token_single_flight() -> None:
+    client = YClientsClient()
+    auth_calls = 0
+
+    async def fake_auth() -> None:
+        nonlocal auth_calls
+        auth_calls += 1
+        await asyncio.sleep(0.01)
+        client._token = f"token-{auth_calls}"
+        client._token_expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+
+    client._auth = fake_auth  # type: ignore[method-assign]
+    await asyncio.gather(*(client._ensure_token() for _ in range(10)))
+    assert auth_calls == 1
+    assert client._token == "token-1"
+
+    # 401 от старого токена не сбрасывает уже обновлённый
+    client._invalidate_token("stale-token")
+    assert client._token == "token-1"
+    await client.close()
+
+
+async def test_token_persisted_between_restarts() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "token.json")
+        first = YClientsClient()
+        first.token_cache_path = path
+        first._token = "persisted"
+        first._token_expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+        first._save_token()
+        await first.close()
+
+        second = YClientsClient()
+        second.token_cache_path = path
+        second._token_loaded = False
+
+        async def fail_auth() -> None:
+            raise AssertionError("auth must not be called when a fresh token is cached")
+
+        second._auth = fail_auth  # type: ignore[method-assign]
+        await second._ensure_token()
+        assert second._token == "persisted"
+        # Из кэша токен тоже обновляется заранее в фоне
+        assert second._token_refresh_task is not None
+        await second.close()
+        assert second._token_refresh_task is None
+
+
+async def test_reference_data_cached_and_snapshotted() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "reference.json")
+        client = YClientsClient()
+        client.reference_cache_path = path
+        calls: list[str] = []
+
+        async def fake_make_request(method: str, endpoint: str, **kwargs):
+            calls.append(endpoint)
+            await asyncio.sleep(0.01)
+            if endpoint == "/record_statuses":
+                return [{"id": 1, "title": "Новая"}, {"id": 5, "title": "Подтверждена"}]
+            return {"data": [{"id": 3, "fname": "Анна"}]}
+
+        client._make_request = fake_make_request  # type: ignore[method-assign]
+        ids = await asyncio.gather(*(client._get_confirmed_status_id() for _ in range(5)))
+        assert ids == [5] * 5
+        assert await client.get_staff() == [{"id": 3, "fname": "Анна"}]
+        assert await client.get_staff() == [{"id": 3, "fname": "Анна"}]
+        assert calls == ["/record_statuses", "/doctors"]
+        await client.close()
+
+        # Тёплый старт: справочники из снапшота, без запросов к API
+        warm = YClientsClient()
+        warm.reference_cache_path = path
+        warm._restore_reference_snapshot()
+
+        async def no_requests(method: str, endpoint: str, **kwargs):
+            raise AssertionError(f"unexpected request to {endpoint}")
+
+        warm._make_request = no_requests  # type: ignore[method-assign]
+        assert await warm._get_confirmed_status_id() == 5
+        await warm.close()
+
+
+async def test_ttl_cache_serves_stale_while_revalidating() -> None:
+    cache: AsyncTTLCache[int] = AsyncTTLCache(ttl=0, stale_ttl=60)
+    loads = 0
+
+    async def loader() -> int:
+        nonlocal loads
+        loads += 1
+        return loads
+
+    assert await cache.get_or_load("k", loader) == 1
+    # Устарело, но в окне stale: сразу старое значение, новое — в фоне
+    assert await cache.get_or_load("k", loader) == 1
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert cache.peek("k") == 2
+    await cache.aclose()
+
+
+async def test_visit_windows_shared_and_invalidated() -> None:
+    client = YClientsClient()
+    fetches = 0
+
+    async def fake_collect(_endpoint: str, _params: dict):
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.01)
+        return [{"id": 1, "start": "2026-04-12 10:00:00", "patient": {"id": 5}, "doctor": {"id": 6}}]
+
+    client._collect_paginated = fake_collect  # type: ignore[method-assign]
+    day = datetime(2026, 4, 12)
+    first, second = await asyncio.gather(client.get_records(day, day), client.get_records(day, day))
+    assert len(first) == len(second) == 1
+    streamed = [r async for r in client.iter_records(day, day)]
+    assert [r.id for r in streamed] == [1]
+    assert fetches == 1
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        if method == "GET":
+            return {"id": 1, "start": "2026-04-12 10:00:00", "patient": {"id": 5}, "doctor": {"id": 6}}
+        return {}
+
+    client._make_request = fake_make_request  # type: ignore[method-assign]
+    client._reference_cache.set("record_statuses", [])
+    assert await client.update_record_status(1, "confirmed")
+    await client.get_records(day, day)
+    assert fetches == 2
+
+    # Окно на другой день подтверждение не трогает
+    other = datetime(2026, 5, 1)
+    await client.get_records(other, other)
+    client.invalidate_visits(day.date())
+    await client.get_records(other, other)
+    assert fetches == 3
+    await client.close()
+
+
+async def test_streamed_windows_coalesced() -> None:
+    calls: list[dict] = []
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        params = kwargs["params"]
+        calls.append(dict(params))
+        await asyncio.sleep(0.02)
+        return {
+            "data": [
+                {"id": 1, "start": "2026-04-12 10:00:00", "branch_id": 2, "patient": {"id": 5}},
+                {"id": 2, "start": "2026-04-12 11:00:00", "branch_id": 3, "patient": {"id": 6}},
+            ],
+            "meta": {"last_page": 1},
+        }
+
+    async def collect(client: YClientsClient, **kwargs) -> list[int]:
+        return [v.id async for v in client.iter_records_for_day(date(2026, 4, 12), **kwargs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = YClientsClient()
+        client.semantics_path = os.path.join(tmp, "semantics.json")
+        client._make_request = fake_make_request  # type: ignore[method-assign]
+        client._learn("date_to_inclusive", True)
+
+        # Два одновременных потока по одному дню — один запрос к API
+        first, second = await asyncio.gather(collect(client), collect(client))
+        assert first == second and len(calls) == 1
+
+        # Фильтр по филиалу не работает: потоки двух филиалов делят один запрос без branch_id
+        client.branch_ids, client.use_branch_filter = [2, 3], True
+        client._learn("branch_filter", False)
+        client.invalidate_visits()
+        calls.clear()
+        two, three = await asyncio.gather(collect(client, branch_id=2), collect(client, branch_id=3))
+        assert (two, three) == ([1], [2])
+        assert len(calls) == 1 and "branch_id" not in calls[0]
+
+        # TTL=0 — кэш выключен: каждый вызов идёт в API, без stale-значений
+        client._visits_cache.ttl = 0
+        calls.clear()
+        day = datetime(2026, 4, 20)
+        await client.get_records(day, day)
+        await client.get_records(day, day)
+        assert [v async for v in client.iter_records(day, day)]
+        assert len(calls) == 3
+        assert not [key for key, _value, _at in client._visits_cache.items() if key[0] == "2026-04-20"]
+        await client.close()
+
+
+async def test_api_semantics_learned_and_persisted() -> None:
+    # API с исключающим date_to и неработающим фильтром по филиалу
+    calls: list[dict] = []
+    visits_on = {"2026-04-12"}
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        params = kwargs["params"]
+        calls.append(dict(params))
+        if "branch_id" in params or params["date_from"] == params["date_to"]:
+            return {"data": [], "meta": {"last_page": 1}}
+        data = [
+            {"id": 1, "start": f"{params['date_from']} 10:00:00", "branch_id": 2, "patient": {"id": 7}}
+        ] if params["date_from"] in visits_on else []
+        return {"data": data, "meta": {"last_page": 1}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "semantics.json")
+        first = YClientsClient()
+        first.branch_ids, first.use_branch_filter = [2], True
+        first.semantics_path = path
+        first._make_request = fake_make_request  # type: ignore[method-assign]
+        got = [v async for v in first.iter_records_for_day(date(2026, 4, 12))]
+        assert [v.id for v in got] == [1]
+        assert len(calls) == 4  # день и два дня, каждый с branch_id и без
+        assert first._learned("date_to_inclusive") is False
+        assert first._learned("branch_filter") is False
+        await first.close()
+
+        second = YClientsClient()
+        second.branch_ids, second.use_branch_filter = [2], True
+        second.semantics_path = path
+        second._load_semantics()
+        second._make_request = fake_make_request  # type: ignore[method-assign]
+
+        # Пустой день после обучения — ровно один запрос
+        calls.clear()
+        assert [v async for v in second.iter_records_for_day(date(2026, 4, 13))] == []
+        assert len(calls) == 1
+        assert "branch_id" not in calls[0] and calls[0]["date_to"] == "2026-04-14"
+
+        # get_records тоже не тратит запрос на заведомо пустой вариант с branch_id
+        calls.clear()
+        day = datetime(2026, 4, 12)
+        assert [v.id for v in await second.get_records(day, day + timedelta(days=1))] == [1]
+        assert len(calls) == 1
+
+        # Устаревшее знание перепроверяется
+        second._semantics["date_to_inclusive"]["checked_at"] = (
+            datetime.now(timezone.utc) - second.semantics_recheck - timedelta(minutes=1)
+        ).isoformat()
+        assert second._learned("date_to_inclusive") is None
+        await second.close()
+
+
+async def test_quiet_branch_day_keeps_branch_filter() -> None:
+    # У филиала 2 пустой день, а без фильтра API отдаёт визиты без branch_id (99 — чужой)
+    calls: list[dict] = []
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        params = kwargs["params"]
+        calls.append(dict(params))
+        day = params["date_from"]
+        own = [] if day == "2026-04-12" else [{"id": 1, "start": f"{day} 10:00:00", "patient": {"id": 7}}]
+        if "branch_id" in params:
+            return {"data": own, "meta": {"last_page": 1}}
+        return {"data": [{"id": 99, "start": f"{day} 09:00:00", "patient": {"id": 8}}, *own], "meta": {"last_page": 1}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = YClientsClient()
+        client.branch_ids, client.use_branch_filter = [2], True
+        client.semantics_path = os.path.join(tmp, "semantics.json")
+        client._make_request = fake_make_request  # type: ignore[method-assign]
+        day = datetime(2026, 4, 12)
+        # Визит без филиала из выборки без фильтра может быть чужим — не наш
+        assert await client.get_records(day, day) == []
+        assert [v async for v in client.iter_records(day, day)] == []
+        # Пустой день и визиты без филиала — не свидетельство: фильтр не выключается
+        assert client._learned("branch_filter") is None
+        assert not os.path.exists(client.semantics_path)
+
+        calls.clear()
+        next_day = day + timedelta(days=1)
+        assert [v.id for v in await client.get_records(next_day, next_day)] == [1]
+        assert len(calls) == 1 and calls[0]["branch_id"] == 2
+        await client.close()
+
+
+async def test_branches_fetched_concurrently_and_tagged() -> None:
+    client = YClientsClient()
+    client.branch_ids = [2, 5]
+    client.use_branch_filter = True
+    in_flight = 0
+    peak = 0
+    filter_works = True
+
+    async def fake_make_request(method: str, endpoint: str, **kwargs):
+        nonlocal in_flight, peak
+        params = kwargs["params"]
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        branch = params.get("branch_id")
+        if not filter_works and branch is not None:
+            return {"data": [], "meta": {"last_page": 1}}
+        data = [
+            # В ответе с фильтром филиала у визита нет — его проставляет клиент
+            {"id": 20 + (branch or 0), "start": "2026-04-12 10:00:00", "patient": {"id": 7}},
+        ]
+        if branch is None:
+            data = [
+                {"id": 22, "start": "2026-04-12 10:00:00", "branch_id": 2},
+                {"id": 25, "start": "2026-04-12 11:00:00", "branch_id": 5},
+                {"id": 29, "start": "2026-04-12 12:00:00", "branch_id": 9},
+            ]
+        return {"data": data, "meta": {"last_page": 1}}
+
+    client._make_request = fake_make_request  # type: ignore[method-assign]
+    day = datetime(2026, 4, 12)
+    visits = await client.get_records(day, day)
+    assert [(v.id, v.branch_id) for v in visits] == [(22, 2), (25, 5)]
+    assert peak == 2
+
+    peak = 0
+    streamed = [v async for v in client.iter_records(day + timedelta(days=1), day + timedelta(days=1))]
+    assert sorted(v.branch_id for v in streamed) == [2, 5]
+    assert peak == 2
+    only_five = await client.get_records(day, day, branch_id=5)
+    assert [v.branch_id for v in only_five] == [5]
+
+    # Фильтр API по филиалу сломан — берём всё без фильтра и чужой филиал 9 отбрасываем
+    filter_works = False
+    client._semantics.clear()
+    client.invalidate_visits()
+    visits = await client.get_records(day, day)
+    assert [(v.id, v.branch_id) for v in visits] == [(22, 2), (25, 5)]
+    assert client._learned("branch_filter") is False
+    await client.close()
+
+
+async def test_page_shape_memoized_and_json_decoder() -> None:
+    name, loads = get_json_loads("json")
+    assert name == "json" and loads(b'{"a": [1]}') == {"a": [1]}
+    assert get_json_loads("auto")[1](b"[1, 2]") == [1, 2]
+
+    nested = {"data": {"visits": [{"id": 1}]}, "meta": {"pagination": {"total_pages": "3"}}}
+    assert _page_items(nested) == ([{"id": 1}], ("data", "visits"))
+    assert _page_last(nested, 1) == (3, ("meta", "pagination", "total_pages"))
+    assert _page_items([{"id": 2}]) == ([{"id": 2}], ())
+    assert _page_last({"meta": {"last_page": "x", "pages": 2}}, 1) == (2, ("meta", "pages"))
+    # Форма поменялась — подсказка не мешает найти элементы перебором
+    assert _page_items({"items": [{"id": 3}]}, ("data", "visits")) == ([{"id": 3}], ("items",))
+
+    client = YClientsClient()
+    client._token = "t"
+    client._token_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    client._token_loaded = True
+    session = _FakeSession(
+        [
+            _FakeResponse(200, {"result": [{"id": i}], "meta": {"pages": 2}}, {"Content-Encoding": "gzip"})
+            for i in (1, 2)
+        ]
+    )
+    client._session = session  # type: ignore[assignment]
+    pages = [chunk async for chunk in client._iter_pages("/patients", {}, concurrency=1)]
+    assert pages == [[{"id": 1}], [{"id": 2}]]
+    assert client._page_shapes["/patients"] == (("result",), ("meta", "pages"))
+    assert client.compression_stats == {"responses": 2, "compressed": 2}
+    await client.close()
+
+
+async def test_request_metrics_recorded_and_exported() -> None:
+    client = YClientsClient()
+    client._token = "t"
+    client._token_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    client._token_loaded = True
+    client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+    client.metrics = registry = MetricsRegistry()
+    session = _FakeSession(
+        [
+            _FakeResponse(503, {"error": "busy"}),
+            _FakeResponse(200, {"ok": True}),
+            _FakeResponse(200, {"ok": True}),
+        ]
+    )
+    client._session = session  # type: ignore[assignment]
+    assert await client._make_request("GET", "/visits/15") == {"ok": True}
+    assert await client._make_request("GET", "/visits/16") == {"ok": True}
+
+    endpoint = "GET /visits/{id}"
+    assert registry.counter("dentist_plus_requests_total", endpoint=endpoint) == 3
+    assert registry.counter("dentist_plus_requests_total", status=503) == 1
+    assert registry.counter("dentist_plus_retries_total", endpoint=endpoint, reason="error") == 1
+    assert registry.histogram("dentist_plus_request_seconds", endpoint=endpoint).count == 3
+    assert registry.counter("dentist_plus_response_bytes_total") == len(b'{"error": "busy"}') + 2 * len(b'{"ok": true}')
+    assert registry.snapshot()["histograms"]["dentist_plus_request_seconds"]["endpoint=GET /visits/{id}"]["count"] == 3
+    client._session = None
+    await client.close()
+
+    text = registry.render_prometheus()
+    assert '# TYPE dentist_plus_request_seconds histogram' in text
+    assert 'dentist_plus_requests_total{endpoint="GET /visits/{id}",status="503"} 1' in text
+    assert 'dentist_plus_request_seconds_bucket{endpoint="GET /visits/{id}",le="+Inf"} 3' in text
+
+    runner = await start_metrics_server(registry, "127.0.0.1", 0)
+    try:
+        host, port = runner.addresses[0][:2]
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"http://{host}:{port}/metrics") as response:
+                assert response.status == 200
+                assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                assert await response.text() == text
+    finally:
+        await runner.cleanup()
+
+
+async def test_benchmark_measures_every_base_url() -> None:
+    fast, fast_url = await start_fake_api(visits=450)
+    broken, broken_url = await start_fake_api(visits=450, fail_rate=1.0)
+    client = YClientsClient()
+    client.login, client.password = "bench", "bench"
+    client._base_urls = [fast_url, broken_url]
+    client._rate_limiter = TokenBucketRateLimiter(rate_per_minute=60_000, burst=100)
+    client.metrics = registry = MetricsRegistry()
+    try:
+        result = await client.benchmark_connection(iterations=2)
+    finally:
+        await client.close()
+        await fast.cleanup()
+        await broken.cleanup()
+
+    by_url = {host["url"]: host for host in result["hosts"]}
+    assert list(by_url) == [fast_url, broken_url]
+    ok = by_url[fast_url]
+    assert ok["pages"] == 3 and ok["items"] == 450
+    assert ok["error_rate"] == 0.0 and ok["items_per_second"] > 0
+    assert None not in (ok["auth_p50_ms"], ok["first_page_p95_ms"], ok["window_p95_ms"])
+    failed = by_url[broken_url]
+    assert failed["error_rate"] == 1.0 and failed["auth_p50_ms"] is None
+    assert "503" in failed["last_error"]
+    # Замер не попадает в рабочие метрики и не трогает токен основного клиента
+    assert registry.snapshot() == {"counters": {}, "histograms": {}}
+    assert client._token is None
+
+
 async def main() -> None:
     await test_client_init()
     await test_rate_limit_tracking()
+    await test_rate_limit_interactive_lane_first()
+    await test_retry_policy_backoff_and_retry_after()
+    await test_make_request_retries_429_then_raises_rate_limit_error()
+    await test_host_selector_breaker_and_latency()
+    await test_make_request_fails_over_to_healthy_host()
+    await test_interactive_get_is_hedged_to_second_host()
+    await test_timeout_profile_follows_priority()
     await test_get_records_mapping()
     await test_get_records_iso_start_variants()
+    await test_batch_start_parser_matches_general_path()
+    await test_long_window_split_into_parallel_chunks()
     await test_find_client_match_by_phone()
+    await test_collect_paginated_concurrent_keeps_page_order()
+    await test_page_shape_memoized_and_json_decoder()
+    await test_iter_records_streams_pages_and_falls_back_without_branch()
+    await test_ensure_token_single_flight()
+    await test_token_persisted_between_restarts()
+    await test_ttl_cache_serves_stale_while_revalidating()
+    await test_reference_data_cached_and_snapshotted()
+    await test_visit_windows_shared_and_invalidated()
+    await test_streamed_windows_coalesced()
+    await test_api_semantics_learned_and_persisted()
+    await test_quiet_branch_day_keeps_branch_filter()
+    await test_branches_fetched_concurrently_and_tagged()
+    await test_request_metrics_recorded_and_exported()
+    await test_benchmark_measures_every_base_url()
     print("PASS: Dentist plus client tests")
 
 